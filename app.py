@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-import json, os
+import json, os, time
 from datetime import datetime
 import pandas as pd
 import streamlit as st
@@ -10,65 +10,10 @@ st.set_page_config(
     initial_sidebar_state="collapsed",  # ← 初期は閉じた状態
 )
 
-st.markdown("""
-<style>
-/* ===== ヒーロー（見出し＋説明＋CTA） ===== */
-#cta-hero { padding: 8px 0 6px; }
-#cta-hero h2 { margin: 0 0 8px; font-weight: 800; }
-#cta-hero p  { margin: 0 14px 12px 0; color: #495057; }
-
-/* ヒーロー下にCTAを密着配置（上の余白ゼロ、下だけ少し） */
-#cta-wrap{ margin: 0 0 24px; display:flex; justify-content:center; }
-
-/* Streamlit 1.50対応：CTAボタンを確実に“塗りつぶし”にする */
-#cta-wrap .stButton > button,
-#cta-wrap button[data-testid="stBaseButton-primary"],
-#cta-wrap button[data-testid="baseButton-primary"],
-#cta-wrap button[data-testid="stBaseButton-secondary"]{
-  background-color: #7AA5A0 !important;  /* ← 好きな色に変えてOK */
-  color: #ffffff !important;
-  border: none !important;
-  border-radius: 14px !important;
-  font-weight: 800 !important;
-  font-size: 1.05rem !important;
-  padding: .85rem 1.2rem !important;
-  box-shadow: 0 8px 18px rgba(0,0,0,.16) !important;
-  width: min(720px, 100%) !important;
-}
-#cta-wrap .stButton > button:hover{ filter: brightness(.96) !important; }
-
-/* セクション間の余白（ヒーロー直下を詰め、それ以降は通常） */
-.section { margin: 24px 0; }
-</style>
-""", unsafe_allow_html=True)
-
-
-# ===== ヒーロー/CTA 専用スタイル（1か所に統一） =====
-st.markdown("""
-<style>
-/* セクションの上下余白・タイポ */
-#cta-hero { padding: 12px 0 4px; }
-#cta-hero h3 { margin: 0 0 6px; font-weight: 800; }
-#cta-hero p  { margin: 0 0 10px; color: #495057; }
-
-/* ボタン配置と見た目（Streamlit 1.50対応） */
-#cta-wrap{ margin: 8px 0 24px; display:flex; justify-content:center; }
-#cta-wrap .stButton > button,
-#cta-wrap button[data-testid="stBaseButton-primary"],
-#cta-wrap button[data-testid="baseButton-primary"]{
-  background-color:#7AA5A0 !important;   /* 好きな色に変更OK */
-  color:#fff !important;
-  border:none !important;
-  border-radius:14px !important;
-  font-weight:800 !important;
-  font-size:1.05rem !important;
-  padding:.8rem 1.1rem !important;
-  box-shadow:0 8px 18px rgba(0,0,0,.16) !important;
-  width:min(720px,100%) !important;
-}
-#cta-wrap .stButton > button:hover{ filter:brightness(.96) !important; }
-</style>
-""", unsafe_allow_html=True)
+# CSS は static/app.css（このページ用）と static/components.css（部品用）にまとめてある。
+# 読み込みはここで1回だけ（中身はプロセスで1回読み、内容のハッシュ付きで出す）
+from ui_components import inject_css
+inject_css("app.css", "components.css")
 
 # ===== 上部ヒーロー＋CTA =====
 st.markdown('<div id="cta-hero">', unsafe_allow_html=True)
@@ -84,103 +29,178 @@ if goto_bias_top:
 
 import inspect, ui_components
 
-st.markdown("""
-<style>
-/* サイドバー：開→通常幅、閉→幅ゼロにして隙間を作らない */
-section[data-testid="stSidebar"]{ width: 260px; }
-section[data-testid="stSidebar"][aria-expanded="false"]{
-    width: 0 !important;
-    min-width: 0 !important;
-}
-
-/* デスクトップ時の本文の最大幅（読みやすさキープ用、お好みで調整） */
-@media (min-width: 900px){
-  .main .block-container{
-    max-width: 960px;   /* 800〜1100pxあたりで調整すると読みやすい */
-    padding-left: 2rem;
-    padding-right: 2rem;
-  }
-}
-
-/* モバイルはそのまま全幅でOK */
-</style>
-""", unsafe_allow_html=True)
 
 # --- AIクライアント & 簡易解析 ---
-from openai import OpenAI
+from llm_client import LLMGateway
+from llm_cache import ResultCache, cache_key
+from token_budget import OUTPUT_TOKENS, estimate_tokens, fit_text
+
+LLM_MODELS = ["gpt-4o-mini", "gpt-4o-mini-2024-07-18", "gpt-4o"]  # フォールバック順
+LLM_TEMPERATURE = 0.2
+PROMPT_VERSION = "bias-json-v2"  # プロンプトを変えたら上げる（古いキャッシュを使わない）
+
+# system プロンプトは毎回まったく同じ文字列にする（入力ごとに変わる内容は user 側だけ）。
+# 先頭が同じなのでプロバイダー側のプロンプトキャッシュが効く。応答の量もここで抑える
+LLM_SYSTEM_PROMPT = (
+    "あなたは行動経済学と認知心理学に詳しいアナリストです。"
+    "ダニエル・カーネマンのシステム1/2にも言及しつつ、"
+    "可能性のあるバイアスを特定し、JSONで返して下さい。"
+    '返却形式: {"summary":"...", "biases":[{"name":"...", "score":0-1, "reason":"..."}], "tips":["...","..."]}'
+    "summary は100字以内、biases は多くても3件で reason は各60字以内、tips は2件まで。"
+    "本文の「…」は長文のため省略した箇所です。"
+)
+
+def build_llm_user_prompt(text: str):
+    """(user メッセージ, 本文を間引いたか)。本文はトークン予算（LLM_INPUT_TOKENS）に収める"""
+    body, trimmed = fit_text(text)
+    return f"対象テキスト:\n<<< {body} >>>", trimmed
 
-def _get_openai_client():
-    # Streamlit Secrets → 環境変数の順で見る
-    key = st.secrets.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
+@st.cache_resource(show_spinner=False)
+def _get_llm_gateway():
+    """全セッション共通の LLM 呼び出し口（同時実行数・締め切り・サーキットブレーカー付き）"""
+    # Streamlit Secrets → 環境変数の順で見る（secrets.toml が無いと st.secrets は例外になる）
+    try:
+        key = st.secrets.get("OPENAI_API_KEY")
+    except Exception:
+        key = None
+    key = key or os.getenv("OPENAI_API_KEY")
     if not key:
         return None
     try:
-        return OpenAI(api_key=key)
+        return LLMGateway(
+            api_key=key,
+            models=LLM_MODELS,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,  # ローカルのスタブサーバー確認用
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            deadline_s=float(os.getenv("LLM_DEADLINE_S", "20")),
+            prompt_cache_key=PROMPT_VERSION,
+            keepalive_s=float(os.getenv("LLM_KEEPALIVE_S", "60")),  # 使い終わった接続を残しておく秒数
+        )
     except Exception:
         return None
 
-_openai_client = _get_openai_client()
+# --- LLM 結果キャッシュ（同じ入力なら API を呼ばない） ---
+@st.cache_resource(show_spinner=False)
+def _get_llm_cache():
+    # LLM_CACHE_DB を設定すると SQLite にも保存（再起動しても残る）
+    return ResultCache(
+        maxsize=int(os.getenv("LLM_CACHE_SIZE", "512")),
+        db_path=os.getenv("LLM_CACHE_DB") or None,
+        ttl_s=int(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600))),
+        max_rows=int(os.getenv("LLM_CACHE_MAX_ROWS", "100000")),
+    )
 
-# この行（25行目）から下の旧 analyze_with_ai を削除し、
-# ↓ 以下を貼り付けてください
+def _llm_cache_key(text: str) -> str:
+    # キーは主モデル（LLM_MODELS[0]）だけ。フォールバック先の並びを変えてもキャッシュは消えない
+    return cache_key(text, LLM_MODELS[0], PROMPT_VERSION, LLM_TEMPERATURE)
 
-def analyze_with_ai(text: str):
-    """入力テキストを LLM に渡して JSON で返す（簡易解析）"""
-    if not _openai_client or not text.strip():
+def analyze_with_ai(text: str, gateway=None, cache=None):
+    """入力テキストを LLM に渡して JSON で返す（簡易解析）
+    gateway / cache は差し替え可能（テスト時は偽クライアント入りの LLMGateway を渡す）。
+    AI が使えないときはルールベースの簡易診断（"source": "local"）が返る。"""
+    gateway = gateway or _get_llm_gateway()
+    if not gateway or not text.strip():
         return None
+    cache = _get_llm_cache() if cache is None else cache
+    key = _llm_cache_key(text)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+
+    user, _ = build_llm_user_prompt(text)
+    served = {}
+    result = gateway.analyze(LLM_SYSTEM_PROMPT, user, temperature=LLM_TEMPERATURE,
+                             max_tokens=OUTPUT_TOKENS, fallback_text=text, on_usage=served.update)
+    if result is None:
+        return None
+    if result.get("source") == "local":
+        # 代替結果はキャッシュしない（AI が復帰したら本来の結果を出す）
+        st.warning(f"AI解析エラー：{result.get('fallback_reason') or '混雑'}（簡易診断に切り替えました）")
+        return result
+    # フォールバック先のモデルの答えも、主モデルの答えとしては残さない
+    if served.get("model") == LLM_MODELS[0]:
+        cache.put(key, result)
+    return result
+
+def analyze_with_ai_stream(text: str, gateway=None, cache=None, usage=None):
+    """analyze_with_ai のストリーム版。届いた順に (キー, 値) を返し、最後に ("done", dict)。
+    キャッシュにあれば同じ形で一度に返す。途中で切れた結果・代替結果・主モデル以外の結果はキャッシュしない。
+    usage（dict）を渡すと、見積もりのトークン数（est_tokens）と実際の usage を書き込む。"""
+    gateway = gateway or _get_llm_gateway()
+    if not gateway or not text.strip():
+        return
+    cache = _get_llm_cache() if cache is None else cache
+    key = _llm_cache_key(text)
+    hit = cache.get(key)
+    if hit is not None:
+        if hit.get("summary"):
+            yield "summary", hit["summary"]
+        for k in ("biases", "tips"):
+            for item in hit.get(k) or []:
+                yield k, item
+        yield "done", hit
+        return
 
-    system = (
-        "あなたは行動経済学と認知心理学に詳しいアナリストです。"
-        "ダニエル・カーネマンのシステム1/2にも言及しつつ、"
-        "可能性のあるバイアスを特定し、JSONで返して下さい。"
-        '返却形式: {"summary":"...", "biases":[{"name":"...", "score":0-1, "reason":"..."}], "tips":["...","..."]}'
-    )
-    user = f"対象テキスト:\n<<< {text} >>>"
-
-    # フォールバック順
-    models = ["gpt-4o-mini", "gpt-4o-mini-2024-07-18", "gpt-4o"]
-
-    import time, json
-    last_err = None
-    for model in models:
-        # 3回まで指数バックオフ
-        for attempt in range(3):
-            try:
-                resp = _openai_client.chat.completions.create(
-                    model=model,
-                    messages=[{"role":"system","content":system},
-                              {"role":"user","content":user}],
-                    response_format={"type":"json_object"},
-                    temperature=0.2,
-                    max_tokens=600,
-                    timeout=30,
-                )
-                return json.loads(resp.choices[0].message.content)
-            except Exception as e:
-                last_err = e
-                time.sleep(1.5 * (2 ** attempt))  # 再試行
-                continue
-        continue
-
-    st.warning(f"AI解析エラー：{type(last_err).__name__}")
-    return None
+    user, trimmed = build_llm_user_prompt(text)
+    if usage is not None:
+        usage.update(est_tokens=estimate_tokens(LLM_SYSTEM_PROMPT) + estimate_tokens(user),
+                     trimmed=trimmed)
+    served = {}
+
+    def on_usage(u):
+        served.update(u)
+        if usage is not None:
+            usage.update(u)
+
+    for kind, value in gateway.analyze_stream(LLM_SYSTEM_PROMPT, user, temperature=LLM_TEMPERATURE,
+                                              max_tokens=OUTPUT_TOKENS, fallback_text=text,
+                                              on_usage=on_usage):
+        if (kind == "done" and not value.get("source") and not value.get("partial")
+                and served.get("model") == LLM_MODELS[0]):
+            cache.put(key, value)
+        yield kind, value
+
+def _ai_stream_line(kind: str, value) -> str:
+    if kind == "summary":
+        return f"{value}\n\n"
+    if kind == "biases" and isinstance(value, dict):
+        score = value.get("score")
+        score = f"（{float(score):.2f}）" if isinstance(score, (int, float)) else ""
+        return f"- 🔎 **{value.get('name', '')}**{score}：{value.get('reason', '')}\n"
+    if kind == "tips":
+        return f"- 💡 {value}\n"
+    return ""
+
+def show_ai_stream(text: str, gateway=None, cache=None, usage=None):
+    """LLM の結果を届いた順に表示し、全体の dict を返す（AI が使えなければ何も出さず None）"""
+    gateway = gateway or _get_llm_gateway()
+    if not gateway or not text.strip():
+        return None
+    final = {}
+
+    def lines():
+        for kind, value in analyze_with_ai_stream(text, gateway, cache, usage):
+            if kind == "done":
+                final.update(value)
+            else:
+                yield _ai_stream_line(kind, value)
+
+    st.write_stream(lines())
+    if final.get("source") == "local":
+        st.warning(f"AI解析エラー：{final.get('fallback_reason') or '混雑'}（簡易診断に切り替えました）")
+    elif final.get("partial"):
+        st.warning(f"AI解析が途中で止まりました：{final.get('fallback_reason')}（届いた分だけ表示しています）")
+    return final or None
+
+def llm_cache_stats() -> dict:
+    """キャッシュのヒット/ミス数（サイズ調整の目安）"""
+    return _get_llm_cache().stats()
 
 from ui_components import hero, info_cards, stepper
 # 既存ロジックは2ページ目で使う想定。ここは導入と入力のみ。
 
 st.set_page_config(page_title="Bias Audit Lab", page_icon="🧠", layout="centered")
 
-st.markdown("""
-    <style>
-        [data-testid="stSidebar"] {
-            width: 180px !important;     /* デフォルト：約250px */
-            min-width: 180px !important; /* 念のため固定 */
-        }
-        [data-testid="stSidebarNav"] {
-            font-size: 1.2rem;           /* タブ文字を少し小さく */
-        }
-    </style>
-""", unsafe_allow_html=True)
 
 
 # --- セッション初期化 ---
@@ -269,18 +289,100 @@ with st.form("bias_input_form", clear_on_submit=False):
         )
     with col2:
         submit = st.form_submit_button("🧠 バイアス・プチチェック")
+    deep = st.checkbox("🔬 AIでも詳しく見る（少し時間がかかります）")
 
 
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from concurrent.futures import TimeoutError
+from worker_pool import WorkerPool, PoolBusy
+
+@st.cache_resource(show_spinner=False)
+def _get_worker_pool():
+    """全セッション共通の解析ワーカー（同時実行数と待ち行列に上限）"""
+    return WorkerPool(
+        max_workers=int(os.getenv("ANALYZE_WORKERS", "4")),
+        max_queue=int(os.getenv("ANALYZE_QUEUE", "32")),
+    )
 
 # --- AI解析ロジックをラップしてタイムアウト制御 ---
 def run_analyze_with_timeout(text, category, timeout_s=60):
+    """Diagnosis を返す。混雑時は PoolBusy、時間切れは TimeoutError（どちらも待たずに戻る）"""
     from logic_simple import analyze_with_ai  # ← 実際の解析関数を呼ぶ
-    from concurrent.futures import ThreadPoolExecutor, TimeoutError
+    from rules_engine import get_rules_engine
+
+    rules = get_rules_engine()  # キャッシュ済み（rules.json 更新時だけ読み直し）
+    result, timing = _get_worker_pool().run(
+        analyze_with_ai, text, category, rules=rules, timeout_s=timeout_s)
+    st.session_state["ai_timing"] = timing  # 待ち時間と実行時間（遅い原因の切り分け用）
+    return result
 
-    with ThreadPoolExecutor(max_workers=1) as ex:
-        fut = ex.submit(analyze_with_ai, text, category)
-        return fut.result(timeout=timeout_s)
+
+# 長文はこの文字数から文ごとの逐次表示にする
+STREAM_MIN_CHARS = int(os.getenv("ANALYZE_STREAM_MIN_CHARS", "1500"))
+
+def run_analyze_streaming(text, category, timeout_s=60):
+    """
+    文ごとの検出をその場で流して表示し、最後に全体の Diagnosis を返す。
+    解析は短文と同じワーカープールで回す（混雑時は PoolBusy、時間切れは TimeoutError）
+    """
+    from logic_simple import Diagnosis, analyze_stream
+    from rules_engine import get_rules_engine
+
+    items, timing = _get_worker_pool().stream(
+        analyze_stream, text, category, rules=get_rules_engine(), timeout_s=timeout_s)
+    final = {}
+
+    def lines():
+        for item in items:
+            if isinstance(item, Diagnosis):
+                final["result"] = item
+                continue
+            snippet = text.strip()[item.start:item.end].strip()
+            if len(snippet) > 60:
+                snippet = snippet[:60] + "…"
+            yield f"- 「{snippet}」 → **{'、'.join(item.names())}**\n"
+
+    st.markdown("**📜 文ごとの検出（長文なので見つかった順に表示します）**")
+    st.write_stream(lines())
+    st.session_state["ai_timing"] = timing
+    return final["result"]
+
+
+def _llm_kind(result) -> str:
+    if result is None:
+        return "unavailable"
+    if result.get("source") == "local":
+        return "fallback"
+    return "partial" if result.get("partial") else "llm"
+
+def show_llm_followup(text):
+    """router が LLM に回すと決めた送信だけ、ルール診断の下に AI の見立てを出す（1回だけ呼ぶ）"""
+    from router import get_route_log
+
+    info = st.session_state.get("ai_route")
+    if not info:
+        return
+    route = info["route"]
+    if info.pop("pending", False):
+        llm, llm_ms, usage = None, None, {}
+        if route.escalate:
+            st.markdown("#### 🤖 AIの見立て")
+            t0 = time.perf_counter()
+            llm = show_ai_stream(text, usage=usage)
+            llm_ms = (time.perf_counter() - t0) * 1000
+            if llm is None:
+                st.caption("（AI解析は現在使えないため、ルール診断のみ表示しています）")
+            st.session_state["ai_llm"] = llm
+        # しきい値の調整用に、回した／回さなかった理由を残す
+        get_route_log().record(route, category=info["category"], chars=info["chars"],
+                               llm=_llm_kind(llm) if route.escalate else "",
+                               local_ms=info["local_ms"], llm_ms=llm_ms, usage=usage)
+    elif st.session_state.get("ai_llm"):
+        # 再実行時は保存した結果を並べ直すだけ（API は呼ばない）
+        llm = st.session_state["ai_llm"]
+        st.markdown("#### 🤖 AIの見立て")
+        lines = [_ai_stream_line("summary", llm["summary"])] if llm.get("summary") else []
+        lines += [_ai_stream_line(k, item) for k in ("biases", "tips") for item in llm.get(k) or []]
+        st.markdown("".join(lines))
 
 
 # --- ボタン処理 ---
@@ -289,13 +391,34 @@ if submit:
         st.warning("内容を入力してください。")
     else:
         st.session_state["ai_result"] = None
+        st.session_state["ai_llm"] = None
+        st.session_state["ai_route"] = None
         st.session_state["ai_busy"] = True
 
         try:
-            # 解析を実行（AI→ルールベースどちらでもOK）
-            ai_result = run_analyze_with_timeout(topic, context_tag)
+            # まずルール診断（すぐ終わる）。LLM に回すかはその結果を見て router が決める
+            _t0 = time.perf_counter()
+            if len(topic) >= STREAM_MIN_CHARS:
+                ai_result = run_analyze_streaming(topic, context_tag)
+            else:
+                ai_result = run_analyze_with_timeout(topic, context_tag)
             st.session_state["ai_result"] = ai_result
-
+            from router import decide
+            # LLM は結果表示のあとで呼ぶ（ルール診断の結果を先に見せる）
+            st.session_state["ai_route"] = {
+                "route": decide(ai_result, deep=deep), "category": context_tag, "chars": len(topic),
+                "local_ms": (time.perf_counter() - _t0) * 1000, "pending": True,
+            }
+            # 履歴ページで見返せるように保存（一覧用の列＋詳細は JSON で別表に）
+            from decision_log import get_decision_log, session_owner
+            get_decision_log().append(ai_result.log_record(), kind="diagnosis",
+                                      detail=ai_result.to_json(), owner=session_owner())
+            # 傾向ページ用の集計（検出されたバイアスとその組み合わせを日別・カテゴリ別に数える）
+            from trends import get_trend_store
+            get_trend_store().record("diagnosis", context_tag, [k for k, _ in ai_result.scores])
+
+        except PoolBusy:
+            st.warning("ただいま混み合っています。少し待ってからもう一度お試しください。")
         except TimeoutError:
             st.error("サーバーの応答が遅延しています。しばらくして再試行してください。")
         except Exception as e:
@@ -304,144 +427,69 @@ if submit:
             st.session_state["ai_busy"] = False
 
 
+# --- 解析ワーカーの混み具合（運用者向け・サイドバー） ---
+_ws = _get_worker_pool().stats()
+if _ws["submitted"]:
+    st.sidebar.caption(
+        f"解析ワーカー: 実行中 {_ws['in_flight']}・混雑 {_ws['busy']}・時間切れ {_ws['timeouts']}"
+        f"｜待ち p50 {_ws['wait_p50_s']*1000:.1f}ms / p95 {_ws['wait_p95_s']*1000:.1f}ms"
+        f"｜実行 p50 {_ws['run_p50_s']*1000:.1f}ms / p95 {_ws['run_p95_s']*1000:.1f}ms"
+    )
+
+# --- LLM への振り分け（運用者向け・サイドバー） ---
+from router import REASONS, get_route_log
+_rs = get_route_log().stats
+if _rs:
+    _rn = sum(_rs[r] for r in REASONS)
+    st.sidebar.caption(
+        f"LLMへの振り分け: {_rs['escalated']}/{_rn} 件"
+        f"（詳しく {_rs['deep']}・検出なし {_rs['no_hits']}・低スコア {_rs['low_score']}・同点 {_rs['tie']}）"
+    )
+
+# --- LLM キャッシュの状況（運用者向け・サイドバー） ---
+_cs = llm_cache_stats()
+if _cs["hits"] or _cs["misses"]:
+    st.sidebar.caption(
+        f"LLMキャッシュ: ヒット {_cs['hits']} / ミス {_cs['misses']}"
+        f"（{_cs['hit_rate']:.0%}）・メモリ {_cs['mem_size']} 件・ディスク {_cs['disk_size']} 件"
+    )
+
+# --- LLM のトークン使用量（運用者向け・サイドバー） ---
+_gw = _get_llm_gateway()
+if _gw is not None and _gw.stats["prompt_tokens"]:
+    st.sidebar.caption(
+        f"LLMトークン: 入力 {_gw.stats['prompt_tokens']:,}（うちキャッシュ {_gw.stats['cached_tokens']:,}）"
+        f"・出力 {_gw.stats['completion_tokens']:,}"
+    )
+
 # --- 結果表示 ---
 if "ai_result" in st.session_state and st.session_state["ai_result"]:
     st.markdown("---")
     st.subheader("💭 バイアス・プチチェック結果")
-    st.markdown(st.session_state["ai_result"])
+    from logic_simple import render_diagnosis
+    from ui_components import highlighted_text
+    _res = st.session_state["ai_result"]
+    if _res.spans:
+        st.caption("🔍 診断のきっかけになった言い回し（マウスを重ねるとバイアス名）")
+        highlighted_text(_res.text, _res.highlights())
+    st.markdown(render_diagnosis(_res))
+    show_llm_followup(_res.text)
 else:
     st.info("結果がここに表示されます。")
 
-# === モバイル最適化CSS ===
-st.markdown("""
-<style>
-/* 全体レイアウト */
-.block-container {
-    padding-top: 0.8rem;
-    padding-bottom: 2rem;
-    max-width: 720px;
-    margin: auto;
-}
-
-/* タイトル・サブタイトル */
-h1 {
-    font-size: 1.5rem !important;
-    text-align: center;
-    margin-bottom: 0.3em;
-}
-.subtitle {
-    text-align: center;
-    font-size: 0.9rem;
-    color: #6c757d;
-    margin-bottom: 1em;
-}
-
-/* 流れ部分（①〜⑤） */
-.process {
-    text-align: center;
-    font-size: 0.85rem;
-    background-color: #f9fafb;
-    border-radius: 8px;
-    padding: 0.3em 0.6em;
-    margin-bottom: 1.2em;
-}
-
-/* セクション見出し */
-h2, h3, .stSubheader {
-    font-size: 1.15rem !important;
-    margin-top: 1.6em !important;
-    margin-bottom: 0.8em !important;
-}
-
-/* 説明文・本文 */
-p, .stMarkdown {
-    font-size: 0.95rem;
-    line-height: 1.6;
-    color: #333;
-}
-
-/* 入力フォーム調整 */
-.stTextInput, .stNumberInput, .stMultiSelect {
-    font-size: 0.9rem;
-}
-.stButton button {
-    font-size: 0.9rem;
-    padding: 0.5em 1.2em;
-    border-radius: 6px;
-}
-
-/* Expander調整 */
-.streamlit-expanderHeader {
-    font-size: 0.9rem !important;
-    color: #444 !important;
-}
-
-/* 成功/注意メッセージのデザイン */
-.stSuccess, .stInfo, .stWarning {
-    font-size: 0.9rem;
-}
-
-/* 小さい画面時のフォント縮小 */
-@media (max-width: 480px) {
-    h1 { font-size: 1.3rem !important; }
-    h2, h3, .stSubheader { font-size: 1.05rem !important; }
-    p, .stMarkdown { font-size: 0.9rem; }
-}
-</style>
-""", unsafe_allow_html=True)
-
-# ---- Page-wide styles ----
-st.markdown("""
-<style>
-/* 中央寄せ＋幅の制御 */
-.center-btn { display:flex; justify-content:center; }
-.center-btn .stButton { width: 100%; max-width: 360px; }
-
-/* 大きめ・薄色のボタン（このブロック内のボタンだけ効く） */
-.center-btn button {
-  padding: 1.0rem 1.2rem;
-  font-size: 1.05rem;
-  border-radius: 10px;
-  background: #eaf6f3;         /* 薄いミント */
-  color: #0f766e;               /* 濃いグリーン */
-  border: 1px solid #cfe7e2;
-}
-
-/* AI結果カード（常に枠を見せる） */
-.ai-result .card {
-  border: 1px solid #e5e7eb;
-  border-radius: 8px;
-  padding: .9rem 1rem;
-  background: #ffffff;
-  min-height: 120px;            /* スペースを確保 */
-}
-.ai-result .card.muted{
-  background:#fafafa;
-  color:#6b7280;
-}
-.ai-result pre{
-  margin: 0;
-  white-space: pre-wrap;
-  word-break: break-word;
-</style>
-""", unsafe_allow_html=True)
+# --- キャッシュの温め（プロセスで1回だけ。画面を出し終えてから） ---
+# 最初の利用者の最初の操作で、規則の読み込みや DB の接続が走らないようにする。
+# 共通の分は pages/ から入っても温まる（warm_shared）。LLM の接続はここでは作らない（使うときに初めて作る）
+from cache_versions import warm_shared, warm_up
+warm_shared()
+warm_up({"llm_cache": lambda: _get_llm_cache().warm()})
+
+
 
 
 from pathlib import Path
 import streamlit as st
 
-# --- CTAの余白調整（上を0、下だけ広め） ---
-st.markdown("""
-<style>
-#cta-wrap{
-  margin: 0 0 48px;                 /* 上0 / 下48px */
-  display:flex; justify-content:center;
-}
-#cta-wrap .stButton > button{
-  min-height: 54px;
-}
-</style>
-""", unsafe_allow_html=True)
 
 
 def _goto_bias_page():
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+ローカル診断エンジンのベンチマーク。
+合成した日本語テキスト（短いメモ・3行メモ・50KB の記事・正規表現いじめ用の入力）で
+エンジンごとに p50/p99 レイテンシ・スループット・ピークメモリを測る。
+
+使い方:
+  python -m bench                                  # 測って表を出す
+  python -m bench --save bench_baseline.json       # 基準値として保存
+  python -m bench --check bench_baseline.json      # 基準より遅くなっていたら終了コード 1
+  python -m bench --quick --engines analyze_with_ai score_all
+  python -m bench --imports                        # 起動時の import 時間（新しいプロセスで測る）
+
+--check は p50 を比べる（p99 は揺れが大きいので表示のみ）。基準値は、保存時と今回の
+「基準処理」（固定の小さな処理）の速さの比で補正してから比べる。
+閾値は --threshold（割合）と --slack-us（マイクロ秒の許容幅。ごく短い処理の揺れ対策）。
+基準値はマシンに依存するので、同じマシンで保存したものと比べること。
+--imports は `python -X importtime -c "import X"` を新しいプロセスで --repeat 回流し、
+X の累計 import 時間の一番よい回と、import しただけで openai まで読み込まれるかを出す。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from logic_simple import (_BIASES, _score_all, _score_bias, analyze_selection,
+                          analyze_with_ai, selection_choices)
+
+# ---------- 合成コーパス ----------
+# バイアスの言い回し（各パターンに当たる具体的な表現）と、当たらない普通の文
+TRIGGERS = [
+    "絶対に間違いない", "最近よく見る", "ニュースで連日", "最初の価格", "第一印象", "30%引き",
+    "みんなが言ってる", "流行ってるし", "周りが買ってる", "有名だから", "専門家が言ってた",
+    "テレビで言ってた", "私は悪くない", "失敗は運のせい", "やっぱりそうだった", "今のままで良い",
+    "前例がない", "自分は大丈夫", "どうせ失敗する", "ここまでお金をかけた", "やめたら損",
+    "今だけ", "残りわずか", "90%成功", "見た目から", "一度だけで日本は全部そうだ",
+    "なんか好き", "空気を読む", "うちの会社は優秀", "なんとかなるはず", "すぐ終わる",
+    "損をしたくない", "リスクが怖い", "常識だから正しい", "昔からそうだから",
+]
+FILLER = [
+    "今日は朝から雨が降っていた。", "駅まで歩いて十五分かかる。", "昼ごはんはうどんにした。",
+    "来週の会議の資料を作っている。", "家計簿をつけ始めて三か月になる。", "週末は図書館に行く予定。",
+    "新しいノートパソコンを検討中。", "友人と転職について話した。", "健康診断の結果が届いた。",
+    "セールの案内メールが来ていた。", "投資信託の積立額を見直したい。", "引っ越し先の候補が二つある。",
+]
+KINDS = ("memo", "note", "article", "adversarial")
+
+
+def _sentence(rnd: random.Random, trigger_rate: float) -> str:
+    s = rnd.choice(FILLER)
+    if rnd.random() < trigger_rate:
+        t = rnd.choice(TRIGGERS)
+        s = s[:-1] + "、" + t + "。" if rnd.random() < 0.5 else t + "。" + s
+    return s
+
+
+def _adversarial(rnd: random.Random, size: int) -> str:
+    """正規表現に不利な入力：言い回しの出だしだけが延々続く・同じ語の繰り返し・.* の探索を長引かせる文"""
+    kind = rnd.randrange(5)
+    if kind == 0:   # アンカーの途中までを大量に（最後まで一致しない）
+        return ("みんな" + "最初" + "ここまで" + "自分は") * (size // 10)
+    if kind == 1:   # 1つの語が何千回も出る（検出済みの語の読み飛ばし）
+        return "今だけ" * (size // 3)
+    if kind == 2:   # 「一人」から「全部」まで遠い（.* の探索が長い）
+        return "一人" + "あ" * size + "全部"
+    if kind == 3:   # 「都合の悪い」のあとに「無視」が来ない
+        return ("都合の悪い" + "い" * 50) * (size // 55)
+    return "".join(rnd.choice("あいうえお絶対最初みんな%0123456789") for _ in range(size))
+
+
+def make_corpus(kind: str, n: int, seed: int = 0) -> list:
+    rnd = random.Random(f"{seed}:{kind}")
+    out = []
+    for _ in range(n):
+        if kind == "memo":
+            out.append(_sentence(rnd, 0.6))
+        elif kind == "note":
+            out.append("\n".join(_sentence(rnd, 0.4) for _ in range(3)))
+        elif kind == "article":
+            parts, size = [], 0
+            while size < 50_000:
+                s = _sentence(rnd, 0.05)
+                parts.append(s)
+                size += len(s.encode("utf-8"))
+            out.append("".join(parts))
+        elif kind == "adversarial":
+            out.append(_adversarial(rnd, 5_000))
+        else:
+            raise ValueError(f"unknown kind: {kind}")
+    return out
+
+
+# ---------- 測定対象 ----------
+def _selection_args():
+    themes, situations, signs = selection_choices()
+    return [(t, s, g) for t in themes for s in situations[t] for g in signs]
+
+
+def _engines():
+    sel = _selection_args()
+    first = _BIASES[0]
+    return {
+        "analyze_with_ai": lambda i, t: analyze_with_ai(t, seed=i),
+        "score_all": lambda i, t: _score_all(t),
+        "score_bias": lambda i, t: _score_bias(t, first),   # 1バイアス分（毎回走査する旧来の呼び方）
+        "analyze_selection": lambda i, t: analyze_selection(*sel[i % len(sel)], t),
+    }
+
+
+DEFAULT_N = {"memo": 2000, "note": 1000, "article": 20, "adversarial": 20}
+QUICK_N = {"memo": 300, "note": 150, "article": 4, "adversarial": 5}
+
+
+def _percentile(sorted_values, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _timed(fn, texts):
+    lat = []
+    t0 = time.perf_counter()
+    for i, t in enumerate(texts):
+        s = time.perf_counter_ns()
+        fn(i, t)
+        lat.append(time.perf_counter_ns() - s)
+    lat.sort()
+    return lat, time.perf_counter() - t0
+
+
+def measure(fn, texts, warmup=None, repeat: int = 3) -> dict:
+    # 最初の数十件は re のキャッシュなどが温まるまで遅いので捨てる
+    warmup = min(200, max(3, len(texts) // 10)) if warmup is None else warmup
+    for i, t in enumerate(texts[:warmup]):
+        fn(i, t)
+    # 他のプロセスの影響を減らすため、repeat 回のうち p50 が一番よかった回を採る
+    lat, total = min((_timed(fn, texts) for _ in range(max(1, repeat))),
+                     key=lambda r: _percentile(r[0], 0.50))
+    # ピークメモリは計測のオーバーヘッドがあるので別に流す
+    tracemalloc.start()
+    for i, t in enumerate(texts[:max(1, len(texts) // 10)]):
+        fn(i, t)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    nbytes = sum(len(t.encode("utf-8")) for t in texts)
+    return {
+        "n": len(texts),
+        "p50_us": _percentile(lat, 0.50) / 1000,
+        "p99_us": _percentile(lat, 0.99) / 1000,
+        "per_s": len(texts) / total if total else 0.0,
+        "mb_per_s": nbytes / total / 1e6 if total else 0.0,
+        "peak_kb": peak / 1024,
+    }
+
+
+def reference_us(rounds: int = 7) -> float:
+    """
+    マシンの今の速さの目安（固定の正規表現＋Python ループ）。
+    --check では基準値をこの比で補正するので、CPU の混み具合の違いをある程度打ち消せる。
+    """
+    import re
+    text = "".join(FILLER) * 40
+    rx = re.compile("|".join(map(re.escape, TRIGGERS)))
+    best = None
+    for _ in range(rounds):
+        s = time.perf_counter_ns()
+        for _ in range(20):
+            rx.search(text)
+            sum(len(w) for w in text.split("。"))
+        dt = (time.perf_counter_ns() - s) / 1000
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def run(engines, kinds, counts, seed: int = 0, repeat: int = 3) -> dict:
+    table = _engines()
+    results = {}
+    for kind in kinds:
+        texts = make_corpus(kind, counts[kind], seed)
+        for name in engines:
+            results[f"{name}/{kind}"] = measure(table[name], texts, repeat=repeat)
+            r = results[f"{name}/{kind}"]
+            print(f"{name:18s} {kind:11s} n={r['n']:5d}  p50 {r['p50_us']:9.1f}us  p99 {r['p99_us']:9.1f}us"
+                  f"  {r['per_s']:10,.0f}/s  {r['mb_per_s']:7.2f}MB/s  peak {r['peak_kb']:8.1f}KB",
+                  file=sys.stderr)
+    return results
+
+
+# 画面の起動で読み込むモジュール（openai は比較用。llm_client は import しただけでは読み込まない）
+IMPORT_MODULES = ("logic_simple", "llm_client", "llm_cache", "router", "token_budget", "openai")
+
+
+def import_times(modules=IMPORT_MODULES, repeat: int = 3) -> dict:
+    """{モジュール: {"ms": 累計 import 時間（一番よい回）, "loads_openai": bool}}。import できなければ ms は None"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for mod in modules:
+        best, loads = None, None
+        for _ in range(max(1, repeat)):
+            p = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c",
+                 f"import sys, {mod}; print('openai' in sys.modules)"],
+                cwd=here, capture_output=True, text=True)
+            if p.returncode:
+                break
+            # 行の形式: "import time: self [us] | cumulative | name"
+            us = next(int(line.split("|")[1]) for line in reversed(p.stderr.splitlines())
+                      if line.startswith("import time:") and line.split("|")[2].strip() == mod)
+            best = us if best is None else min(best, us)
+            loads = p.stdout.strip() == "True"
+        results[mod] = {"ms": None if best is None else best / 1000, "loads_openai": loads}
+        r = results[mod]
+        print(f"{mod:14s} " + ("import できません" if r["ms"] is None else
+                               f"{r['ms']:8.1f}ms  openai {'読み込む' if loads else '読み込まない'}"),
+              file=sys.stderr)
+    return results
+
+
+def check(results: dict, baseline: dict, threshold: float, slack_us: float, ref_us=None) -> list:
+    """基準より遅くなったものを [(名前, 基準p50（補正後）, 今回p50)] で返す"""
+    scale = 1.0
+    if ref_us and baseline.get("reference_us"):
+        scale = ref_us / baseline["reference_us"]
+    slower = []
+    for name, base in baseline.get("results", {}).items():
+        cur = results.get(name)
+        if cur is None:
+            continue
+        expected = base["p50_us"] * scale
+        if cur["p50_us"] > expected * (1 + threshold) + slack_us:
+            slower.append((name, expected, cur["p50_us"]))
+    return slower
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="python -m bench", description="ローカル診断エンジンのベンチマーク")
+    ap.add_argument("--engines", nargs="+", choices=list(_engines()), default=None)
+    ap.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    ap.add_argument("--quick", action="store_true", help="件数を減らして短時間で回す")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3, help="同じ測定の繰り返し回数（一番よい回を採る）")
+    ap.add_argument("--save", metavar="JSON", help="結果を基準値として保存")
+    ap.add_argument("--check", metavar="JSON", help="基準値と比べ、遅くなっていれば終了コード 1")
+    ap.add_argument("--threshold", type=float, default=0.25, help="許容する遅れ（割合。既定 0.25 = 25%%）")
+    ap.add_argument("--slack-us", type=float, default=5.0, help="許容する遅れ（マイクロ秒。既定 5）")
+    ap.add_argument("--imports", action="store_true",
+                    help="エンジンの代わりに起動時の import 時間を測る（--repeat 回のうち一番よい回）")
+    return ap
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.imports:
+        import_times(repeat=args.repeat)
+        return 0
+    engines = args.engines or list(_engines())
+    counts = QUICK_N if args.quick else DEFAULT_N
+    ref_before = reference_us()
+    results = run(engines, args.kinds, counts, args.seed, args.repeat)
+    ref = min(ref_before, reference_us())
+    print(f"基準処理: {ref:.1f}us", file=sys.stderr)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "quick": args.quick,
+                "reference_us": ref,
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"基準値を保存しました: {args.save}", file=sys.stderr)
+
+    if args.check:
+        with open(args.check, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("quick") != args.quick:
+            print("注意: 基準値と --quick の有無が違います（件数が違うと p50 も揺れやすい）", file=sys.stderr)
+        slower = check(results, baseline, args.threshold, args.slack_us, ref)
+        for name, base, cur in slower:
+            print(f"遅くなりました: {name}  p50 {base:.1f}us → {cur:.1f}us（{cur / base - 1:+.0%}）",
+                  file=sys.stderr)
+        if slower:
+            return 1
+        print("基準値からの遅れはありません。", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
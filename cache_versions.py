@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+キャッシュの版（バージョン）と起動時の温め。
+st.cache_data.clear() / st.cache_resource.clear() のようにプロセス全体を消すことはしない。
+  - データから作るキャッシュは、そのデータの版を引数に入れる（file_version()）。
+    版が変われば新しいエントリになり、古い版は max_entries で押し出される。
+    キャッシュは関数ごとに別なので、tips.json が変わっても規則や LLM の結果はそのまま。
+    使っている所: rules_engine / tips / logic_simple（selection_rules.json）/ ui_components（CSS）/
+    pages/3_傾向.py（表示名）
+  - warm_up() はプロセスで1回だけ、よく使うキャッシュを先に作っておく。
+    どのページから直接入っても効くように、共通の分は warm_shared() にまとめて各ページから呼ぶ
+"""
+import os
+import time
+
+import streamlit as st
+
+
+def file_version(path) -> str:
+    """ファイルの版（更新時刻とサイズ）。ファイルがなければ "missing"（読み込み時のエラーはそのまま出す）"""
+    try:
+        s = os.stat(path)
+    except OSError:
+        return "missing"
+    return f"{s.st_mtime_ns}-{s.st_size}"
+
+
+@st.cache_resource(show_spinner=False)
+def _warm_up_once(names: tuple, _tasks: dict) -> dict:
+    # _tasks は "_" で始まるのでキャッシュのキーに入らない（キーは names だけ）
+    timings = {}
+    for name in names:
+        t0 = time.perf_counter()
+        try:
+            _tasks[name]()
+        except Exception as e:  # 温めに失敗しても本番の呼び出しで同じエラーが出るので、ここでは記録だけ
+            timings[name] = f"{type(e).__name__}: {e}"
+            continue
+        timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+    return timings
+
+
+def warm_shared() -> dict:
+    """どのページでも使うキャッシュを温める（app.py と pages/ の各ページが画面を出し終えてから呼ぶ）"""
+    # ここで import する（このモジュールは logic_simple などから import されるため）
+    from decision_log import get_decision_log
+    from logic_simple import selection_choices
+    from rules_engine import get_rules_engine
+    from tips import get_tip_catalogue
+    from trends import get_trend_store
+    from ui_components import stylesheets
+
+    return warm_up({
+        "rules": get_rules_engine,
+        "selection": selection_choices,
+        "tips": get_tip_catalogue,
+        "css": lambda: stylesheets("app.css", "components.css"),
+        "decision_log": get_decision_log,
+        "trends": get_trend_store,
+    })
+
+
+def warm_up(tasks: dict) -> dict:
+    """
+    {名前: 引数なしの関数} を1回ずつ呼ぶ（プロセスで1回だけ。同じ名前の組なら2回目以降は何もしない）。
+    各関数は st.cache_resource の関数を呼んでエントリを作るだけにする。{名前: ミリ秒 or エラー} を返す。
+    """
+    return _warm_up_once(tuple(tasks), tasks)
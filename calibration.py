@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+意思決定ログの較正（キャリブレーション）集計。
+  - ブライヤースコア（確信度と結果のずれ）を介入前（confidence_pre）/後（confidence_post）で
+  - 信頼度曲線用のビン（確信度の帯ごとの平均確信度と実際の的中率）
+  - 介入前→後の確信度の変化
+  - バイアスごとの介入効果（ブライヤースコアがどれだけ改善したか）
+集計は合計値だけを持つので、追記された行・新しく記録された結果だけを足し込めば最新になる
+（refresh()）。全件を毎回読み直さない。
+
+確信度は 0〜1 でも 0〜100（%）でも読める。結果は decision_log.set_outcome() で記録したもの。
+※ 記録済みの行の confidence を後から update() した場合は rebuild() で作り直す。
+"""
+import threading
+from itertools import takewhile
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+N_BINS = 10
+MAX_BIASES = 64  # バイアス名はビットで持つ。超えた分は最後の枠「その他」にまとめる
+OTHER = "その他"
+
+_BIAS_SPLIT = r"\s*[|,、;／/]\s*"
+# バイアスごとの合計の列
+_B_N, _B_SHIFT_N, _B_SHIFT, _B_PRE_N, _B_PRE, _B_POST_N, _B_POST = range(7)
+
+
+def parse_confidence(values) -> np.ndarray:
+    """文字列の列 → 0〜1 の float 配列（空欄・不正値は NaN、1 より大きければ % とみなす）"""
+    # 確信度は「70」「0.7」など決まった値が多いので、変換は種類ごとに1回だけ
+    codes, uniq = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    c = pd.to_numeric(pd.Series(uniq, dtype=object), errors="coerce").to_numpy(dtype=float)
+    c = np.clip(np.where(c > 1.0, c / 100.0, c), 0.0, 1.0)
+    return c[codes]
+
+
+class Calibration:
+    def __init__(self, n_bins: int = N_BINS):
+        self.n_bins = n_bins
+        self.last_seq = 0    # ここまでの decisions を集計済み
+        self.last_oseq = 0   # ここまでの outcomes を集計済み
+        self.bias_names = []
+        self._bias_id = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # 同時に refresh して二重に足さないように
+        # seq → 行の値（結果が後から届いたときに使う）
+        self._pre = np.full(0, np.nan)
+        self._post = np.full(0, np.nan)
+        self._mask = np.zeros(0, dtype=np.uint64)
+        # 合計値
+        self._shift = np.zeros(3)                      # 件数, Σ(後-前), Σ|後-前|
+        self._brier = np.zeros((2, 2))                 # [前/後][件数, Σ(確信度-結果)^2]
+        self._bins = np.zeros((2, n_bins, 3))          # [前/後][ビン][件数, Σ確信度, Σ結果]
+        self._bias = np.zeros((MAX_BIASES, 7))
+        self.rows = 0
+
+    # ---- 取り込み ----
+    def _bias_mask(self, biases) -> np.ndarray:
+        # 同じ書き方の組み合わせは何度も出てくるので、分解は種類ごとに1回だけ
+        codes, uniq = pd.factorize(pd.Series(np.asarray(biases, dtype=object)).fillna("").astype(str))
+        parts = pd.Series(uniq, dtype=object).str.split(_BIAS_SPLIT, regex=True).explode()
+        parts = parts[parts.notna() & (parts != "")]
+        umask = np.zeros(len(uniq), dtype=np.uint64)
+        if not parts.empty:
+            ids = np.array([self._bias_index(n) for n in parts], dtype=np.uint64)
+            np.bitwise_or.at(umask, parts.index.to_numpy(), np.left_shift(np.uint64(1), ids))
+        return umask[codes]
+
+    def _bias_index(self, name: str) -> int:
+        i = self._bias_id.get(name)
+        if i is None:
+            if len(self.bias_names) < MAX_BIASES - 1:
+                i = len(self.bias_names)
+                self.bias_names.append(name)
+            else:
+                if OTHER not in self._bias_id:
+                    self.bias_names.append(OTHER)
+                    self._bias_id[OTHER] = MAX_BIASES - 1
+                i = MAX_BIASES - 1
+            self._bias_id[name] = i
+        return i
+
+    def _bits(self, mask) -> np.ndarray:
+        """(行数, バイアス数) の 0/1 行列"""
+        k = len(self.bias_names)
+        return ((mask[:, None] >> np.arange(k, dtype=np.uint64)) & np.uint64(1)).astype(float)
+
+    def _grow(self, size: int):
+        if size <= len(self._pre):
+            return
+        cap = max(size, 2 * len(self._pre), 1024)
+        for name, fill in (("_pre", np.nan), ("_post", np.nan)):
+            a = np.full(cap, fill)
+            a[:len(getattr(self, name))] = getattr(self, name)
+            setattr(self, name, a)
+        m = np.zeros(cap, dtype=np.uint64)
+        m[:len(self._mask)] = self._mask
+        self._mask = m
+
+    def _add_outcomes(self, pre, post, outcome, mask, sign: float):
+        """結果に依存する合計（ブライヤー・ビン・バイアス別）に sign 倍で足す"""
+        bits = self._bits(mask)
+        for j, (conf, b_n, b_sum) in enumerate(((pre, _B_PRE_N, _B_PRE), (post, _B_POST_N, _B_POST))):
+            ok = ~np.isnan(conf) & ~np.isnan(outcome)
+            sq = np.where(ok, (conf - outcome) ** 2, 0.0)
+            self._brier[j] += sign * np.array([ok.sum(), sq.sum()])
+            idx = np.minimum((np.nan_to_num(conf) * self.n_bins).astype(int), self.n_bins - 1)
+            w = ok.astype(float)
+            self._bins[j, :, 0] += sign * np.bincount(idx, w, self.n_bins)
+            self._bins[j, :, 1] += sign * np.bincount(idx, np.where(ok, conf, 0.0), self.n_bins)
+            self._bins[j, :, 2] += sign * np.bincount(idx, np.where(ok, outcome, 0.0), self.n_bins)
+            if bits.shape[1]:
+                self._bias[:bits.shape[1], b_n] += sign * (bits.T @ w)
+                self._bias[:bits.shape[1], b_sum] += sign * (bits.T @ sq)
+
+    def add_rows(self, seq, pre, post, biases, outcome=None):
+        """
+        決定の行を足し込む（配列はすべて同じ長さ）。
+        outcome を渡すとその結果もまとめて集計する（DataFrame から一括で集計するとき用）。
+        """
+        seq = np.asarray(seq, dtype=np.int64)
+        pre, post = parse_confidence(pre), parse_confidence(post)
+        with self._lock:
+            mask = self._bias_mask(biases)
+            self._grow(int(seq.max()) + 1 if len(seq) else 0)
+            self._pre[seq], self._post[seq], self._mask[seq] = pre, post, mask
+
+            ok = ~np.isnan(pre) & ~np.isnan(post)
+            d = np.where(ok, post - pre, 0.0)
+            self._shift += [ok.sum(), d.sum(), np.abs(d).sum()]
+            bits = self._bits(mask)
+            if bits.shape[1]:
+                self._bias[:bits.shape[1], _B_N] += bits.sum(axis=0)
+                self._bias[:bits.shape[1], _B_SHIFT_N] += bits.T @ ok.astype(float)
+                self._bias[:bits.shape[1], _B_SHIFT] += bits.T @ d
+            if outcome is not None:
+                self._add_outcomes(pre, post, np.asarray(outcome, dtype=float), mask, 1.0)
+            self.rows += len(seq)
+            if len(seq):
+                self.last_seq = max(self.last_seq, int(seq.max()))
+
+    def add_frame(self, df: pd.DataFrame):
+        """decisions.csv 形式の DataFrame（任意で outcome 列）をまとめて集計"""
+        seq = df["seq"] if "seq" in df else np.arange(self.last_seq + 1, self.last_seq + 1 + len(df))
+        self.add_rows(seq, df["confidence_pre"], df["confidence_post"], df["biases"],
+                      df["outcome"] if "outcome" in df else None)
+
+    def apply_outcomes(self, events):
+        """結果の記録 [(oseq, seq, outcome, prev), ...] を反映（記録し直しは前の値を引いてから足す）"""
+        ev = np.asarray(events, dtype=float).reshape(-1, 4)
+        with self._lock:
+            ev = ev[ev[:, 1] < len(self._pre)]
+            if not len(ev):
+                return
+            seq = ev[:, 1].astype(np.int64)
+            pre, post, mask = self._pre[seq], self._post[seq], self._mask[seq]
+            redo = ~np.isnan(ev[:, 3])
+            if redo.any():
+                self._add_outcomes(pre[redo], post[redo], ev[redo, 3], mask[redo], -1.0)
+            self._add_outcomes(pre, post, ev[:, 2], mask, 1.0)
+            self.last_oseq = max(self.last_oseq, int(ev[:, 0].max()))
+
+    def refresh(self, log) -> int:
+        """decision_log.DecisionLog から前回以降の追記分だけ読んで反映。新しく読んだ件数を返す"""
+        n = 0
+        with self._refresh_lock:
+            for rows in log.iter_batches(("confidence_pre", "confidence_post", "biases"),
+                                         after=self.last_seq):
+                seq, pre, post, biases = zip(*rows)
+                self.add_rows(seq, pre, post, biases)
+                n += len(rows)
+            for events in log.outcome_events(after=self.last_oseq):
+                # まだ読んでいない行の結果が出たら、そこから先は次回に回す
+                # （後ろの分を先に反映すると last_oseq がそれを追い越して二度と読まれない）
+                ready = list(takewhile(lambda e: e[1] <= self.last_seq, events))
+                self.apply_outcomes(ready)
+                if len(ready) < len(events):
+                    break
+        return n
+
+    # ---- 結果 ----
+    def summary(self) -> dict:
+        def div(a, b):
+            return float(a / b) if b else None
+        with self._lock:
+            (pre_n, pre_sum), (post_n, post_sum) = self._brier
+            shift_n, shift_sum, shift_abs = self._shift
+            return {
+                "decisions": self.rows,
+                "with_outcome": int(pre_n),
+                "brier_pre": div(pre_sum, pre_n),
+                "brier_post": div(post_sum, post_n),
+                "shift_mean": div(shift_sum, shift_n),
+                "shift_abs_mean": div(shift_abs, shift_n),
+            }
+
+    def reliability(self, which: str = "pre") -> pd.DataFrame:
+        """信頼度曲線：確信度の帯ごとの件数・平均確信度・実際の的中率"""
+        with self._lock:
+            b = self._bins[0 if which == "pre" else 1].copy()
+        edges = np.linspace(0.0, 1.0, self.n_bins + 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pd.DataFrame({
+                "lo": edges[:-1], "hi": edges[1:], "count": b[:, 0].astype(int),
+                "mean_confidence": b[:, 1] / b[:, 0], "hit_rate": b[:, 2] / b[:, 0],
+            })
+
+    def bias_effectiveness(self) -> pd.DataFrame:
+        """バイアスごとの件数・確信度の変化・介入前後のブライヤースコアと改善幅（大きいほど効いた）"""
+        with self._lock:
+            k = len(self.bias_names)
+            b = self._bias[:k].copy()
+            names = list(self.bias_names)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            df = pd.DataFrame({
+                "bias": names,
+                "decisions": b[:, _B_N].astype(int),
+                "shift_mean": b[:, _B_SHIFT] / b[:, _B_SHIFT_N],
+                "brier_pre": b[:, _B_PRE] / b[:, _B_PRE_N],
+                "brier_post": b[:, _B_POST] / b[:, _B_POST_N],
+                "with_outcome": b[:, _B_PRE_N].astype(int),
+            })
+        df["improvement"] = df["brier_pre"] - df["brier_post"]
+        return df.sort_values("decisions", ascending=False, ignore_index=True)
+
+
+def rebuild(log) -> Calibration:
+    cal = Calibration()
+    cal.refresh(log)
+    return cal
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_calibration() -> Calibration:
+    return Calibration()
+
+
+def get_calibration(log) -> Calibration:
+    """プロセス共有の集計を返す（呼ぶたびに追記分だけ反映）"""
+    cal = _shared_calibration()
+    cal.refresh(log)
+    return cal
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+意思決定ログ（decisions.csv と同じ列）の保存先。
+  - SQLite（WAL）に1件ずつ追記するだけ。ファイル全体を書き直さない
+  - decision_id（一意）と timestamp に索引があるので「直近 N 件」は件数に関係なく速い
+  - CSV との読み書きは全列を文字列のまま扱うので、取り込み→書き出しで内容が変わらない
+    （decision_id や timestamp が空の行も空のまま。id・時刻を自動で付けるのは append だけ）
+  - 各行に書いた人（owner。ブラウザのセッションごとの id）を残し、履歴の一覧は自分の分だけ読む
+    （CSV の列には含めない。取り込んだ行は owner が空で、どのセッションの履歴にも出ない）
+app.py などからは get_decision_log()（st.cache_resource）で共有の1つを使う。
+
+使い方（コマンドライン）:
+  python -m decision_log import decisions.csv
+  python -m decision_log export backup.csv
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import streamlit as st
+
+# decisions.csv のヘッダーと同じ並び
+COLUMNS = (
+    "decision_id", "timestamp", "text", "options", "importance", "confidence_pre",
+    "biases", "evidence", "interventions", "premortem",
+    "outside_view_A", "outside_view_B", "outside_view_C",
+    "base_rate_source", "framing", "delay_24h", "confidence_post", "change_reason",
+)
+DB_PATH = Path(__file__).with_name("decisions.db")
+
+_COLS_SQL = ", ".join(f'"{c}"' for c in COLUMNS)
+_MARKS = ", ".join("?" for _ in COLUMNS)
+_UPDATE_SQL = ", ".join(f'"{c}" = excluded."{c}"' for c in COLUMNS[1:])
+
+
+def _table_sql(name: str) -> str:
+    # decision_id は空も許す（CSV から取り込んだ id なしの行）。一意なのは空でない id だけ（索引 decisions_id）
+    cols = ", ".join(f'"{c}" TEXT NOT NULL DEFAULT \'\'' for c in COLUMNS)
+    return (f"CREATE TABLE IF NOT EXISTS {name} (seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            f" {cols}, owner TEXT NOT NULL DEFAULT '')")
+
+
+def new_decision_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def now_timestamp() -> str:
+    # 文字列のまま並べても時刻順になる形式
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def session_owner() -> str:
+    """このブラウザのセッションの owner id（初回に作ってセッションに保持）"""
+    owner = st.session_state.get("owner_id")
+    if not owner:
+        owner = st.session_state["owner_id"] = uuid.uuid4().hex
+    return owner
+
+
+class DecisionLog:
+    """
+    1行 = 1つの意思決定。値はすべて文字列（空欄は ""）で持つ。
+    seq は追記順の通し番号（ページ送りや差分集計の目印に使う）。
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(_table_sql("decisions"))
+        # owner は後から足した列（既存の表には ALTER で追加。古い行は空＝持ち主なし）
+        have = {r[1] for r in self._db.execute("PRAGMA table_info(decisions)")}
+        if "owner" not in have:
+            self._db.execute("ALTER TABLE decisions ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        # 古い表は decision_id 列そのものが UNIQUE（空の id を2行入れられない）。作り直して索引に移す
+        if any(r["origin"] == "u" for r in self._db.execute("PRAGMA index_list(decisions)")):
+            self._drop_unique_id()
+        self._db.execute('CREATE UNIQUE INDEX IF NOT EXISTS decisions_id ON decisions("decision_id")'
+                         " WHERE \"decision_id\" <> ''")
+        self._db.execute('CREATE INDEX IF NOT EXISTS decisions_ts ON decisions("timestamp")')
+        self._db.execute('CREATE INDEX IF NOT EXISTS decisions_owner_ts ON decisions(owner, "timestamp", seq)')
+        # 結果（当たり=1 / 外れ=0）は後日わかるので CSV の列とは別に記録する（履歴として追記）
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outcomes ("
+            " oseq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " seq INTEGER NOT NULL, outcome REAL NOT NULL, prev REAL,"
+            " recorded TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS outcomes_seq ON outcomes(seq)")
+        # 解析結果の本体（Diagnosis の JSON など）。一覧では読まず、詳細を開いたときだけ読む
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS details ("
+            " seq INTEGER PRIMARY KEY, kind TEXT NOT NULL, body TEXT NOT NULL)")
+        self._db.commit()
+
+    def _drop_unique_id(self):
+        """decisions を同じ中身・同じ seq のまま作り直す（通し番号の続きも引き継ぐ）"""
+        last = self._db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'decisions'").fetchone()
+        cols = f"seq, {_COLS_SQL}, owner"
+        self._db.execute("BEGIN")
+        self._db.execute(_table_sql("decisions_new"))
+        self._db.execute(f"INSERT INTO decisions_new({cols}) SELECT {cols} FROM decisions")
+        self._db.execute("DROP TABLE decisions")
+        self._db.execute("ALTER TABLE decisions_new RENAME TO decisions")
+        if last is not None:
+            self._db.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'decisions'",
+                             (last[0],))
+        self._db.commit()
+
+    @staticmethod
+    def _row_values(record: dict) -> list:
+        unknown = set(record) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"decisions.csv にない列です: {', '.join(sorted(unknown))}")
+        return ["" if record.get(c) is None else str(record[c]) for c in COLUMNS]
+
+    # ---- 書き込み ----
+    def append(self, record: dict, *, kind: str = "", detail: str = None, owner: str = "") -> str:
+        """
+        1件追記して decision_id を返す（id・時刻が空なら自動で付ける）。
+        detail に解析結果の JSON 文字列を渡すと、kind（"diagnosis" など）と一緒に別表へ保存する。
+        owner は書いた人（画面からは session_owner()）。recent(owner=...) はその人の行だけ返す。
+        """
+        record = dict(record)
+        if not record.get("decision_id"):
+            record["decision_id"] = new_decision_id()
+        if not record.get("timestamp"):
+            record["timestamp"] = now_timestamp()
+        values = self._row_values(record)
+        with self._lock:
+            cur = self._db.execute(
+                f"INSERT INTO decisions({_COLS_SQL}, owner) VALUES ({_MARKS}, ?)", values + [owner])
+            if detail is not None:
+                self._db.execute("INSERT INTO details(seq, kind, body) VALUES (?,?,?)",
+                                 (cur.lastrowid, kind, detail))
+            self._db.commit()
+        return values[0]
+
+    def upsert_many(self, records) -> int:
+        """
+        まとめて書き込む。同じ decision_id があれば中身を置き換える（追記順は保つ）。
+        値は渡されたまま保存する（id が空の行は毎回新しい行として足される）。
+        """
+        n = 0
+        with self._lock:
+            with self._db:
+                for rec in records:
+                    self._db.execute(
+                        f"INSERT INTO decisions({_COLS_SQL}) VALUES ({_MARKS})"
+                        f""" ON CONFLICT("decision_id") WHERE "decision_id" <> '' DO UPDATE SET {_UPDATE_SQL}""",
+                        self._row_values(rec))
+                    n += 1
+        return n
+
+    def update(self, decision_id: str, **fields) -> bool:
+        """後から分かった値（confidence_post など）を書き足す"""
+        bad = set(fields) - set(COLUMNS[1:])
+        if bad:
+            raise ValueError(f"更新できない列です: {', '.join(sorted(bad))}")
+        if not fields or not decision_id:  # id が空の行（取り込んだもの）は id では選べない
+            return False
+        sets = ", ".join(f'"{c}" = ?' for c in fields)
+        values = ["" if v is None else str(v) for v in fields.values()]
+        with self._lock:
+            cur = self._db.execute(
+                f'UPDATE decisions SET {sets} WHERE "decision_id" = ?', values + [decision_id])
+            self._db.commit()
+        return cur.rowcount > 0
+
+    def set_outcome(self, decision_id: str, outcome: float) -> bool:
+        """
+        決定の結果を記録する（1=予想どおり / 0=外れ。途中の値も可）。
+        記録し直したときは直前の値を prev に残す（集計側が差分で更新できるように）。
+        """
+        outcome = float(outcome)
+        if not 0.0 <= outcome <= 1.0:
+            raise ValueError("outcome は 0〜1 で指定してください")
+        if not decision_id:
+            return False
+        with self._lock:
+            row = self._db.execute(
+                'SELECT seq FROM decisions WHERE "decision_id" = ?', (decision_id,)).fetchone()
+            if row is None:
+                return False
+            prev = self._db.execute(
+                "SELECT outcome FROM outcomes WHERE seq = ? ORDER BY oseq DESC LIMIT 1",
+                (row["seq"],)).fetchone()
+            self._db.execute(
+                "INSERT INTO outcomes(seq, outcome, prev, recorded) VALUES (?,?,?,?)",
+                (row["seq"], outcome, prev[0] if prev else None, now_timestamp()))
+            self._db.commit()
+        return True
+
+    def outcome_of(self, decision_id: str):
+        if not decision_id:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT o.outcome FROM outcomes o JOIN decisions d ON d.seq = o.seq"
+                ' WHERE d."decision_id" = ? ORDER BY o.oseq DESC LIMIT 1', (decision_id,)).fetchone()
+        return row[0] if row else None
+
+    def outcome_events(self, after: int = 0, batch: int = 50_000):
+        """oseq > after の結果記録を順に (oseq, seq, outcome, prev) で返す（batch 件ずつのリスト）"""
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT oseq, seq, outcome, prev FROM outcomes WHERE oseq > ? ORDER BY oseq LIMIT ?",
+                    (after, batch)).fetchall()
+            if not rows:
+                return
+            yield [tuple(r) for r in rows]
+            after = rows[-1][0]
+
+    # ---- 読み出し ----
+    def get(self, decision_id: str):
+        if not decision_id:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                f'SELECT seq, {_COLS_SQL} FROM decisions WHERE "decision_id" = ?',
+                (decision_id,)).fetchone()
+        return dict(row) if row else None
+
+    def detail(self, seq: int, owner=None):
+        """
+        (kind, body, text) を返す。保存されていなければ None（owner を渡すと、その人の行でなければ None）。
+        text はその行の text 列の全文（body の JSON には入力の文章を入れないため）。
+        """
+        sql = ('SELECT x.kind, x.body, d."text" FROM details x JOIN decisions d ON d.seq = x.seq'
+               " WHERE x.seq = ?")
+        args = [seq]
+        if owner is not None:
+            sql += " AND d.owner = ?"
+            args.append(owner)
+        with self._lock:
+            row = self._db.execute(sql, args).fetchone()
+        return (row["kind"], row["body"], row["text"]) if row else None
+
+    def recent(self, limit: int = 20, before=None, columns=COLUMNS, *, owner=None, clip=None) -> list:
+        """
+        新しい順に最大 limit 件。before に前回の最後の行の (timestamp, seq) を渡すと続きを返す。
+        索引をたどるだけなので、全体が何件あっても読むのは limit 件分。
+        columns で読む列を絞れる（一覧表示など）。clip={"text": 41} なら text は先頭41文字だけ読む。
+        owner を渡すとその人の行だけ（画面の履歴は必ず渡す。None は全員分で、管理用）。
+        """
+        bad = (set(columns) | set(clip or ())) - set(COLUMNS)
+        if bad:
+            raise ValueError(f"decisions.csv にない列です: {', '.join(sorted(bad))}")
+        clip = clip or {}
+        cols = ", ".join(f'substr("{c}", 1, {int(clip[c])}) AS "{c}"' if c in clip else f'"{c}"'
+                         for c in dict.fromkeys(("timestamp",) + tuple(columns)))
+        sql = f"SELECT seq, {cols} FROM decisions"
+        where, args = [], []
+        if owner is not None:
+            where.append("owner = ?")
+            args.append(owner)
+        if before is not None:
+            where.append('("timestamp", seq) < (?, ?)')
+            args += [before[0], before[1]]
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += ' ORDER BY "timestamp" DESC, seq DESC LIMIT ?'
+        args.append(int(limit))
+        with self._lock:
+            return [dict(r) for r in self._db.execute(sql, args)]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM decisions").fetchone()[0]
+
+    def iter_all(self, batch: int = 5000):
+        """追記順に全件（CSV 書き出し用。batch 件ずつ読むのでメモリは一定）"""
+        for rows in self.iter_batches(COLUMNS, batch=batch):
+            for r in rows:
+                yield dict(r)
+
+    def iter_batches(self, columns=COLUMNS, after: int = 0, batch: int = 50_000, *, owner=None):
+        """
+        seq > after の行を追記順に、指定列だけ batch 件ずつのリストで返す（集計用）。
+        owner を渡すとその人の行だけ（None は全員分。calibration の全体集計や CSV 書き出し）。
+        """
+        bad = set(columns) - set(COLUMNS)
+        if bad:
+            raise ValueError(f"decisions.csv にない列です: {', '.join(sorted(bad))}")
+        cols = ", ".join(f'"{c}"' for c in columns)
+        sql = f"SELECT seq, {cols} FROM decisions WHERE seq > ?"
+        if owner is not None:
+            sql += " AND owner = ?"
+        sql += " ORDER BY seq LIMIT ?"
+        while True:
+            args = (after, batch) if owner is None else (after, owner, batch)
+            with self._lock:
+                rows = self._db.execute(sql, args).fetchall()
+            if not rows:
+                return
+            yield rows
+            after = rows[-1]["seq"]
+
+    # ---- CSV ----
+    def import_csv(self, path) -> int:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            missing = [c for c in COLUMNS if c not in (reader.fieldnames or [])]
+            if missing:
+                raise ValueError(f"{path} に必要な列がありません: {', '.join(missing)}")
+            return self.upsert_many(reader)
+
+    def export_csv(self, path) -> int:
+        """decisions.csv と同じ形（BOM 付き UTF-8・同じ列順）で書き出す"""
+        n = 0
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            w = csv.writer(f, lineterminator="\n")  # decisions.csv と同じ改行
+            w.writerow(COLUMNS)
+            for row in self.iter_all():
+                w.writerow([row[c] for c in COLUMNS])
+                n += 1
+        return n
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+@st.cache_resource(show_spinner=False)
+def get_decision_log() -> DecisionLog:
+    """プロセス共有のログ（保存先は環境変数 DECISION_LOG_DB で変えられる）"""
+    return DecisionLog(os.getenv("DECISION_LOG_DB", str(DB_PATH)))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m decision_log",
+                                 description="意思決定ログと decisions.csv 形式の CSV を相互に変換します。")
+    ap.add_argument("command", choices=["import", "export"])
+    ap.add_argument("csv", help="CSV ファイル")
+    ap.add_argument("--db", default=os.getenv("DECISION_LOG_DB", str(DB_PATH)),
+                    help="SQLite ファイル（既定: decisions.db）")
+    args = ap.parse_args(argv)
+    log = DecisionLog(args.db)
+    try:
+        if args.command == "import":
+            n = log.import_csv(args.csv)
+            print(f"{n} 件を取り込みました（合計 {log.count()} 件）", file=sys.stderr)
+        else:
+            n = log.export_csv(args.csv)
+            print(f"{n} 件を書き出しました", file=sys.stderr)
+    finally:
+        log.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
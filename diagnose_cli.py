@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+ルールベース診断（logic_simple）をコマンドラインから流すためのツール。
+Streamlit を起動せずに、CSV / JSONL を1行ずつ読んでスコアを書き出す。
+
+使い方:
+  python -m diagnose_cli decisions.csv -o scores.csv
+  python -m diagnose_cli journal.jsonl -o scores.jsonl --text-column body
+  python -m diagnose_cli big.csv -o scores.parquet --processes 8 --batch-size 20000
+  python -m diagnose_cli big.parquet -o scores.parquet --text-column body
+
+入力は --batch-size 行ずつ読み込んで処理→書き出しを繰り返すので、
+入力ファイルの大きさに関係なくメモリ使用量は一定。
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from logic_simple import _BIASES, analyze_many
+
+BIAS_KEYS = [b["key"] for b in _BIASES]
+
+
+def _fmt_of(path: str, explicit=None) -> str:
+    if explicit:
+        return explicit
+    low = path.lower()
+    if low.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if low.endswith(".parquet"):
+        return "parquet"
+    return "csv"
+
+
+# ---------- 入力（行ごとの dict を順に返す） ----------
+def _iter_parquet(path: str, batch_size: int):
+    """pyarrow はオプション依存。row group ごとではなく batch_size 行ずつ読む"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet 入力には pyarrow が必要です（pip install pyarrow）")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+
+def iter_rows(path: str, fmt: str, batch_size: int = 10000):
+    if fmt == "parquet":
+        yield from _iter_parquet(path, batch_size)
+        return
+    if path == "-":
+        f = sys.stdin
+    else:
+        # decisions.csv は BOM 付きなので utf-8-sig で読む
+        f = open(path, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "jsonl":
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+# ---------- 出力 ----------
+class _CsvWriter:
+    def __init__(self, f):
+        self._w = csv.writer(f)
+        self._w.writerow(["row", "id", "category", "top"] + BIAS_KEYS)
+
+    def write(self, recs):
+        for r in recs:
+            s = r["scores"]
+            self._w.writerow([r["row"], r["id"], r["category"] or "", "|".join(r["top"])]
+                             + [s.get(k, 0.0) for k in BIAS_KEYS])
+
+    def close(self):
+        pass
+
+
+class _JsonlWriter:
+    def __init__(self, f):
+        self._f = f
+
+    def write(self, recs):
+        for r in recs:
+            self._f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter:
+    """pyarrow はオプション依存。Parquet 出力のときだけ読み込む。"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet 出力には pyarrow が必要です（pip install pyarrow）")
+        self._pa = pa
+        fields = [("row", pa.int64()), ("id", pa.string()), ("category", pa.string()),
+                  ("top", pa.string())] + [(k, pa.float64()) for k in BIAS_KEYS]
+        self._schema = pa.schema(fields)
+        self._w = pq.ParquetWriter(path, self._schema)
+
+    def write(self, recs):
+        cols = {
+            "row": [r["row"] for r in recs],
+            "id": [r["id"] for r in recs],
+            "category": [r["category"] for r in recs],
+            "top": ["|".join(r["top"]) for r in recs],
+        }
+        for k in BIAS_KEYS:
+            cols[k] = [r["scores"].get(k, 0.0) for r in recs]
+        self._w.write_table(self._pa.table(cols, schema=self._schema))
+
+    def close(self):
+        self._w.close()
+
+
+def _open_writer(path: str, fmt: str):
+    if fmt == "parquet":
+        if path == "-":
+            raise SystemExit("Parquet は標準出力に書けません。-o でファイルを指定してください。")
+        return _ParquetWriter(path), None
+    f = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    w = _CsvWriter(f) if fmt == "csv" else _JsonlWriter(f)
+    return w, (None if f is sys.stdout else f)
+
+
+# ---------- 本体 ----------
+def run(args) -> int:
+    in_fmt = _fmt_of(args.input, args.input_format)
+    out_fmt = _fmt_of(args.output, args.output_format)
+    if in_fmt == "parquet" and args.input == "-":
+        raise SystemExit("Parquet は標準入力から読めません。ファイルを指定してください。")
+    rows = iter_rows(args.input, in_fmt, args.batch_size)
+
+    writer, fh = _open_writer(args.output, out_fmt)
+    executor = None
+    if args.processes:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=args.processes)
+
+    n = 0
+    t0 = time.perf_counter()
+    try:
+        while True:
+            batch = list(islice(rows, args.batch_size))
+            if not batch:
+                break
+            texts = [str(r.get(args.text_column) or "") for r in batch]
+            cats = ([r.get(args.category_column) for r in batch]
+                    if args.category_column else None)
+            results = analyze_many(texts, cats, top_n=args.top_n, seed=args.seed,
+                                   chunksize=args.chunksize, start=n, executor=executor)
+            recs = []
+            for i, (r, res) in enumerate(zip(batch, results)):
+                rid = r.get(args.id_column)
+                recs.append({
+                    "row": n + i,
+                    "id": "" if rid is None else str(rid),
+                    "category": res.category,
+                    "top": list(res.top),
+                    "scores": dict(res.scores),
+                })
+            writer.write(recs)
+            n += len(batch)
+    finally:
+        writer.close()
+        if fh:
+            fh.close()
+        if executor is not None:
+            executor.shutdown()
+
+    dt = time.perf_counter() - t0
+    rate = n / dt if dt > 0 else 0.0
+    print(f"{n} 行を処理しました（{dt:.2f} 秒, {rate:,.0f} 行/秒）", file=sys.stderr)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(
+        prog="python -m diagnose_cli",
+        description="CSV/JSONL のテキスト列をルールベースでバイアス診断し、スコアを書き出します。",
+    )
+    ap.add_argument("input", nargs="?", default="decisions.csv",
+                    help="入力ファイル（CSV/JSONL/Parquet。- で標準入力）既定: decisions.csv")
+    ap.add_argument("-o", "--output", default="-",
+                    help="出力先（.csv / .jsonl / .parquet。既定: 標準出力に CSV）")
+    ap.add_argument("--input-format", choices=["csv", "jsonl", "parquet"])
+    ap.add_argument("--output-format", choices=["csv", "jsonl", "parquet"])
+    ap.add_argument("--text-column", default="text", help="診断するテキストの列名（既定: text）")
+    ap.add_argument("--id-column", default="decision_id", help="出力に引き継ぐID列（既定: decision_id）")
+    ap.add_argument("--category-column", help="カテゴリの列名（任意）")
+    ap.add_argument("--top-n", type=int, default=3)
+    ap.add_argument("--seed", help="ヒント選択の乱数シード（再現性が必要なとき）")
+    ap.add_argument("--batch-size", type=int, default=10000, help="一度に読み込む行数")
+    ap.add_argument("--processes", type=int, default=0, help="並列プロセス数（0 で逐次）")
+    ap.add_argument("--chunksize", type=int, default=1000, help="プロセスへ渡す1回分の件数")
+    return ap
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.batch_size < 1:
+        raise SystemExit("--batch-size は1以上にしてください。")
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 解析結果のキャッシュ（内容アドレス方式）。
+  - キー = 正規化したテキストのハッシュ + モデル + プロンプト版 + temperature
+  - 1段目: メモリ上の LRU（プロセス内で共有）
+  - 2段目: SQLite（任意。TTL と件数上限で古いものから削除）
+同じニュース見出しを何人が貼っても、API を呼ぶのは最初の1回だけになる。
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text: str) -> str:
+    """全角/半角・前後の空白・連続する空白の違いを吸収する"""
+    t = unicodedata.normalize("NFKC", text or "")
+    return " ".join(t.split())
+
+
+def cache_key(text: str, model: str, prompt_version: str, temperature: float) -> str:
+    raw = "\x1f".join([normalize_text(text), model, prompt_version, f"{float(temperature):.3f}"])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    2段構成のキャッシュ。値は JSON にできるもの（dict など）。
+      maxsize:  メモリ LRU の件数
+      db_path:  SQLite ファイル（None ならメモリのみ）
+      ttl_s:    有効期限（秒）。None なら無期限
+      max_rows: SQLite に残す最大件数。超えたら最終アクセスが古い順に消す
+    """
+
+    def __init__(self, maxsize: int = 512, db_path=None, ttl_s=7 * 24 * 3600,
+                 max_rows: int = 100_000):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.max_rows = max_rows
+        self._mem = OrderedDict()  # key -> (作成時刻, 値)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "mem_hits": 0, "disk_hits": 0, "evictions": 0}
+        self._db = None
+        self._rows = 0
+        if db_path:
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed)")
+            self._db.commit()
+            self._rows = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_s is not None and now - created > self.ttl_s
+
+    def get(self, key: str):
+        """ヒットすれば値、なければ None"""
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                if not self._expired(item[0], now):
+                    self._mem.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["mem_hits"] += 1
+                    return item[1]
+                del self._mem[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        self._db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self._stats["hits"] += 1
+                        self._stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._rows -= 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is None:
+                return
+            existed = self._db.execute(
+                "SELECT 1 FROM llm_cache WHERE key = ?", (key,)).fetchone() is not None
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache(key, value, created, accessed) VALUES (?,?,?,?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now))
+            if not existed:
+                self._rows += 1
+            if self._rows > self.max_rows:
+                self._evict_disk(now)
+            self._db.commit()
+
+    def _remember(self, key, created, value):
+        self._mem[key] = (created, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self, now):
+        # 期限切れをまとめて消し、それでも多ければ最終アクセスが古い順に1割ほど余分に消す
+        if self.ttl_s is not None:
+            self._db.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl_s,))
+        over = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_rows
+        if over > 0:
+            over += self.max_rows // 10
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)", (over,))
+            self._stats["evictions"] += over
+        self._rows = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def warm(self, n=None) -> int:
+        """SQLite の最近使われた n 件（既定 maxsize）をメモリ LRU に読み込む（起動直後用）。読んだ件数を返す"""
+        if self._db is None:
+            return 0
+        n = self.maxsize if n is None else min(n, self.maxsize)
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value, created FROM llm_cache ORDER BY accessed DESC LIMIT ?", (n,)).fetchall()
+            # 古い順に入れて、最近使われたものが LRU の後ろ（最後に追い出される側）に来るようにする
+            loaded = 0
+            for key, value, created in reversed(rows):
+                if key in self._mem or self._expired(created, now):
+                    continue
+                self._remember(key, created, json.loads(value))
+                loaded += 1
+        return loaded
+
+    def get_or_call(self, key: str, fn):
+        """キャッシュになければ fn() を呼んで保存。None（失敗）は保存しない。"""
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = fn()
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["mem_size"] = len(self._mem)
+            s["disk_size"] = self._rows if self._db is not None else 0
+        total = s["hits"] + s["misses"]
+        s["hit_rate"] = s["hits"] / total if total else 0.0
+        return s
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+                self._rows = 0
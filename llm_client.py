@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 呼び出し層（asyncio）。
+  - プロセス共通のイベントループ（専用スレッド）で動かし、同時実行数をセマフォで制限
+  - モデルのフォールバック全体で共有する締め切り（deadline）
+  - ジッター付き指数バックオフ（待つのはイベントループ側で、Streamlit のスレッドは塞がない）
+  - モデルごとのサーキットブレーカー：連続失敗したモデルはしばらく飛ばす
+  - 全モデルが使えない／時間切れのときは logic_simple のルール診断に即フォールバック
+  - analyze_stream(): 出力をストリームで受け、JSON を途中まで読んで summary や
+    biases の1件ずつを届いた時点で返す（体感の待ち時間を最初のトークンまでに縮める）
+  - 呼び出しごとのトークン数（usage）を on_usage に渡し、stats にも合計する
+  - openai SDK の import とクライアント作成は最初の API 呼び出しまで遅らせる（起動と再実行を軽くする）。
+    作るのは呼び出し元のスレッドで1回だけ（イベントループは止めない）。作れなければ「AI なし」
+    （analyze は None、analyze_stream は何も返さない）で、リトライもブレーカーも通らない。
+    クライアントはゲートウェイごとに1つで、HTTP 接続は keep-alive で使い回す
+base_url を渡せば、ローカルのスタブ HTTP サーバーに向けて動作確認できる。
+"""
+import asyncio
+import json
+import queue
+import random
+import threading
+import time
+
+from logic_simple import _score_all
+
+
+class CircuitBreaker:
+    """連続 threshold 回失敗で open。reset_s 経過後に1回だけ試し（half-open）、成功で close。"""
+
+    def __init__(self, threshold: int = 3, reset_s: float = 30.0):
+        self.threshold = threshold
+        self.reset_s = reset_s
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None  # half-open の試行を始めた時刻
+
+    def allow(self, now=None) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic() if now is None else now
+        if now - self.opened_at < self.reset_s:
+            return False
+        # 試行中は他を通さない（試行が結果を残さず終わっても reset_s 後にはまた試せる）
+        if self._trial_at is not None and now - self._trial_at < self.reset_s:
+            return False
+        self._trial_at = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def record_failure(self, now=None):
+        self.failures += 1
+        if self._trial_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic() if now is None else now
+        self._trial_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self._trial_at is not None else "open"
+
+
+def local_fallback(text: str, reason: str = "") -> dict:
+    """LLM と同じ JSON 形（summary / biases / tips）でルール診断の結果を返す"""
+    scored = _score_all((text or "").strip())[:3]
+    return {
+        "summary": "AI が混み合っているため、ルールベースの簡易診断を表示しています。",
+        "biases": [{"name": b["name"], "score": round(s, 2), "reason": b["desc"]} for s, b in scored],
+        "tips": [b["advice"][0] for _, b in scored if b["advice"]],
+        "source": "local",
+        "fallback_reason": reason,
+    }
+
+
+class JSONStreamParser:
+    """
+    1つの JSON オブジェクトを少しずつ読む（ストリームの断片を feed() で渡す）。
+    トップレベルの fields（文字列など）と、arrays の配列の各要素が読み終わった時点で
+    (キー, 値) を返す。例: ("summary", "..."), ("biases", {...}), ("tips", "...")
+    """
+
+    def __init__(self, fields=("summary",), arrays=("biases", "tips")):
+        self.fields = set(fields)
+        self.arrays = set(arrays)
+        self.text = ""
+        self.partial = {}      # ここまでに読み終わった値（途中で切れたときの表示用）
+        self._pos = 0
+        self._stack = []       # 開いている { と [
+        self._in_str = False
+        self._esc = False
+        self._start = None     # 読み途中の値（文字列・配列の要素）の開始位置
+        self._key = None       # トップレベルで今読んでいる値のキー
+        self._want_key = False
+
+    def feed(self, chunk: str) -> list:
+        self.text += chunk
+        events = []
+        text, stack = self.text, self._stack
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    self._end_string(i, events)
+                continue
+            if c == '"':
+                self._in_str = True
+                if len(stack) < 3:  # それより深い文字列は読み途中の要素の一部
+                    self._start = i
+            elif c in "{[":
+                stack.append(c)
+                if len(stack) == 1:
+                    self._want_key = True
+                elif self._in_array() and len(stack) == 3 and self._start is None:
+                    self._start = i
+            elif c in "}]":
+                if stack:
+                    stack.pop()
+                if len(stack) == 2 and self._in_array() and self._start is not None:
+                    self._emit(self._key, text[self._start:i + 1], events)
+            elif len(stack) == 1:
+                if c == ":":
+                    self._want_key = False
+                elif c == ",":
+                    self._want_key = True
+        self._pos = len(text)
+        return events
+
+    def _in_array(self) -> bool:
+        return self._stack[:2] == ["{", "["] and self._key in self.arrays
+
+    def _end_string(self, i, events):
+        depth = len(self._stack)
+        if depth == 1 and self._want_key:
+            self._key = json.loads(self.text[self._start:i + 1])
+            self._start = None
+        elif depth == 1 and self._key in self.fields:
+            self._emit(self._key, self.text[self._start:i + 1], events)
+        elif depth == 2 and self._in_array():
+            self._emit(self._key, self.text[self._start:i + 1], events)
+        elif depth < 3:
+            self._start = None  # 使わない値
+
+    def _emit(self, key, raw, events):
+        self._start = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        if key in self.arrays:
+            self.partial.setdefault(key, []).append(value)
+        else:
+            self.partial[key] = value
+        events.append((key, value))
+
+    def result(self) -> dict:
+        """全体を読み終えたあとの JSON（壊れていれば ValueError）"""
+        return json.loads(self.text)
+
+
+_STREAM_END = object()
+
+
+class LLMGateway:
+    """
+    プロセスで1つだけ作って共有する（app.py では st.cache_resource に保持）。
+    analyze() は同期関数なので Streamlit のスクリプトからそのまま呼べる。
+    """
+
+    def __init__(self, api_key=None, models=("gpt-4o-mini",), *, base_url=None, client=None,
+                 max_concurrency: int = 8, deadline_s: float = 20.0, call_timeout_s: float = 15.0,
+                 attempts_per_model: int = 3, backoff_base_s: float = 0.5, backoff_cap_s: float = 4.0,
+                 breaker_threshold: int = 3, breaker_reset_s: float = 30.0, prompt_cache_key=None,
+                 keepalive_s: float = 60.0):
+        self.models = list(models)
+        self.deadline_s = deadline_s
+        self.call_timeout_s = call_timeout_s
+        self.attempts_per_model = attempts_per_model
+        self.backoff_base_s = backoff_base_s
+        self.backoff_cap_s = backoff_cap_s
+        self.breakers = {m: CircuitBreaker(breaker_threshold, breaker_reset_s) for m in self.models}
+        self.stats = {"calls": 0, "ok": 0, "errors": 0, "fallbacks": 0, "short_circuits": 0,
+                      "unavailable": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        # 同じ system プロンプトの呼び出しを同じキャッシュに寄せる目印（プロバイダー側のプロンプトキャッシュ用）
+        # prompt_cache_key / stream_options は古い SDK（requirements の下限）だと引数として受け付けないので、
+        # extra_body でリクエスト本文にそのまま入れる
+        self._extra_body = {"prompt_cache_key": prompt_cache_key} if prompt_cache_key else {}
+
+        # クライアントは最初の呼び出しで作る（client を渡したときはそれを使う）
+        self._client = client
+        self._client_error = None  # 作れなかったときの理由（以後は作り直さない）
+        self._client_lock = threading.Lock()
+        self._client_args = {"api_key": api_key, "base_url": base_url}
+        self._pool_size = max_concurrency
+        self._keepalive_s = keepalive_s
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+        self._sem = asyncio.run_coroutine_threadsafe(self._make_sem(max_concurrency), self._loop).result()
+
+    @staticmethod
+    async def _make_sem(n):
+        return asyncio.Semaphore(n)  # ループ内で作る（ループに紐づくため）
+
+    # ---- 同期 API ----
+    def analyze(self, system: str, user: str, *, temperature: float = 0.2, max_tokens: int = 600,
+                fallback_text=None, on_usage=None):
+        """
+        JSON（dict）を返す。全モデル不可・締め切り超過なら fallback_text をルール診断して返す
+        （fallback_text が None なら None）。
+        on_usage: 応答したモデルとトークン数 {"model", "prompt_tokens", "completion_tokens", "cached_tokens"}
+        を受け取る関数（応答が返った回ごと。イベントループのスレッドから呼ばれる）。
+        usage が返らなかった回は {"model"} だけ。最後に呼ばれた model が結果を出したモデル。
+        クライアントが作れない（SDK がない・設定の誤り）ときは fallback_text があっても None。
+        """
+        if not self._ensure_client():
+            return None
+        fut = asyncio.run_coroutine_threadsafe(
+            self._analyze(system, user, temperature, max_tokens, on_usage), self._loop)
+        try:
+            result, reason = fut.result(timeout=self.deadline_s + 1.0)
+        except Exception as e:  # 念のための外側タイムアウト
+            fut.cancel()
+            result, reason = None, type(e).__name__
+        if result is not None:
+            return result
+        self.stats["fallbacks"] += 1
+        return local_fallback(fallback_text, reason) if fallback_text is not None else None
+
+    def analyze_stream(self, system: str, user: str, *, temperature: float = 0.2, max_tokens: int = 600,
+                       fallback_text=None, on_usage=None):
+        """
+        届いた順に (キー, 値) を返すジェネレーター。("summary", "..."), ("biases", {...}),
+        ("tips", "...") のあと、最後に ("done", 全体の dict)。
+        AI が使えないときはルール診断の結果を同じ形で返す（fallback_text が None なら何も返さない）。
+        途中で切れたときの "done" は読めた分だけ（"partial": True）。on_usage は analyze() と同じ。
+        クライアントが作れないときは何も返さない（analyze() と同じく「AI なし」）。
+        """
+        if not self._ensure_client():
+            return
+        events = queue.Queue()
+        fut = asyncio.run_coroutine_threadsafe(
+            self._analyze_stream(system, user, temperature, max_tokens, events.put, on_usage), self._loop)
+        fut.add_done_callback(lambda _: events.put(_STREAM_END))
+        end = time.monotonic() + self.deadline_s + 1.0
+        result, reason = None, ""
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=max(0.0, end - time.monotonic()))
+                except queue.Empty:  # 念のための外側タイムアウト
+                    result, reason = None, "TimeoutError"
+                    break
+                if event is _STREAM_END:
+                    try:
+                        result, reason = fut.result()
+                    except Exception as e:
+                        result, reason = None, type(e).__name__
+                    break
+                yield event
+        finally:
+            fut.cancel()  # 途中で読むのをやめた／時間切れなら止める（終わっていれば何もしない）
+        if result is None:
+            self.stats["fallbacks"] += 1
+            if fallback_text is None:
+                return
+            result = local_fallback(fallback_text, reason)
+            if result["summary"]:
+                yield "summary", result["summary"]
+            for key in ("biases", "tips"):
+                for item in result[key]:
+                    yield key, item
+        yield "done", result
+
+    def close(self):
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    @property
+    def client_error(self):
+        """クライアントを作れなかった理由（作れた・まだ作っていないなら None）"""
+        return self._client_error
+
+    def _ensure_client(self) -> bool:
+        """
+        AsyncOpenAI を初回だけ作る（呼び出し元のスレッドで。import の間もイベントループは他の呼び出しを進める）。
+        作れなければ理由を残して False（モデルの失敗ではないのでブレーカーには数えない）。
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None and self._client_error is None:
+                    try:
+                        self._client = self._make_client()
+                    except Exception as e:
+                        self._client_error = f"{type(e).__name__}: {e}"
+        if self._client is None:
+            self.stats["unavailable"] += 1
+            return False
+        return True
+
+    def _make_client(self):
+        import httpx
+        from openai import AsyncOpenAI
+        # 接続プールは同時実行数と同じ大きさ。使い終わった接続は keepalive_s 秒まで残して再利用する
+        http_client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=self._pool_size, max_keepalive_connections=self._pool_size,
+            keepalive_expiry=self._keepalive_s))
+        # リトライは自前で行うので SDK 側のリトライは切る
+        return AsyncOpenAI(**self._client_args, max_retries=0, http_client=http_client)
+
+    # ---- 非同期の本体 ----
+
+    def _record_usage(self, model, usage, on_usage):
+        counts = {}
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            counts = {
+                "prompt_tokens": usage.prompt_tokens or 0,
+                "completion_tokens": usage.completion_tokens or 0,
+                "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+            }
+        for k, v in counts.items():
+            self.stats[k] += v
+        if on_usage is not None:
+            on_usage(dict(counts, model=model))
+
+    async def _analyze(self, system, user, temperature, max_tokens, on_usage=None):
+        self.stats["calls"] += 1
+        messages = [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+        async def call(model, deadline):
+            resp = await asyncio.wait_for(
+                self._client.chat.completions.create(
+                    model=model, messages=messages,
+                    response_format={"type": "json_object"},
+                    temperature=temperature, max_tokens=max_tokens,
+                    extra_body=self._extra_body or None,
+                ),
+                self._timeout(deadline),
+            )
+            self._record_usage(model, resp.usage, on_usage)
+            return json.loads(resp.choices[0].message.content)
+
+        return await self._with_retries(call)
+
+    async def _analyze_stream(self, system, user, temperature, max_tokens, emit, on_usage=None):
+        self.stats["calls"] += 1
+        messages = [{"role": "system", "content": system}, {"role": "user", "content": user}]
+        parser = None
+
+        async def call(model, deadline):
+            nonlocal parser
+            parser = JSONStreamParser()
+            stream = await asyncio.wait_for(
+                self._client.chat.completions.create(
+                    model=model, messages=messages,
+                    response_format={"type": "json_object"},
+                    temperature=temperature, max_tokens=max_tokens, stream=True,
+                    extra_body={**self._extra_body, "stream_options": {"include_usage": True}},
+                ),
+                self._timeout(deadline),
+            )
+            usage = None
+            try:
+                chunks = stream.__aiter__()
+                while True:
+                    # 次の断片までの間隔にも call_timeout_s（と締め切り）を効かせる
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), self._timeout(deadline))
+                    except StopAsyncIteration:
+                        break
+                    # トークン数は最後の断片（choices が空）に付いてくる
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = chunk.usage
+                    for choice in chunk.choices:
+                        if choice.delta and choice.delta.content:
+                            for event in parser.feed(choice.delta.content):
+                                emit(event)
+            finally:
+                await stream.close()
+            self._record_usage(model, usage, on_usage)
+            return parser.result()
+
+        data, reason = await self._with_retries(call, started=lambda: bool(parser and parser.partial))
+        if data is None and parser and parser.partial:
+            # 途中まで表示したものは取り消せないので、読めた分を返す（キャッシュはしない）
+            return dict(parser.partial, partial=True, fallback_reason=reason), reason
+        return data, reason
+
+    def _timeout(self, deadline) -> float:
+        """
+        1回の呼び出し（ストリームなら次の断片まで）の待ち時間。締め切りは超えない。
+        締め切りで切れた TimeoutError は _with_retries がモデルの失敗と区別する（"deadline"）
+        """
+        return min(self.call_timeout_s, deadline - asyncio.get_running_loop().time())
+
+    async def _with_retries(self, call, started=lambda: False):
+        """
+        call(model, deadline) をモデルのフォールバック・リトライ・ブレーカー付きで呼ぶ。
+        (結果, 失敗理由) を返す。started() が真になった後の失敗はやり直さない。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_s
+        reason = "all_circuits_open"
+
+        for model in self.models:
+            breaker = self.breakers[model]
+            for attempt in range(self.attempts_per_model):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return None, "deadline"
+                if not breaker.allow():
+                    self.stats["short_circuits"] += 1
+                    break  # このモデルは休ませて次へ
+                try:
+                    await asyncio.wait_for(self._sem.acquire(), remaining)
+                except asyncio.TimeoutError:
+                    return None, "busy"
+                try:
+                    # 枠を待つ間に締め切りが来たら呼ばない（呼べば即タイムアウトしてモデルの失敗に数えてしまう）
+                    if deadline - loop.time() <= 0:
+                        return None, "deadline"
+                    data = await call(model, deadline)
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError) and deadline - loop.time() <= 0:
+                        # 全体の締め切りで打ち切った分。こちらの都合なのでブレーカーには数えない
+                        return None, "deadline"
+                    breaker.record_failure()
+                    self.stats["errors"] += 1
+                    reason = type(e).__name__
+                    if started():
+                        return None, reason
+                else:
+                    breaker.record_success()
+                    self.stats["ok"] += 1
+                    return data, ""
+                finally:
+                    self._sem.release()
+
+                # フルジッター付き指数バックオフ（締め切りを超えては待たない）。
+                # このモデルの最後の試行や、今の失敗でブレーカーが開いたときは待たずに次へ
+                # （失敗の直後は closed か open のどちらか。open なら次の allow() は必ず通らない）
+                if attempt + 1 >= self.attempts_per_model or breaker.state != "closed":
+                    continue
+                wait = random.uniform(0, min(self.backoff_cap_s, self.backoff_base_s * (2 ** attempt)))
+                wait = min(wait, max(0.0, deadline - loop.time()))
+                if wait:
+                    await asyncio.sleep(wait)
+        return None, reason
+
+    def breaker_states(self) -> dict:
+        return {m: b.state for m, b in self.breakers.items()}
@@ -33,99 +33,166 @@ def render_finding_card(f: dict):
             st.markdown("- " + str(t))
 
 
-def analyze_selection(theme: str, situation: str, sign: str, text: str):
+# ================================
+# 🧩 かんたん版（A/B/C選択）のルール
+#   ルール本体は selection_rules.json。テーマや条件を増やすときはデータだけ直せばOK。
+#   条件は {"theme":[...], "sign":"含む語", "text":"含む語" or [全部含む語...]} の AND、
+#   "match" / "score[].when" はその OR。
+# ================================
+import json, os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from cache_versions import file_version
+
+SELECTION_RULES_PATH = Path(__file__).with_name("selection_rules.json")
+
+class _SelectionIndex:
     """
-    かんたんルールベース：
-      - A/B/C各ステップの組み合わせと、テキスト内のキーワードから
-        代表的なバイアス候補を返す
+    (テーマ, サイン) ごとに「テキストに何の語があれば当たるか」まで事前に絞り込んだ索引。
+    1回のキーワード走査で得た語のビット集合と突き合わせるだけで結果が出る。
     """
-    text = (text or "").lower()
 
-    # 候補辞書：分かりやすい日本語ラベル＋やさしい説明＋行動ヒント
-    BIASES = [
-        {
-            "key": "loss_aversion",
-            "label": "損失回避（損を強く避けたくなる）",
-            "why": "人は同じ量の得より、同じ量の損を2倍くらい強く感じがちです。",
-            "match": lambda th, si, sg, tx: ("損" in sg) or ("損" in tx) or (th=="買い物" and "セール" in tx),
-            "tips": [
-                "損ではなく“合計いくら払うか”で見る（%ではなく円・時間に言い換える）",
-                "買わない選択も候補に入れて3つの案を比べる",
-                "一晩おいてからもう一度判断する（24時間ルール）"
-            ],
-            "score": lambda th, si, sg, tx: 0.8 if ("損" in sg or "セール" in tx) else 0.65
-        },
-        {
-            "key": "anchoring",
-            "label": "アンカリング（最初の数字に引っぱられる）",
-            "why": "最初に見た定価や点数が“基準”になって、その後の判断がゆがみます。",
-            "match": lambda th, si, sg, tx: ("定価" in tx) or ("元値" in tx) or ("セール" in tx),
-            "tips": [
-                "比べる数字を2つ以上にする（相場・ベースレートを見る）",
-                "“今の自分に必要か”で判断する（数字だけで決めない）"
-            ],
-            "score": lambda th, si, sg, tx: 0.7 if ("定価" in tx or "元値" in tx) else 0.6
-        },
-        {
-            "key": "framing",
-            "label": "フレーミング効果（言い方で印象が変わる）",
-            "why": "『90%成功』と『10%失敗』は中身が同じでも感じ方が変わります。",
-            "match": lambda th, si, sg, tx: ("成功" in tx and "失敗" in tx) or (th in ["買い物","お金"] and "割引" in tx),
-            "tips": [
-                "別の言い方に言い換えてから判断（%⇔円、得⇔損）",
-                "第三者の短評を3行で書く（外部視点）"
-            ],
-            "score": lambda th, si, sg, tx: 0.6
-        },
-        {
-            "key": "status_quo",
-            "label": "現状維持バイアス（変えない方を選びやすい）",
-            "why": "人は慣れた状態を好みます。変えるのが悪いわけではなく準備が必要なだけ。",
-            "match": lambda th, si, sg, tx: ("面倒" in sg) or ("いつも通り" in tx) or ("先のばし" in sg),
-            "tips": [
-                "“やるなら最初の1歩だけ”を決める（5分だけ・1問だけ）",
-                "やらないコスト（時間・お金・機会）を書き出す"
-            ],
-            "score": lambda th, si, sg, tx: 0.65 if ("面倒" in sg or "先のばし" in sg) else 0.55
-        },
-        {
-            "key": "bandwagon",
-            "label": "同調バイアス（みんなに合わせすぎる）",
-            "why": "『みんなやってる』は安心するけど、自分に合うかは別問題です。",
-            "match": lambda th, si, sg, tx: ("みんな" in sg) or ("流行" in tx),
-            "tips": [
-                "利点と不安を1行ずつ書き出し“自分の目的”に合うか確認",
-                "合わない所だけ別の方法を探す（全部マネしなくてOK）"
-            ],
-            "score": lambda th, si, sg, tx: 0.6
-        },
-        {
-            "key": "affect",
-            "label": "感情ヒューリスティック（不安や焦りで判断しがち）",
-            "why": "強い感情は『今すぐ決めたい！』を生み、損得の見え方を変えます。",
-            "match": lambda th, si, sg, tx: ("不安" in sg) or ("焦" in tx) or ("怖" in tx),
-            "tips": [
-                "深呼吸→10分後の自分が何と言うかを書いてみる（外部視点）",
-                "いま決めない（24時間ルール）"
-            ],
-            "score": lambda th, si, sg, tx: 0.7 if ("焦" in tx or "怖" in tx) else 0.6
-        },
-    ]
-
-    hits = []
-    for spec in BIASES:
-        if spec["match"](theme, situation, sign, text):
+    def __init__(self, data: dict):
+        self.themes = list(data.get("themes", []))
+        self.situations = dict(data.get("situations", {}))
+        self.signs = list(data.get("signs", []))
+        self.biases = list(data["biases"])
+        self.evidence_words = list(data.get("evidence_words", []))
+        self.max_hits = int(data.get("max_hits", 3))
+
+        words = list(self.evidence_words)
+        for b in self.biases:
+            for cond in b["match"] + [c for r in b.get("score", []) for c in r["when"]]:
+                words.extend(self._text_words(cond))
+        words = list(dict.fromkeys(words))
+        self._word_of = {re.escape(w): w for w in words}
+        self._bit = {w: 1 << i for i, w in enumerate(words)}
+        # かな・漢字の語は大文字小文字がないので、元の `in` 判定と同じく区別して照合
+        self._keywords = _PatternSet(self._word_of, flags=0)
+
+        self._by_combo = {}
+        for th in self.themes:
+            for sg in self.signs:
+                self._by_combo[(th, sg)] = self._compile(th, sg)
+
+    @staticmethod
+    def _text_words(cond):
+        w = cond.get("text") or []
+        return [w] if isinstance(w, str) else list(w)
+
+    def _partial(self, cond, theme, sign):
+        """テーマ・サインを固定して条件を評価。外れなら None、残りはテキストに必要な語のビット集合。"""
+        if "theme" in cond and theme not in cond["theme"]:
+            return None
+        if "sign" in cond and cond["sign"] not in sign:
+            return None
+        mask = 0
+        for w in self._text_words(cond):
+            mask |= self._bit[w]
+        return mask
+
+    def _compile(self, theme, sign):
+        compiled = []
+        for b in self.biases:
+            need = [r for r in (self._partial(c, theme, sign) for c in b["match"]) if r is not None]
+            if not need:
+                continue  # この組み合わせではテキストに関係なく当たらない
+            scores = []
+            for rule in b.get("score", []):
+                when = [r for r in (self._partial(c, theme, sign) for c in rule["when"]) if r is not None]
+                if when:
+                    scores.append((float(rule["value"]), tuple(when)))
+            compiled.append((b, tuple(need), scores, float(b["default_score"])))
+        return compiled
+
+    def keywords_in(self, text: str) -> int:
+        mask = 0
+        for p in self._keywords.matched(text):
+            mask |= self._bit[self._word_of[p]]
+        return mask
+
+    @staticmethod
+    def _holds(reqs, present) -> bool:
+        for req in reqs:
+            if req & present == req:
+                return True
+        return False
+
+    def lookup(self, theme: str, situation: str, sign: str, text: str, extra=None) -> list:
+        """extra: rules_engine.RulesEngine.score() の結果。同じキーがなければ候補に加える。"""
+        combo = self._by_combo.get((theme, sign))
+        if combo is None:
+            combo = self._compile(theme, sign)
+            if len(self._by_combo) < 4096:  # 想定外の組み合わせも覚えるが、際限なくは増やさない
+                self._by_combo[(theme, sign)] = combo
+
+        present = self.keywords_in(text)
+        bit = self._bit
+        evidence = [theme, situation, sign] + [w for w in self.evidence_words if present & bit[w]][:3]
+        hits = []
+        for b, need, scores, default in combo:
+            if not self._holds(need, present):
+                continue
+            score = default
+            for v, when in scores:
+                if self._holds(when, present):
+                    score = v
+                    break
             hits.append({
-                "label": spec["label"],
-                "why": spec["why"],
-                "evidence": [theme, situation, sign] + ([w for w in ["セール","定価","元値","成功","失敗","焦","怖","不安"] if w in text])[:3],
-                "suggestions": spec["tips"],
-                "score": spec["score"](theme, situation, sign, text),
+                "key": b["key"],
+                "label": b["label"],
+                "why": b["why"],
+                "evidence": list(evidence),
+                "suggestions": b["tips"],
+                "score": score,
             })
+        if extra:
+            keys = {b["key"] for b, *_ in combo}
+            for h in extra:
+                if h["key"] in keys:
+                    continue  # かんたん版のルールと同じバイアスは重ねない
+                hits.append({
+                    "key": h["key"],
+                    "label": h["label"],
+                    "why": "",
+                    "evidence": [theme, situation, sign] + h["evidence"][:3],
+                    "suggestions": h["interventions"],
+                    "score": h["score"],
+                })
+        hits.sort(key=lambda x: x["score"], reverse=True)
+        return hits[:self.max_hits]
+
+def load_selection_rules(path=SELECTION_RULES_PATH) -> _SelectionIndex:
+    with open(path, encoding="utf-8") as f:
+        return _SelectionIndex(json.load(f))
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _cached_selection(path: str, version: str) -> _SelectionIndex:
+    # version はキャッシュキーとしてだけ使う（変われば新しいエントリ＝読み直し）
+    return load_selection_rules(path)
 
-    # 重複や似たものを上限3件に
-    hits = sorted(hits, key=lambda x: x["score"], reverse=True)[:3]
-    return hits
+def _selection_index() -> _SelectionIndex:
+    # 照合器（_PatternSet）はこのファイルの後半で定義されるので、呼び出し時に作る
+    # （selection_rules.json の版ごとに1回。傾向ページの表示名も同じ索引から取る）
+    return _cached_selection(str(SELECTION_RULES_PATH), file_version(SELECTION_RULES_PATH))
+
+def selection_choices():
+    """ページの A/B/C 選択肢（テーマ・状況・サイン）をルールファイルから返す"""
+    idx = _selection_index()
+    return idx.themes, idx.situations, idx.signs
+
+def analyze_selection(theme: str, situation: str, sign: str, text: str, rules=None):
+    """
+    かんたんルールベース：
+      - A/B/C各ステップの組み合わせと、テキスト内のキーワードから
+        代表的なバイアス候補を返す
+      - rules（rules_engine.RulesEngine）を渡すと rules.json のキーワードも候補に入る
+    """
+    text = (text or "").lower()
+    extra = rules.score(text) if rules is not None else None
+    return _selection_index().lookup(theme, situation, sign, text, extra)
 
 # ================================
 # 🔧 課金なし版：30バイアス対応のプチ診断エンジン
@@ -404,53 +471,630 @@ _BIASES = [
      ]},
 ]
 
-def _score_bias(text: str, item: dict) -> float:
-    """パターン一致数を簡易スコアに。0.0〜1.0"""
+_REGEX_META = set(".^$*+?{}[]()|\\")
+# 「\」で始まる1つ分（\x41 や \101 のように後ろの文字まで1文字を表すものもある）
+_ESCAPE_RX = re.compile(r"\\(?:x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|N\{[^}]*\}|[0-7]{1,3}|\d+|.)", re.S)
+
+def _required_literals(pat: str):
+    """
+    パターンの一致に必ず含まれる固定文字列（アンカー）を返す。
+    トップレベルの「|」は分岐ごとに1つずつ（どれか1つは必ず現れる）。
+    取り出せない分岐があれば None（そのパターンは常に正規表現で照合する）。
+    """
+    branches, runs, depth, i = [], [[]], 0, 0
+    while i < len(pat):
+        c = pat[i]
+        if c == "\\":
+            m = _ESCAPE_RX.match(pat, i)
+            runs.append([]); i = m.end() if m else len(pat); continue
+        if c in "([":
+            depth += 1; runs.append([])
+        elif c in ")]":
+            depth -= 1; runs.append([])
+        elif depth == 0 and c == "|":
+            branches.append(runs); runs = [[]]
+        elif depth == 0 and c in "?*{":
+            # 直前の1文字は省略されうるので必須ではない
+            if runs[-1]:
+                runs[-1].pop()
+            runs.append([])
+            if c == "{":
+                i = pat.find("}", i)
+                if i < 0:
+                    return None
+        elif depth == 0 and c not in _REGEX_META:
+            runs[-1].append(c)
+        elif depth == 0:
+            runs.append([])
+        i += 1
+    branches.append(runs)
+    anchors = []
+    for runs in branches:
+        best = max(("".join(r) for r in runs), key=len, default="")
+        if not best:
+            return None
+        anchors.append(best)
+    return anchors
+
+
+try:  # Python 3.11+
+    import re._parser as _sre_parse
+    import re._constants as _sre_const
+except ImportError:
+    import sre_parse as _sre_parse
+    import sre_constants as _sre_const
+
+_REPEAT_OPS = {getattr(_sre_const, n) for n in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+               if hasattr(_sre_const, n)}
+NESTED = "入れ子の繰り返し（指数的）"
+TRAILING = "無制限の繰り返しのあとに続きがある（2乗）"
+
+def regex_risk(pat: str):
+    """
+    re.search で入力の長さに対して線形より悪くなりうる形なら理由を、なければ None を返す。
+      - NESTED: 無制限の繰り返しの中にさらに無制限の繰り返し（(a+)+ など）→ 指数的
+      - TRAILING: 無制限の繰り返しのあとに続きがある（A.*B、.*B、\\d+円 など）→ 2乗
+        （search は開始位置を1つずつずらすので、続きが見つからないと毎回末尾まで読む）
+    """
+    try:
+        return _risk_in(list(_sre_parse.parse(pat)), False, False)
+    except re.error:
+        return None
+
+def _children(op, av) -> list:
+    """グループ・分岐・先読みなどの中身（繰り返し以外）"""
+    if op == _sre_const.SUBPATTERN:
+        return [av[3]]
+    if op == _sre_const.BRANCH:
+        return av[1]
+    if op in (_sre_const.ASSERT, _sre_const.ASSERT_NOT):
+        return [av[1]]
+    if op == getattr(_sre_const, "ATOMIC_GROUP", None):
+        return [av]
+    return []
+
+def _risk_in(items, tail: bool, inside: bool):
+    for i, (op, av) in enumerate(items):
+        more = tail or i < len(items) - 1
+        if op in _REPEAT_OPS:
+            unbounded = av[1] == _sre_const.MAXREPEAT
+            if unbounded and inside:
+                return NESTED
+            r = _risk_in(list(av[2]), more, inside or unbounded)
+            if r:
+                return r
+            if unbounded and more:
+                return TRAILING
+            continue
+        for sub in _children(op, av):
+            r = _risk_in(list(sub), more, inside)
+            if r:
+                return r
+    return None
+
+def _ends_at_text_end(items) -> bool:
+    """$ や \\Z（文章の末尾でだけ当たる）を含むか"""
+    for op, av in items:
+        if op == _sre_const.AT and av in (_sre_const.AT_END, _sre_const.AT_END_STRING):
+            return True
+        subs = [av[2]] if op in _REPEAT_OPS else _children(op, av)
+        if any(_ends_at_text_end(list(sub)) for sub in subs):
+            return True
+    return False
+
+# 危ないパターンは文ごと（長い文はさらに窓ごと）に照合する。
+# 窓の長さの半分までの一致は必ずどれかの窓に丸ごと入る
+_SENTENCE_RX = re.compile(r"[^。！？!?\n]+")
+WINDOW = 400
+
+def sentence_windows(text: str, size: int = WINDOW):
+    """文の (開始, 終了) を順に返す。size より長い文は半分ずつ重ねた窓に切る"""
+    step = max(1, size // 2)
+    for m in _SENTENCE_RX.finditer(text):
+        a, b = m.span()
+        if b - a <= size:
+            yield a, b
+            continue
+        while True:
+            yield a, min(a + size, b)
+            if a + size >= b:
+                break
+            a += step
+
+
+def _can_overlap(a: str, b: str) -> bool:
+    """a の出現の途中（先頭含む）から b が始まりうるか"""
+    for k in range(len(a)):
+        rest = a[k:]
+        if rest.startswith(b) or b.startswith(rest):
+            return True
+    return False
+
+
+class _PatternSet:
+    """
+    複数の正規表現をまとめて照合する。
+    各パターンから必須の固定文字列（アンカー）を取り出して1本の交替にまとめ、
+    テキストを先頭から1回だけ走査してアンカーの出現を集める。
+    アンカーそのものがパターン全体の場合はそれで一致確定、
+    本物の正規表現だけアンカーが見つかったときに個別照合する。
+    regex_risk() が引っかかるパターン（risks）は全文ではなく文・窓ごとに照合するので、
+    長文でも時間は入力の長さに比例する（文をまたぐ一致はしない）。
+    ただし NESTED は窓の中でも指数的になるので照合しない（一致なし扱い）。
+    """
+
+    REBUILD_AFTER = 32  # 既出アンカーの再出現がこの回数を超えたら交替を組み直す
+
+    def __init__(self, patterns, flags=re.IGNORECASE):
+        self.patterns = list(dict.fromkeys(patterns))  # 重複は1本にまとめる
+        self._known = set(self.patterns)
+        self._flags = flags
+        self._narrow_cache = {}
+        self._singles = [re.compile(p, flags) for p in self.patterns]
+        self.risks = {pid: r for pid, r in enumerate(map(regex_risk, self.patterns)) if r}
+        self._skip = {pid for pid, r in self.risks.items() if r == NESTED}
+        # 窓の終わり（endpos）では $ が当たってしまうので、末尾の窓だけで照合する
+        self._at_end = {pid for pid in self.risks
+                        if _ends_at_text_end(list(_sre_parse.parse(self.patterns[pid])))}
+        self._always = []           # アンカーなし：常に個別照合
+        owners = {}                 # アンカー → [(パターン番号, アンカー＝全体か)]
+        for pid, pat in enumerate(self.patterns):
+            anchors = _required_literals(pat)
+            if anchors is None:
+                self._always.append(pid)
+                continue
+            for a in anchors:
+                owners.setdefault(a, []).append((pid, a == pat))
+        self._anchors = list(owners)
+        self._owners = [owners[a] for a in self._anchors]
+        self._anchor_res = [re.compile(re.escape(a), flags) for a in self._anchors]
+        # 大文字小文字を区別しないときは casefold でそろえる（ſ と s、K と k なども同じ扱い）
+        self._fold = str.casefold if flags & re.IGNORECASE else str
+        # 先頭文字 → そこから始まるアンカー（同じ位置で重なったアンカーの確認用）
+        self._by_first = {}
+        for aid, a in enumerate(self._anchors):
+            self._by_first.setdefault(self._fold(a[0])[:1], []).append(aid)
+        self._all_exact = not self._always and all(ex for o in self._owners for _, ex in o)
+        # どのアンカーも他と重ならないなら、交替の1回の finditer だけで全出現を拾える
+        self._aid_of = {self._fold(a): aid for aid, a in enumerate(self._anchors)}
+        self._overlap_free = len(self._aid_of) == len(self._anchors) and not any(
+            _can_overlap(a, b) for a in self._aid_of for b in self._aid_of if a != b)
+        # グループを付けない純粋な文字列の交替にすると、re が先頭文字集合で
+        # 高速に読み飛ばしてくれる（名前付きグループを付けると効かなくなる）
+        if self._anchors:
+            self._combined = re.compile("|".join(map(re.escape, self._anchors)), flags)
+        else:
+            self._combined = None
+
+    def __contains__(self, pattern) -> bool:
+        return pattern in self._known
+
+    def _narrowed(self, seen) -> re.Pattern:
+        """検出済みアンカーを除いた交替（同じ組み合わせはキャッシュ）"""
+        key = frozenset(seen)
+        rx = self._narrow_cache.get(key)
+        if rx is None:
+            rest = [re.escape(a) for aid, a in enumerate(self._anchors) if aid not in key]
+            rx = re.compile("|".join(rest), self._flags)
+            if len(self._narrow_cache) < 64:
+                self._narrow_cache[key] = rx
+        return rx
+
+    def _scan_anchors(self, text: str) -> dict:
+        """{アンカー番号: 最初の出現位置} を1回の走査で集める（重なりも拾う）"""
+        seen = {}
+        rx = self._combined
+        if rx is None:
+            return seen
+        n = len(self._anchors)
+        repeats = 0
+        m = rx.search(text)
+        while m:
+            pos = m.start()
+            before = len(seen)
+            if self._overlap_free:
+                aid = self._aid_of.get(self._fold(m.group()))
+                if aid is None:  # 大文字小文字の特殊な対応（ſ など）だけ個別に特定
+                    aid = next(i for i, r in enumerate(self._anchor_res) if r.fullmatch(m.group()))
+                seen.setdefault(aid, pos)
+            else:
+                # 同じ位置から始まるアンカーは交替の先勝ちで隠れるので、未検出のものを確認
+                for aid in self._by_first.get(self._fold(text[pos])[:1], ()):
+                    if aid not in seen and self._anchor_res[aid].match(text, pos):
+                        seen[aid] = pos
+            if len(seen) == n:
+                break
+            if len(seen) == before:
+                repeats += 1
+                if repeats > self.REBUILD_AFTER:
+                    # 検出済みの語ばかり繰り返し当たる長文：未検出の語だけで組み直して読み飛ばす
+                    rx = self._narrowed(seen)
+                    repeats = 0
+            # 重なりがなければ一致の直後から、あれば1文字ずつ進めて取りこぼさない
+            m = rx.search(text, m.end() if self._overlap_free else pos + 1)
+        return seen
+
+    def matched(self, text: str) -> set:
+        """一致したパターン文字列の集合だけを返す（位置が要らないとき用）"""
+        if self._all_exact:
+            # 全パターンが固定文字列：アンカーの出現がそのまま答え
+            return {self._anchors[aid] for aid in self._scan_anchors(text)}
+        return set(self.scan(text))
+
+    def scan(self, text: str) -> dict:
+        """{パターン文字列: (開始, 終了)} を返す。re.search と同じ最左一致。"""
+        found = {}
+        candidates = set(self._always)
+        for aid, pos in self._scan_anchors(text).items():
+            for pid, exact in self._owners[aid]:
+                if exact:
+                    found[pid] = (pos, pos + len(self._anchors[aid]))
+                else:
+                    candidates.add(pid)
+        windows = None
+        for pid in candidates:
+            if pid in found or pid in self._skip:
+                continue
+            rx = self._singles[pid]
+            if pid in self.risks:
+                if windows is None:
+                    windows = list(sentence_windows(text))
+                if pid in self._at_end:
+                    # 末尾まで改行しか残っていない窓だけ。endpos は本当の末尾にする
+                    tail = [(a, len(text)) for a, b in windows if not text[b:].strip("\n")]
+                    m = next(filter(None, (rx.search(text, a, b) for a, b in tail)), None)
+                else:
+                    m = next(filter(None, (rx.search(text, a, b) for a, b in windows)), None)
+            else:
+                m = rx.search(text)
+            if m:
+                found[pid] = m.span()
+        return {self.patterns[pid]: span for pid, span in found.items()}
+
+
+# 起動時に1回だけ：全バイアスのパターンを1本の照合器にまとめる
+_MATCHER = _PatternSet(p for b in _BIASES for p in b["patterns"])
+
+def pattern_risks() -> dict:
+    """カタログ中の要注意パターン {パターン: 理由}（文・窓ごとの照合に切り替え済み。NESTED は照合しない）"""
+    return {_MATCHER.patterns[pid]: r for pid, r in _MATCHER.risks.items()}
+
+# 1回の診断で読む最大文字数（超えた分は読まない。長文の貼り付けでワーカーを塞がないため）
+MAX_INPUT_CHARS = int(os.getenv("ANALYZE_MAX_CHARS", "20000"))
+
+def _clip(text: str, max_chars: int) -> int:
+    """診断する長さ。max_chars を超えるときは、その手前の文の区切りで切る"""
+    if max_chars is None or len(text) <= max_chars:
+        return len(text)
+    if text[max_chars] in "。！？!?\n":
+        return max_chars  # ちょうど文の終わり
+    cut = max(text.rfind(c, 0, max_chars) for c in "。！？!?\n") + 1
+    return cut if cut > max_chars // 2 else max_chars
+
+def _score_bias(text: str, item: dict, found=None) -> float:
+    """パターン一致数を簡易スコアに。0.0〜1.0
+    found: _MATCHER.scan() の結果。渡せば再走査しない。"""
+    if not item["patterns"]:
+        return 0.0
+    if found is None:
+        found = _MATCHER.scan(text)
     hits = 0
     for pat in item["patterns"]:
-        if re.search(pat, text, flags=re.IGNORECASE):
+        if pat in found:
             hits += 1
-    if not item["patterns"]:
-        return 0.0
+        elif pat not in _MATCHER and re.search(pat, text, flags=re.IGNORECASE):
+            hits += 1  # カタログ外のパターンだけは個別に照合
     # 検出感度：パターンの半分＋1ヒットで満点に近づく
     denom = max(2, len(item["patterns"]) // 2 + 1)
     return min(1.0, hits / denom)
 
-def _format_diag(name, desc, tips):
-    tip = random.choice(tips) if tips else ""
+_BY_KEY = {b["key"]: b for b in _BIASES}
+
+@dataclass(frozen=True, slots=True)
+class Diagnosis:
+    """
+    1件分の診断結果（表示用の文章は持たない。表示は render_diagnosis() で都度組み立てる）。
+      scores:  ((バイアスkey, スコア), ...) スコア降順・0点は除く
+      top:     表示する上位バイアスの key
+      advice:  top と同じ並びで、選んだヒント（_BIASES[...]["advice"]）の番号
+      spans:   ((バイアスkey, 開始, 終了), ...) 一致した箇所（文字位置）。
+               スコア計算と同じ _MATCHER.scan() の結果から取るので追加の走査はない
+      rules:   rules.json のヒット ((key, label, スコア), ...)
+      actions: rules の先頭の対処法（最大2つ）
+      truncated_at: 長文を途中まで診断したときの文字数（全文なら 0）
+    """
+    text: str
+    category: Optional[str] = None
+    scores: tuple = ()
+    top: tuple = ()
+    advice: tuple = ()
+    spans: tuple = ()
+    rules: tuple = ()
+    actions: tuple = ()
+    truncated_at: int = 0
+
+    def score_of(self, key: str) -> float:
+        for k, s in self.scores:
+            if k == key:
+                return s
+        return 0.0
+
+    def highlights(self) -> list:
+        """
+        表示用に spans をまとめたもの：[(開始, 終了, (バイアス名, ...)), ...]
+        重なる・接する箇所は1つにする（spans は開始位置順なので1回なめるだけ）。
+        """
+        out = []
+        for key, a, b in self.spans:
+            name = _BY_KEY[key]["name"] if key in _BY_KEY else key
+            if out and a <= out[-1][1]:
+                s, e, names = out[-1]
+                out[-1] = (s, max(e, b), names if name in names else names + (name,))
+            else:
+                out.append((a, b, (name,)))
+        return out
+
+    def log_record(self) -> dict:
+        """意思決定ログ（decisions.csv の列）に書く分だけ"""
+        phrases = dict.fromkeys(self.text[a:b] for _, a, b in self.spans)
+        return {
+            "text": self.text,
+            "biases": "|".join(_BY_KEY[k]["name"] for k in self.top if k in _BY_KEY),
+            "evidence": "|".join(phrases),
+            "interventions": " / ".join(self.actions),
+        }
+
+    def to_dict(self) -> dict:
+        """
+        JSON にできる dict（保存・キャッシュ用）。入力の文章は入れない（呼び出し側が別に持っている。
+        意思決定ログなら text 列）。from_dict(d, text) で元に戻せる。
+        """
+        return {
+            "category": self.category,
+            "scores": [[k, s] for k, s in self.scores],
+            "top": list(self.top),
+            "advice": list(self.advice),
+            "spans": [list(x) for x in self.spans],
+            "rules": [list(x) for x in self.rules],
+            "actions": list(self.actions),
+            "truncated_at": self.truncated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict, text: str = "") -> "Diagnosis":
+        return cls(
+            text=text or d.get("text", ""),  # 以前の形式は text も入っている
+            category=d.get("category"),
+            scores=tuple((k, s) for k, s in d.get("scores", ())),
+            top=tuple(d.get("top", ())),
+            advice=tuple(d.get("advice", ())),
+            spans=tuple((k, a, b) for k, a, b in d.get("spans", ())),
+            rules=tuple((k, l, s) for k, l, s in d.get("rules", ())),
+            actions=tuple(d.get("actions", ())),
+            truncated_at=d.get("truncated_at", 0),
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, s: str, text: str = "") -> "Diagnosis":
+        return cls.from_dict(json.loads(s), text)
+
+def _format_diag(name, desc, tip):
     return (
         f"**{name}** が含まれている可能性があります。\n"
         f"{desc}\n"
         f"**視野を広げるヒント:** {tip}"
     )
 
-def analyze_with_ai(text: str, category=None, top_n: int = 3) -> str:
-    """
-    外部APIを使わず、文章の言い回しから代表的なバイアスを簡易推定。
-    長めの“プチ診断”文を返す。
-    """
-    t = (text or "").strip()
-    if not t:
+def render_diagnosis(d: Diagnosis) -> str:
+    """Diagnosis を表示用の markdown にする（再診断はしない）"""
+    if not d.text:
         return "入力が空です。内容を入力してください。"
+    header = f"🧠 **入力内容:** {d.text}\n📂 **カテゴリ:** {d.category or '未選択'}\n---\n"
+    if not d.top:
+        body = ("🔎 目立つ認知バイアスは特に検出されませんでした。\n"
+                "とはいえ、反例や別視点の情報を**意識的に**集める癖をつけると、よりバランスの良い判断に近づけます。")
+    else:
+        parts = []
+        for key, i in zip(d.top, d.advice):
+            b = _BY_KEY[key]
+            tip = b["advice"][i] if i is not None and i < len(b["advice"]) else ""
+            parts.append(_format_diag(b["name"], b["desc"], tip))
+        parts.append("📌 **ワンポイント:** 反対側の意見や別の国・事例も1つ参照してから結論づけると、判断の偏りを減らせます。")
+        body = "\n\n".join(parts)
+    if d.rules:
+        body += f"\n\n🛠 **すぐ試せる対処（{d.rules[0][1]}）:** " + " / ".join(d.actions)
+    if d.truncated_at:
+        body += f"\n\n✂️ 長文のため、先頭の {d.truncated_at:,} 文字までを診断しました。"
+    return header + "✅ **AIプチ診断**\n" + body
 
-    # 各バイアスのスコア算出
+def _score_all(t: str, found=None) -> list:
+    """全バイアスを1回の走査でスコア化し、(スコア, バイアス) を降順で返す（0点は除く）"""
+    if found is None:
+        found = _MATCHER.scan(t)
     scored = []
     for b in _BIASES:
-        s = _score_bias(t, b)
+        s = _score_bias(t, b, found)
         if s > 0:
             scored.append((s, b))
     scored.sort(key=lambda x: x[0], reverse=True)
+    return scored
+
+def _assemble(t: str, n: int, found: dict, category, top_n, rng, rules) -> Diagnosis:
+    """照合結果（{パターン: 位置}）から Diagnosis を組み立てる。n は診断した文字数"""
+    body = t[:n] if n < len(t) else t
+    scored = _score_all(body, found)
     top = [b for _, b in scored[:max(1, top_n)]]
+    # ヒントの選び方は従来の random.choice と同じ乱数の使い方（シードが同じなら同じヒント）
+    pick = (rng or random).randrange
+    advice = tuple(pick(len(b["advice"])) if b["advice"] else None for b in top)
+    spans = tuple(sorted(
+        ((b["key"],) + found[p] for _, b in scored for p in b["patterns"] if p in found),
+        key=lambda x: (x[1], x[2])))
 
-    header = f"🧠 **入力内容:** {t}\n📂 **カテゴリ:** {category or '未選択'}\n---\n"
-    if not top:
-        body = ("🔎 目立つ認知バイアスは特に検出されませんでした。\n"
-                "とはいえ、反例や別視点の情報を**意識的に**集める癖をつけると、よりバランスの良い判断に近づけます。")
+    hits = rules.score(body) if rules is not None else []
+    return Diagnosis(
+        text=t,
+        category=category,
+        scores=tuple((b["key"], s) for s, b in scored),
+        top=tuple(b["key"] for b in top),
+        advice=advice,
+        spans=spans,
+        rules=tuple((h["key"], h["label"], h["score"]) for h in hits),
+        actions=tuple(hits[0]["interventions"][:2]) if hits else (),
+        truncated_at=n if n < len(t) else 0,
+    )
+
+def _diagnose(text: str, category=None, top_n: int = 3, rng=None, rules=None,
+              max_chars=MAX_INPUT_CHARS) -> Diagnosis:
+    """1件分の構造化結果（Diagnosis）。
+    rules（rules_engine.RulesEngine）を渡すと rules.json のヒットも入る。
+    max_chars を超える長文は先頭（文の区切りまで）だけを診断する（None で無制限）。"""
+    t = (text or "").strip()
+    if not t:
+        return Diagnosis(t, category)
+    n = _clip(t, max_chars)
+    return _assemble(t, n, _MATCHER.scan(t[:n] if n < len(t) else t), category, top_n, rng, rules)
+
+def analyze_with_ai(text: str, category=None, top_n: int = 3, seed=None, rules=None,
+                    max_chars=MAX_INPUT_CHARS) -> Diagnosis:
+    """
+    外部APIを使わず、文章の言い回しから代表的なバイアスを簡易推定。
+    結果は Diagnosis（表示は render_diagnosis() で“プチ診断”文にする）。
+    seed を渡すとヒントの選び方が再現可能になる。
+    rules（rules_engine.RulesEngine）を渡すと rules.json の対処法も1行添える。
+    max_chars: 診断する最大文字数（既定は環境変数 ANALYZE_MAX_CHARS、なければ 20000）
+    """
+    rng = random.Random(seed) if seed is not None else None
+    return _diagnose(text, category, top_n, rng, rules, max_chars)
+
+# ================================
+# 📜 文ごとの逐次診断（長文用）
+# ================================
+# 文末の記号（。！？）は文に含める。改行だけの区切りは含めない
+_SENTENCE_SPLIT_RX = re.compile(r"[^。！？!?\n]+[。！？!?]*")
+
+def split_sentences(text: str):
+    """文の (開始, 終了) を順に返す（空白だけの文は飛ばす）"""
+    for m in _SENTENCE_SPLIT_RX.finditer(text):
+        if not m.group().isspace():
+            yield m.span()
+
+@dataclass(frozen=True, slots=True)
+class SentenceHits:
+    """1文分の検出結果。位置はすべて元の文章全体での文字位置"""
+    index: int
+    start: int
+    end: int
+    scores: tuple   # ((バイアスkey, その文だけでのスコア), ...) スコア降順
+    spans: tuple    # ((バイアスkey, 開始, 終了), ...)
+
+    def names(self) -> tuple:
+        return tuple(_BY_KEY[k]["name"] for k, _ in self.scores)
+
+def analyze_stream(text: str, category=None, top_n: int = 3, seed=None, rules=None,
+                   max_chars=MAX_INPUT_CHARS):
+    """
+    文ごとに診断し、何か見つかった文の SentenceHits をその都度返すジェネレーター。
+    最後に文書全体の Diagnosis を1つ返す（analyze_with_ai と同じ形。
+    ただし照合は文ごとなので、文をまたぐ言い回しは拾わない）。
+    長文でも最初の検出がすぐ返るので、画面に少しずつ出せる。
+    """
+    rng = random.Random(seed) if seed is not None else None
+    t = (text or "").strip()
+    if not t:
+        yield Diagnosis(t, category)
+        return
+    n = _clip(t, max_chars)
+    body = t[:n] if n < len(t) else t
+    found = {}
+    for i, (a, b) in enumerate(split_sentences(body)):
+        sentence = body[a:b]
+        local = _MATCHER.scan(sentence)
+        if not local:
+            continue
+        for p, (s, e) in local.items():
+            found.setdefault(p, (a + s, a + e))
+        scored = _score_all(sentence, local)
+        if scored:
+            yield SentenceHits(
+                index=i, start=a, end=b,
+                scores=tuple((bias["key"], sc) for sc, bias in scored),
+                spans=tuple(sorted(
+                    (bias["key"], a + local[p][0], a + local[p][1])
+                    for _, bias in scored for p in bias["patterns"] if p in local)),
+            )
+    yield _assemble(t, n, found, category, top_n, rng, rules)
+
+# ================================
+# 📦 まとめて診断（オフライン集計用）
+# ================================
+def _item_rng(seed, i):
+    # 文字列シードはプロセスをまたいでも同じ乱数列になる
+    return random.Random(f"{seed}:{i}") if seed is not None else None
+
+def _analyze_chunk(chunk, top_n, seed):
+    """プロセスプール用：(通し番号, テキスト, カテゴリ) のまとまりを処理"""
+    return [_diagnose(t, c, top_n, _item_rng(seed, i)) for i, t, c in chunk]
+
+def _chunked(items, size):
+    buf = []
+    for it in items:
+        buf.append(it)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+def _map_windowed(ex, fn, chunks, window: int):
+    """ex.map と同じ順で結果を返す。ただし先に投入するのは window 個まで（入力を先読みしきらない）"""
+    from collections import deque
+    pending = deque()
+    for chunk in chunks:
+        pending.append(ex.submit(fn, chunk))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def analyze_many(texts, categories=None, top_n: int = 3, seed=None,
+                 processes=None, chunksize: int = 1000, start: int = 0,
+                 executor=None) -> list:
+    """
+    複数テキストをまとめて診断し、1件ごとの Diagnosis を入力順に返す。
+      - categories: None / 全件共通の文字列 / texts と同じ長さの列（長さが違えば ValueError）
+      - seed: 指定するとヒントの選び方が再現可能（並列でも同じ結果）
+      - processes: 1以上でプロセスプールを使う（0/None は逐次）
+      - chunksize: プロセスへ渡す1回分の件数
+      - start: 通し番号の開始値（大きな入力を分割して呼ぶときに続きから数える）
+      - executor: 使い回したい既存のプロセスプール（渡すと processes は無視）
+    プールに投入するのはワーカー数の2倍のまとまりまで（texts はジェネレーターでもよい）。
+    """
+    if categories is None or isinstance(categories, str):
+        from itertools import repeat
+        pairs = zip(texts, repeat(categories))
     else:
-        parts = []
-        for b in top:
-            parts.append(_format_diag(b["name"], b["desc"], b["advice"]))
-        parts.append("📌 **ワンポイント:** 反対側の意見や別の国・事例も1つ参照してから結論づけると、判断の偏りを減らせます。")
-        body = "\n\n".join(parts)
+        pairs = zip(texts, categories, strict=True)
+    items = ((i, t, c) for i, (t, c) in enumerate(pairs, start))
 
-    return header + "✅ **AIプチ診断**\n" + body
+    if executor is None and not processes:
+        return [_diagnose(t, c, top_n, _item_rng(seed, i)) for i, t, c in items]
+
+    from functools import partial
+    work = partial(_analyze_chunk, top_n=top_n, seed=seed)
+    chunks = _chunked(items, max(1, chunksize))
+    results = []
+    if executor is not None:
+        window = 2 * (getattr(executor, "_max_workers", None) or os.cpu_count() or 1)
+        for part in _map_windowed(executor, work, chunks, window):
+            results.extend(part)
+        return results
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as ex:
+        for part in _map_windowed(ex, work, chunks, 2 * processes):
+            results.extend(part)
+    return results
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# pages/2_履歴.py
+import html
+import json
+
+import streamlit as st
+
+from cache_versions import warm_shared
+from decision_log import get_decision_log, session_owner
+from logic_simple import Diagnosis, render_diagnosis, render_finding_card
+from ui_components import highlighted_text, inject_css
+
+PAGE_SIZE = 20
+TITLE_CHARS = 40
+# 一覧で読む列（本文の詳細は開いたときだけ details 表から読む）。
+# 見出しにしか使わない text / options は先頭だけ読む（1文字多く読んで「…」を付けるか決める）
+LIST_COLUMNS = ("decision_id", "text", "options", "biases")
+LIST_CLIP = {"text": TITLE_CHARS + 1, "options": TITLE_CHARS + 1}
+
+# =========================
+# ページ固有のキー（衝突防止）
+# =========================
+KEY_PREFIX = "p3_"
+def k(name: str) -> str:
+    return KEY_PREFIX + name
+
+st.markdown("""
+<style>
+.block-container{max-width:720px;margin:auto;}
+h1{font-size:1.6rem !important;margin:1.8rem 0 1rem 0;}
+.small{color:#667085;font-size:.88rem;}
+</style>
+""", unsafe_allow_html=True)
+
+st.markdown("# 🗂 これまでの解析")
+st.caption("このブラウザで行った解析結果を新しい順に見返せます（ページを開き直すと新しい履歴になります）。")
+
+log = get_decision_log()
+owner = session_owner()  # 自分の解析だけを出す
+
+# カーソル（各ページの先頭位置）を積んでおき、前後に移動する
+# None = 最新から。次のページの cursor は「今のページの最後の行の (timestamp, seq)」
+if k("cursors") not in st.session_state:
+    st.session_state[k("cursors")] = [None]
+cursors = st.session_state[k("cursors")]
+
+# 1件多く読んで「次がある」かを判定（数え上げの COUNT(*) はしない）
+rows = log.recent(PAGE_SIZE + 1, before=cursors[-1], columns=LIST_COLUMNS, owner=owner, clip=LIST_CLIP)
+has_next = len(rows) > PAGE_SIZE
+rows = rows[:PAGE_SIZE]
+
+if not rows:
+    st.info("まだ履歴がありません。トップページか「バイアス分析」で解析するとここに残ります。")
+
+
+def _show_detail(seq: int):
+    d = log.detail(seq, owner=owner)
+    if d is None:
+        st.caption("（詳細は保存されていません）")
+        return
+    kind, body, text = d
+    if kind == "diagnosis":
+        inject_css()  # highlighted_text 用
+        res = Diagnosis.from_json(body, text)  # 文章は JSON ではなく行の text 列から
+        if res.spans:
+            highlighted_text(res.text, res.highlights())
+        st.markdown(render_diagnosis(res))
+    elif kind == "selection":
+        data = json.loads(body)
+        st.caption(f"{data.get('theme', '')}／{data.get('situation', '')}／{data.get('sign', '')}")
+        findings = data.get("findings") or []
+        if not findings:
+            st.success("この時は偏りは見つかりませんでした。")
+        for f in findings:
+            render_finding_card(f)
+    else:
+        st.code(body)
+
+
+for r in rows:
+    title = (r["text"] or r["options"] or "（メモなし）").replace("\n", " ")
+    if len(title) > TITLE_CHARS:
+        title = title[:TITLE_CHARS] + "…"
+    with st.container(border=True):
+        st.markdown(f"**{title}**")
+        st.markdown(f'<span class="small">{r["timestamp"]}　{html.escape(r["biases"] or "検出なし")}</span>',
+                    unsafe_allow_html=True)
+        # 開いている行だけ詳細を読み込む（閉じている行は DB に触らない）
+        if st.toggle("詳細を見る", key=k(f"open_{r['seq']}")):
+            _show_detail(r["seq"])
+
+# =========================
+# ページ送り
+# =========================
+col1, col2, col3 = st.columns([1, 1, 1])
+with col1:
+    if len(cursors) > 1 and st.button("← 新しい", key=k("prev")):
+        cursors.pop()
+        st.rerun()
+with col2:
+    st.markdown(f'<div class="small" style="text-align:center">{len(cursors)} ページ目</div>',
+                unsafe_allow_html=True)
+with col3:
+    if has_next and st.button("古い →", key=k("next")):
+        last = rows[-1]
+        cursors.append((last["timestamp"], last["seq"]))
+        st.rerun()
+
+# どのページから入っても、よく使うキャッシュはプロセスで1回だけ温める（cache_versions.warm_shared）
+warm_shared()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# pages/3_傾向.py
+import datetime
+
+import streamlit as st
+
+from cache_versions import file_version, warm_shared
+from logic_simple import _BIASES, SELECTION_RULES_PATH, _selection_index
+from trends import get_trend_store
+
+# =========================
+# ページ固有のキー（衝突防止）
+# =========================
+KEY_PREFIX = "p4_"
+def k(name: str) -> str:
+    return KEY_PREFIX + name
+
+SOURCES = {"自由記述の診断": "diagnosis", "かんたん版（A/B/C）": "selection"}
+PERIODS = {"7日": 7, "30日": 30, "90日": 90, "すべて": None}
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _labels(version: str) -> dict:
+    """
+    (種類, バイアス key) → 表示名（version は selection_rules.json の版。変われば作り直す）。
+    同じ key（bandwagon など）でも診断とかんたん版で名前が違うので、種類ごとに分ける
+    """
+    names = {("diagnosis", b["key"]): b["name"] for b in _BIASES}
+    names.update({("selection", b["key"]): b["label"] for b in _selection_index().biases})
+    return names
+
+
+st.markdown("""
+<style>
+.block-container{max-width:720px;margin:auto;}
+h1{font-size:1.6rem !important;margin:1.8rem 0 1rem 0;}
+</style>
+""", unsafe_allow_html=True)
+
+st.markdown("# 📈 バイアスの傾向")
+st.caption("解析のたびに更新している集計表から表示しています（履歴の件数が増えても重くなりません）。")
+
+store = get_trend_store()
+col1, col2, col3 = st.columns(3)
+with col1:
+    source = SOURCES[st.selectbox("種類", list(SOURCES), key=k("source"))]
+with col2:
+    category = st.selectbox("カテゴリ", ["すべて"] + store.categories(source), key=k("category"))
+with col3:
+    days = PERIODS[st.selectbox("期間", list(PERIODS), index=1, key=k("period"))]
+
+since = datetime.date.today() - datetime.timedelta(days=days - 1) if days else None
+cat = None if category == "すべて" else category
+labels = _labels(file_version(SELECTION_RULES_PATH))
+label = lambda key: labels.get((source, key), key)
+
+# どのページから入っても、よく使うキャッシュはプロセスで1回だけ温める（下で st.stop() することがあるのでここで）
+warm_shared()
+
+daily = store.daily(source, cat, since)
+if daily.empty:
+    st.info("この条件の集計はまだありません。")
+    st.stop()
+
+daily["bias"] = daily["bias"].map(label)
+runs = daily.drop_duplicates("day").set_index("day")["runs"]
+totals = daily.groupby("bias")["n"].sum().sort_values(ascending=False)
+
+c1, c2 = st.columns(2)
+c1.metric("解析件数", f"{int(runs.sum()):,}")
+c2.metric("よく出たバイアス", totals.index[0])
+
+# =========================
+# 日ごとの推移（上位のバイアスだけ）
+# =========================
+st.subheader("日ごとの推移")
+top = list(totals.index[:6])
+chart = (daily[daily["bias"].isin(top)]
+         .pivot_table(index="day", columns="bias", values="n", aggfunc="sum", fill_value=0))
+st.line_chart(chart[top])
+
+st.subheader("検出された割合")
+share = (totals / runs.sum()).rename("割合").to_frame()
+share["件数"] = totals
+st.dataframe(share.style.format({"割合": "{:.0%}"}), use_container_width=True)
+
+# =========================
+# 一緒に出やすい組み合わせ
+# =========================
+st.subheader("一緒に出やすい組み合わせ")
+pairs = store.cooccurrence(source, cat, since)
+if pairs.empty:
+    st.caption("（2つ以上同時に検出された解析はまだありません）")
+else:
+    pairs["a"] = pairs["a"].map(label)
+    pairs["b"] = pairs["b"].map(label)
+    st.dataframe(
+        pairs.head(20).rename(columns={"a": "バイアス1", "b": "バイアス2", "n": "件数", "lift": "リフト"})
+        .style.format({"リフト": "{:.2f}"}),
+        use_container_width=True, hide_index=True)
+    st.caption("リフト：1より大きいほど、偶然より一緒に出やすい組み合わせ")
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+ルール診断を先に出し、必要なときだけ LLM に回す振り分け（ハイブリッド）。
+  - いつもローカルのルール診断（1ms 未満）を先に返して表示する
+  - 上位のスコアがしきい値未満・上位2つが同点（差が tie_margin 以下）・ユーザーが
+    「詳しく」を選んだ、のどれかのときだけ LLM に回す
+  - 振り分けの判断は routes 表に残す。what_if() で別のしきい値なら LLM に回る割合が
+    どう変わるかを試算して、しきい値を調整する
+  - LLM に回した回は、送る前の見積もりと実際のトークン数（usage）も残す
+しきい値は環境変数 ROUTER_MIN_SCORE（既定 0.5）と ROUTER_TIE_MARGIN（既定 0.0）。
+"""
+import os
+import sqlite3
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import streamlit as st
+
+DB_PATH = Path(__file__).with_name("decisions.db")
+MIN_SCORE = float(os.getenv("ROUTER_MIN_SCORE", "0.5"))
+TIE_MARGIN = float(os.getenv("ROUTER_TIE_MARGIN", "0.0"))
+
+# 判断の理由（escalate するのは confident 以外）
+REASONS = ("deep", "no_hits", "low_score", "tie", "confident")
+# LLM に回した回だけ入る列（token_budget の見積もりと API の usage）
+TOKEN_COLUMNS = ("est_tokens", "prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+@dataclass(frozen=True, slots=True)
+class Route:
+    escalate: bool
+    reason: str
+    top1: float = 0.0   # ルール診断の1位のスコア
+    top2: float = 0.0   # 2位のスコア（なければ 0）
+    n_hits: int = 0     # スコアが付いたバイアスの数
+
+
+def decide(diagnosis, deep: bool = False, min_score: float = MIN_SCORE,
+           tie_margin: float = TIE_MARGIN) -> Route:
+    """logic_simple.Diagnosis を見て LLM に回すかを決める"""
+    scores = [s for _, s in diagnosis.scores]
+    top1 = scores[0] if scores else 0.0
+    top2 = scores[1] if len(scores) > 1 else 0.0
+    if deep:
+        reason = "deep"
+    elif not scores:
+        reason = "no_hits"
+    elif top1 < min_score:
+        reason = "low_score"
+    elif len(scores) > 1 and top1 - top2 <= tie_margin:
+        reason = "tie"
+    else:
+        reason = "confident"
+    return Route(reason != "confident", reason, top1, top2, len(scores))
+
+
+class RouteLog:
+    """振り分けの記録（1回の送信 = 1行）。llm は LLM の結果の種類（"llm" / "fallback" / "partial" /
+    "unavailable"、回さなかったときは ""）"""
+
+    def __init__(self, db_path=DB_PATH):
+        self.stats = Counter()  # プロセス起動後の理由ごとの件数（サイドバー表示用）
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS routes ("
+            " rseq INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT NOT NULL,"
+            " category TEXT NOT NULL, chars INTEGER NOT NULL,"
+            " top1 REAL NOT NULL, top2 REAL NOT NULL, n_hits INTEGER NOT NULL,"
+            " reason TEXT NOT NULL, escalated INTEGER NOT NULL, llm TEXT NOT NULL,"
+            " local_ms REAL, llm_ms REAL)")
+        # トークン数の列は後から足した（既存の表には ALTER で追加）
+        have = {r[1] for r in self._db.execute("PRAGMA table_info(routes)")}
+        for col in TOKEN_COLUMNS:
+            if col not in have:
+                self._db.execute(f"ALTER TABLE routes ADD COLUMN {col} INTEGER")
+        self._db.commit()
+
+    def record(self, route: Route, *, category=None, chars: int = 0, llm: str = "",
+               local_ms=None, llm_ms=None, usage=None):
+        """usage: {"est_tokens", "prompt_tokens", ...}（足りないものは NULL のまま）"""
+        escalated = bool(llm) and llm != "unavailable"
+        usage = usage or {}
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO routes (ts, category, chars, top1, top2, n_hits, reason, escalated,"
+                f" llm, local_ms, llm_ms, {', '.join(TOKEN_COLUMNS)})"
+                " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (datetime.now().isoformat(timespec="seconds"), category or "未選択", chars,
+                 route.top1, route.top2, route.n_hits, route.reason, int(escalated), llm,
+                 local_ms, llm_ms) + tuple(usage.get(c) for c in TOKEN_COLUMNS))
+            self.stats[route.reason] += 1
+            self.stats["escalated"] += escalated
+
+    def summary(self, since=None) -> list:
+        """理由ごとの [(理由, 件数, LLM に回した件数, LLM の平均 ms, 入力トークン計, 出力トークン計), ...]"""
+        sql = ("SELECT reason, COUNT(*), SUM(escalated), AVG(llm_ms),"
+               " SUM(prompt_tokens), SUM(completion_tokens) FROM routes")
+        args = []
+        if since:
+            sql += " WHERE ts >= ?"
+            args.append(since)
+        with self._lock:
+            return self._db.execute(sql + " GROUP BY reason ORDER BY COUNT(*) DESC", args).fetchall()
+
+    def what_if(self, min_score: float, tie_margin: float, since=None) -> dict:
+        """記録済みの送信に別のしきい値を当てはめたら、何件が LLM に回るか（"詳しく" の分は除く）"""
+        sql = ("SELECT COUNT(*),"
+               " SUM(n_hits = 0 OR top1 < ? OR (n_hits > 1 AND top1 - top2 <= ?))"
+               " FROM routes WHERE reason != 'deep'")
+        args = [min_score, tie_margin]
+        if since:
+            sql += " AND ts >= ?"
+            args.append(since)
+        with self._lock:
+            n, esc = self._db.execute(sql, args).fetchone()
+        return {"submissions": n, "escalate": esc or 0, "rate": (esc or 0) / n if n else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+@st.cache_resource(show_spinner=False)
+def get_route_log() -> RouteLog:
+    """プロセス共有の記録（保存先は意思決定ログと同じ DECISION_LOG_DB）"""
+    return RouteLog(os.getenv("DECISION_LOG_DB", str(DB_PATH)))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+rules.json（バイアスごとの keywords / interventions）を読み込むキーワード診断エンジン。
+  - JSON の解析と照合器の構築は1回だけ（st.cache_resource に保持）
+  - rules.json の版（更新時刻とサイズ。cache_versions.file_version）が変わったときだけ読み直す
+    （再起動なしでルールを差し替えられる）
+  - score() は analyze_selection / analyze_with_ai の両方から使える
+"""
+import json
+import re
+from pathlib import Path
+
+import streamlit as st
+
+from cache_versions import file_version
+from logic_simple import _PatternSet
+
+RULES_PATH = Path(__file__).with_name("rules.json")
+
+
+class RulesEngine:
+    """全キーワードを1本の照合器にまとめ、1回の走査でバイアスごとのヒットを数える"""
+
+    def __init__(self, rules: dict):
+        self.rules = rules
+        self._owners = {}  # キーワード → そのキーワードを持つバイアスのキー
+        for key, spec in rules.items():
+            for w in spec.get("keywords", []):
+                self._owners.setdefault(w, []).append(key)
+        self._word_of = {re.escape(w): w for w in self._owners}
+        self._matcher = _PatternSet(self._word_of)
+
+    def score(self, text: str) -> list:
+        """
+        テキスト中のキーワードからバイアス候補を返す（スコア降順）。
+        各要素: {"key","label","score","evidence"(一致した語),"interventions"}
+        スコアは logic_simple._score_bias と同じ「半分＋1ヒットで満点」の目安。
+        """
+        matched = {}
+        for p in self._matcher.matched(text or ""):
+            w = self._word_of[p]
+            for key in self._owners[w]:
+                matched.setdefault(key, []).append(w)
+
+        hits = []
+        for key, words in matched.items():
+            spec = self.rules[key]
+            kws = spec.get("keywords", [])
+            words.sort(key=kws.index)
+            denom = max(2, len(kws) // 2 + 1)
+            hits.append({
+                "key": key,
+                "label": spec.get("label", key),
+                "score": min(1.0, len(words) / denom),
+                "evidence": words,
+                "interventions": list(spec.get("interventions", [])),
+            })
+        hits.sort(key=lambda h: h["score"], reverse=True)
+        return hits
+
+
+def load_rules(path=RULES_PATH) -> RulesEngine:
+    with open(path, encoding="utf-8") as f:
+        return RulesEngine(json.load(f))
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _cached_engine(path: str, version: str) -> RulesEngine:
+    # version はキャッシュキーとしてだけ使う（変われば新しいエントリ＝読み直し）
+    return load_rules(path)
+
+
+def get_rules_engine(path=RULES_PATH) -> RulesEngine:
+    """プロセス共有のエンジンを返す。rules.json が更新されていれば読み直す。"""
+    return _cached_engine(str(path), file_version(path))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+テスト共通の準備。
+  - リポジトリ直下のモジュール（llm_cache, llm_client など）を import できるようにする
+  - streamlit が入っていない環境では、import だけ通る最小のスタブを入れる
+    （st.cache_resource はデコレーターとしてそのまま関数を返す）
+"""
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _streamlit_stub():
+    st = types.ModuleType("streamlit")
+
+    def cache(func=None, **_kwargs):
+        if callable(func):
+            return func
+        return lambda f: f
+
+    cache.clear = lambda: None
+    st.cache_resource = st.cache_data = cache
+    st.session_state = {}
+    st.secrets = {}
+    st.__getattr__ = lambda name: (lambda *a, **k: None)
+    return st
+
+
+try:
+    import streamlit  # noqa: F401
+except ImportError:
+    sys.modules["streamlit"] = _streamlit_stub()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""calibration.Calibration.refresh: 追記分の読み込みと結果記録の順番"""
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+from calibration import Calibration  # noqa: E402
+
+
+class FakeLog:
+    """DecisionLog の iter_batches / outcome_events だけを真似る"""
+
+    def __init__(self, rows, events):
+        self.rows = rows        # [(seq, pre, post, biases), ...]
+        self.events = events    # [(oseq, seq, outcome, prev), ...]
+
+    def iter_batches(self, columns, after=0):
+        rows = [r for r in self.rows if r[0] > after]
+        if rows:
+            yield rows
+
+    def outcome_events(self, after=0):
+        events = [e for e in self.events if e[0] > after]
+        if events:
+            yield events
+
+
+def test_outcome_for_unread_row_is_not_skipped():
+    # oseq 2 はまだ読んでいない seq 3 の結果。後ろの oseq 3 を先に反映してはいけない
+    log = FakeLog([(1, 0.6, 0.7, ""), (2, 0.5, 0.6, "")],
+                  [(1, 1, 1.0, None), (2, 3, 0.0, None), (3, 2, 1.0, None)])
+    cal = Calibration()
+    cal.refresh(log)
+    assert cal.last_oseq == 1
+    assert cal.summary()["with_outcome"] == 1
+
+    log.rows.append((3, 0.9, 0.8, ""))
+    cal.refresh(log)
+    assert cal.last_oseq == 3
+    assert cal.summary()["with_outcome"] == 3
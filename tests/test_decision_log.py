@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""decision_log.DecisionLog: 持ち主（owner）ごとの履歴と一覧の読み方"""
+import csv
+import io
+import sqlite3
+
+from decision_log import COLUMNS, DecisionLog
+
+
+def make_log(tmp_path):
+    log = DecisionLog(tmp_path / "d.db")
+    log.append({"text": "Aさんの相談", "timestamp": "2025-01-01T00:00:01"}, owner="a",
+               kind="diagnosis", detail="{}")
+    log.append({"text": "Bさんの相談", "timestamp": "2025-01-01T00:00:02"}, owner="b",
+               kind="diagnosis", detail="{}")
+    log.append({"text": "Aさんの2件目", "timestamp": "2025-01-01T00:00:03"}, owner="a")
+    return log
+
+
+def test_recent_only_returns_owner_rows(tmp_path):
+    log = make_log(tmp_path)
+    assert [r["text"] for r in log.recent(10, owner="a")] == ["Aさんの2件目", "Aさんの相談"]
+    assert [r["text"] for r in log.recent(10, owner="b")] == ["Bさんの相談"]
+    assert log.recent(10, owner="c") == []
+    assert len(log.recent(10)) == 3          # owner なしは管理用（全員分）
+
+
+def test_recent_paging_stays_within_owner(tmp_path):
+    log = make_log(tmp_path)
+    first = log.recent(1, owner="a")
+    rest = log.recent(10, before=(first[0]["timestamp"], first[0]["seq"]), owner="a")
+    assert [r["text"] for r in rest] == ["Aさんの相談"]
+
+
+def test_detail_checks_owner(tmp_path):
+    log = make_log(tmp_path)
+    seq_b = log.recent(1, owner="b")[0]["seq"]
+    assert log.detail(seq_b, owner="b") == ("diagnosis", "{}", "Bさんの相談")
+    assert log.detail(seq_b, owner="a") is None
+
+
+def test_iter_batches_by_owner(tmp_path):
+    log = make_log(tmp_path)
+    rows = [r["text"] for b in log.iter_batches(("text",), owner="a") for r in b]
+    assert rows == ["Aさんの相談", "Aさんの2件目"]
+    assert sum(len(b) for b in log.iter_batches(("text",))) == 3
+
+
+def test_recent_clip_reads_prefix_only(tmp_path):
+    log = DecisionLog(tmp_path / "d.db")
+    log.append({"text": "あ" * 100}, owner="a")
+    row = log.recent(1, columns=("text",), owner="a", clip={"text": 41})[0]
+    assert row["text"] == "あ" * 41
+
+
+def test_csv_columns_unchanged_and_old_db_migrated(tmp_path):
+    path = tmp_path / "old.db"
+    db = sqlite3.connect(str(path))
+    cols = ", ".join(f'"{c}" TEXT NOT NULL DEFAULT \'\'' for c in COLUMNS[1:])
+    db.execute(f'CREATE TABLE decisions (seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+               f' "decision_id" TEXT NOT NULL UNIQUE, {cols})')
+    db.execute('INSERT INTO decisions("decision_id", "text") VALUES (\'x\', \'古い行\')')
+    db.commit()
+    db.close()
+    log = DecisionLog(path)
+    assert log.recent(10, owner="a") == []   # 持ち主のない古い行はどの履歴にも出ない
+    assert list(next(log.iter_all()).keys()) == ["seq", *COLUMNS]
+    assert log.get("x")["text"] == "古い行"
+    assert log.append({"text": "新しい行"})          # 移行後も追記できる
+    assert [r["seq"] for r in log.iter_all()] == [1, 2]
+
+
+def _csv_bytes(rows) -> bytes:
+    buf = io.StringIO(newline="")
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(COLUMNS)
+    w.writerows(rows)
+    return buf.getvalue().encode("utf-8-sig")
+
+
+def test_csv_round_trip_is_lossless(tmp_path):
+    blank = [""] * len(COLUMNS)
+
+    def row(**kw):
+        r = list(blank)
+        for c, v in kw.items():
+            r[COLUMNS.index(c)] = v
+        return r
+
+    rows = [
+        row(text="x"),                                            # id・時刻が空
+        row(text="y", biases="確証バイアス"),                      # id が空の行が2つ
+        row(decision_id="a1", timestamp="2025-01-01T00:00:00", text="1行目\n2行目\r\n3行目"),
+        row(decision_id="a2", timestamp="2025-01-02T00:00:00", text='彼は"絶対"と言った, たぶん',
+            evidence=" 前後の空白 "),
+    ]
+    src = tmp_path / "in.csv"
+    src.write_bytes(_csv_bytes(rows))
+    log = DecisionLog(tmp_path / "d.db")
+    assert log.import_csv(src) == 4
+    out = tmp_path / "out.csv"
+    assert log.export_csv(out) == 4
+    data = out.read_bytes()
+    assert data.startswith(b"\xef\xbb\xbf") and data.count(b"\xef\xbb\xbf") == 1
+    assert data == src.read_bytes()
+
+
+def test_reimport_updates_rows_with_an_id(tmp_path):
+    log = DecisionLog(tmp_path / "d.db")
+    src = tmp_path / "in.csv"
+    row = ["a1", "2025-01-01T00:00:00", "最初"] + [""] * (len(COLUMNS) - 3)
+    src.write_bytes(_csv_bytes([row]))
+    log.import_csv(src)
+    row[2] = "直した"
+    src.write_bytes(_csv_bytes([row]))
+    log.import_csv(src)
+    assert log.count() == 1 and log.get("a1")["text"] == "直した"
+    assert log.get("") is None and not log.update("", text="z")   # 空の id では選べない
+
+
+def test_append_fills_id_and_timestamp(tmp_path):
+    log = DecisionLog(tmp_path / "d.db")
+    decision_id = log.append({"text": "メモ"})
+    row = log.get(decision_id)
+    assert len(decision_id) == 12 and row["timestamp"]
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+llm_client.JSONStreamParser: 同じ文書をあらゆる切り方で feed() しても、
+一度に渡したときと同じ (キー, 値) が同じ順で出ることを確かめる。
+"""
+import json
+from itertools import combinations
+
+import pytest
+
+from llm_client import JSONStreamParser
+
+DOCS = {
+    "basic": (
+        '{"summary":"確証バイアスの可能性","biases":[{"name":"確証バイアス","score":0.8,"reason":"r"}],'
+        '"tips":["反証を探す","別の基準で比べる"]}',
+        [("summary", "確証バイアスの可能性"),
+         ("biases", {"name": "確証バイアス", "score": 0.8, "reason": "r"}),
+         ("tips", "反証を探す"), ("tips", "別の基準で比べる")],
+    ),
+    "escapes": (
+        r'{"summary":"引用\"A\" と \\ と\n改行","tips":["\\\"","あい","😀"]}',
+        [("summary", '引用"A" と \\ と\n改行'), ("tips", '\\"'), ("tips", "あい"), ("tips", "😀")],
+    ),
+    "raw_unicode": (
+        '{"summary":"絵文字😀とかな","tips":["ｶﾀｶﾅ","한국어"]}',
+        [("summary", "絵文字😀とかな"), ("tips", "ｶﾀｶﾅ"), ("tips", "한국어")],
+    ),
+    "nested": (
+        '{"biases":[{"name":"a","tags":["x",["y","}"]],"meta":{"k":[1,{"z":"]"}]}},'
+        '{"name":"b"}],"extra":[["deep","str"],{"summary":"偽物"}],'
+        '"meta":{"summary":"no","tips":["no"]},"summary":"後ろ","tips":["[括弧]","{波}"]}',
+        [("biases", {"name": "a", "tags": ["x", ["y", "}"]], "meta": {"k": [1, {"z": "]"}]}}),
+         ("biases", {"name": "b"}),
+         ("summary", "後ろ"), ("tips", "[括弧]"), ("tips", "{波}")],
+    ),
+    "pretty_and_empty": (
+        json.dumps({"tips": [], "biases": [], "summary": "", "score": 1.5}, indent=2),
+        [("summary", "")],
+    ),
+    "keys_with_escapes": (
+        r'{"sum\u006dary":"キーもエスケープ","ti\u0070s":["a\u3042"]}',
+        [("summary", "キーもエスケープ"), ("tips", "aあ")],
+    ),
+}
+
+
+def feed_all(chunks):
+    p = JSONStreamParser()
+    events = []
+    for c in chunks:
+        events.extend(p.feed(c))
+    return p, events
+
+
+def splits(doc, n_cuts):
+    for cuts in combinations(range(1, len(doc)), n_cuts):
+        bounds = (0, *cuts, len(doc))
+        yield [doc[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+@pytest.mark.parametrize("name", DOCS)
+def test_whole_document(name):
+    doc, expected = DOCS[name]
+    p, events = feed_all([doc])
+    assert events == expected
+    assert p.result() == json.loads(doc)
+
+
+@pytest.mark.parametrize("name", DOCS)
+def test_every_two_and_three_way_chunking(name):
+    doc, expected = DOCS[name]
+    for n_cuts in (1, 2):
+        for chunks in splits(doc, n_cuts):
+            _, events = feed_all(chunks)
+            assert events == expected, chunks
+
+
+@pytest.mark.parametrize("name", DOCS)
+def test_one_character_at_a_time(name):
+    doc, expected = DOCS[name]
+    p, events = feed_all(list(doc))
+    assert events == expected
+    assert p.result() == json.loads(doc)
+
+
+@pytest.mark.parametrize("name", DOCS)
+def test_truncated_input_gives_prefix_of_events(name):
+    doc, expected = DOCS[name]
+    for cut in range(len(doc)):
+        p, events = feed_all([doc[:cut]])
+        assert events == expected[:len(events)], doc[:cut]
+        # partial は出したイベントと一致する（表示済みの分だけを返せる）
+        partial = {}
+        for k, v in events:
+            if k in ("biases", "tips"):
+                partial.setdefault(k, []).append(v)
+            else:
+                partial[k] = v
+        assert p.partial == partial
+        with pytest.raises(ValueError):
+            p.result()
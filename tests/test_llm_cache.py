@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""llm_cache: キーの正規化、メモリ LRU と SQLite の2段、TTL、件数上限での削除"""
+import pytest
+
+import llm_cache
+from llm_cache import ResultCache, cache_key, normalize_text
+
+
+class Clock:
+    """time.time() の代わり（TTL を待たずに試す）"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", c)
+    return c
+
+
+# ---- キー ----
+@pytest.mark.parametrize("a, b", [
+    ("ＡＢＣ　１２３", "ABC 123"),          # 全角/半角
+    ("  みんな が\n\t買う  ", "みんな が 買う"),  # 前後と連続の空白
+    ("ｶﾀｶﾅ", "カタカナ"),                   # 半角カナ
+])
+def test_normalize_text_absorbs_width_and_spaces(a, b):
+    assert normalize_text(a) == normalize_text(b)
+    assert cache_key(a, "m", "v1", 0.2) == cache_key(b, "m", "v1", 0.2)
+
+
+def test_normalize_text_none():
+    assert normalize_text(None) == ""
+
+
+@pytest.mark.parametrize("other", [
+    ("別の文章", "m", "v1", 0.2),
+    ("文章", "m2", "v1", 0.2),
+    ("文章", "m", "v2", 0.2),
+    ("文章", "m", "v1", 0.3),
+])
+def test_cache_key_depends_on_every_part(other):
+    assert cache_key("文章", "m", "v1", 0.2) != cache_key(*other)
+
+
+def test_cache_key_temperature_is_rounded():
+    assert cache_key("x", "m", "v", 0.2) == cache_key("x", "m", "v", 0.20000001)
+
+
+# ---- メモリ LRU ----
+def test_memory_lru_evicts_least_recently_used(clock):
+    c = ResultCache(maxsize=2)
+    c.put("a", {"v": 1})
+    c.put("b", {"v": 2})
+    assert c.get("a") == {"v": 1}   # a を最近使ったことにする
+    c.put("c", {"v": 3})            # b が追い出される
+    assert c.get("b") is None
+    assert c.get("a") == {"v": 1}
+    assert c.get("c") == {"v": 3}
+    s = c.stats()
+    assert (s["hits"], s["misses"], s["mem_size"], s["evictions"]) == (3, 1, 2, 1)
+    assert s["disk_size"] == 0
+
+
+def test_memory_ttl(clock):
+    c = ResultCache(maxsize=4, ttl_s=10)
+    c.put("a", {"v": 1})
+    clock.now += 10
+    assert c.get("a") == {"v": 1}   # ちょうど期限は有効
+    clock.now += 1
+    assert c.get("a") is None
+    assert c.stats()["mem_size"] == 0
+
+
+def test_no_ttl(clock):
+    c = ResultCache(maxsize=4, ttl_s=None)
+    c.put("a", {"v": 1})
+    clock.now += 10 ** 9
+    assert c.get("a") == {"v": 1}
+
+
+def test_get_or_call_does_not_store_none(clock):
+    c = ResultCache(maxsize=4)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return None if len(calls) == 1 else {"v": len(calls)}
+
+    assert c.get_or_call("k", fn) is None
+    assert c.get_or_call("k", fn) == {"v": 2}
+    assert c.get_or_call("k", fn) == {"v": 2}
+    assert len(calls) == 2
+
+
+# ---- SQLite ----
+def test_disk_survives_new_instance(tmp_path, clock):
+    db = tmp_path / "c.db"
+    c1 = ResultCache(maxsize=1, db_path=db)
+    c1.put("a", {"summary": "確証バイアス"})
+    c1.put("b", {"v": 2})           # a はメモリからは追い出されるがディスクには残る
+    assert c1.get("a") == {"summary": "確証バイアス"}
+    assert c1.stats()["disk_hits"] == 1
+
+    c2 = ResultCache(maxsize=4, db_path=db)
+    assert c2.stats()["disk_size"] == 2
+    assert c2.get("b") == {"v": 2}
+    assert c2.get("b") == {"v": 2}
+    s = c2.stats()
+    assert (s["disk_hits"], s["mem_hits"]) == (1, 1)
+
+
+def test_disk_ttl_deletes_row(tmp_path, clock):
+    db = tmp_path / "c.db"
+    ResultCache(maxsize=4, db_path=db, ttl_s=10).put("a", {"v": 1})
+    clock.now += 11
+    c = ResultCache(maxsize=4, db_path=db, ttl_s=10)
+    assert c.get("a") is None
+    assert c.stats()["disk_size"] == 0
+
+
+def test_disk_eviction_removes_least_recently_accessed(tmp_path, clock):
+    c = ResultCache(maxsize=100, db_path=tmp_path / "c.db", max_rows=10)
+    for i in range(10):
+        clock.now += 1
+        c.put(f"k{i}", {"v": i})
+    c._mem.clear()                  # ディスクの順番だけを見る
+    clock.now += 1
+    assert c.get("k0") == {"v": 0}  # k0 の最終アクセスを新しくする
+    clock.now += 1
+    c.put("k10", {"v": 10})         # 上限超え：古い順に 1 + 10% の2件を消す
+    assert c.stats()["disk_size"] == 9
+    c._mem.clear()
+    assert c.get("k1") is None and c.get("k2") is None
+    assert c.get("k0") == {"v": 0}
+    assert c.get("k10") == {"v": 10}
+
+
+def test_overwrite_does_not_count_twice(tmp_path, clock):
+    c = ResultCache(maxsize=4, db_path=tmp_path / "c.db")
+    c.put("a", {"v": 1})
+    c.put("a", {"v": 2})
+    assert c.stats()["disk_size"] == 1
+    assert c.get("a") == {"v": 2}
+
+
+def test_warm_loads_most_recent_rows(tmp_path, clock):
+    db = tmp_path / "c.db"
+    c1 = ResultCache(maxsize=10, db_path=db)
+    for i in range(5):
+        clock.now += 1
+        c1.put(f"k{i}", {"v": i})
+    c2 = ResultCache(maxsize=3, db_path=db)
+    assert c2.warm() == 3
+    assert list(c2._mem) == ["k2", "k3", "k4"]
+    assert c2.warm() == 0           # 読み込み済みは数えない
+    assert ResultCache(maxsize=3).warm() == 0
+
+
+def test_clear(tmp_path, clock):
+    c = ResultCache(maxsize=4, db_path=tmp_path / "c.db")
+    c.put("a", {"v": 1})
+    c.clear()
+    assert c.get("a") is None
+    s = c.stats()
+    assert (s["mem_size"], s["disk_size"]) == (0, 0)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""llm_client.LLMGateway: 偽のクライアントでリトライ・モデルのフォールバック・ブレーカー・締め切りを試す"""
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_client
+from llm_client import CircuitBreaker, LLMGateway
+
+ANSWER = {"summary": "確証バイアスの可能性", "biases": [{"name": "確証バイアス", "score": 0.8, "reason": "r"}],
+          "tips": ["反証を探す"]}
+USAGE = SimpleNamespace(prompt_tokens=10, completion_tokens=5,
+                        prompt_tokens_details=SimpleNamespace(cached_tokens=4))
+
+
+class FakeStream:
+    def __init__(self, pieces, usage=USAGE, fail_after=None, delay=0.0):
+        self._pieces = list(pieces)
+        self._usage = usage
+        self._fail_after = fail_after
+        self._delay = delay
+        self.closed = False
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for i, piece in enumerate(self._pieces):
+            if self._fail_after is not None and i >= self._fail_after:
+                raise ConnectionError("stream cut")
+            await asyncio.sleep(self._delay)
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=self._usage)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """
+    script: {モデル名: [動作, ...]}。呼ばれるたびに先頭から1つ使う（最後の1つは使い続ける）。
+    動作: "ok" / 例外インスタンス / ("sleep", 秒) / ("stream", FakeStream)
+    """
+
+    def __init__(self, script):
+        self.script = {m: list(v) for m, v in script.items()}
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, *, model, stream=False, **kwargs):
+        self.calls.append(model)
+        self.last_kwargs = dict(kwargs, stream=stream)
+        steps = self.script[model]
+        step = steps.pop(0) if len(steps) > 1 else steps[0]
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, tuple) and step[0] == "sleep":
+            await asyncio.sleep(step[1])
+        if isinstance(step, tuple) and step[0] == "stream":
+            return step[1]
+        if stream:
+            text = json.dumps(ANSWER, ensure_ascii=False)
+            return FakeStream([text[i:i + 7] for i in range(0, len(text), 7)])
+        message = SimpleNamespace(content=json.dumps(ANSWER, ensure_ascii=False))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=USAGE)
+
+    async def close(self):
+        pass
+
+
+def make_gateway(script, models=("a", "b"), **kw):
+    kw = {"deadline_s": 2.0, "call_timeout_s": 1.0, "attempts_per_model": 2, "backoff_base_s": 0.0,
+          "breaker_threshold": 2, "breaker_reset_s": 60.0, **kw}
+    client = FakeClient(script)
+    return LLMGateway(models=models, client=client, **kw), client
+
+
+@pytest.fixture
+def gateways():
+    made = []
+
+    def make(*args, **kw):
+        gw, client = make_gateway(*args, **kw)
+        made.append(gw)
+        return gw, client
+
+    yield make
+    for gw in made:
+        gw.close()
+
+
+# ---- CircuitBreaker ----
+def test_breaker_opens_and_half_opens():
+    b = CircuitBreaker(threshold=2, reset_s=10)
+    b.record_failure(now=0)
+    assert b.allow(now=0) and b.state == "closed"
+    b.record_failure(now=1)
+    assert b.state == "open" and not b.allow(now=5)
+    assert b.allow(now=11) and b.state == "half-open"
+    assert not b.allow(now=12)       # 試行中は1回だけ
+    b.record_failure(now=12)         # 試行が失敗したらまた open
+    assert b.state == "open" and not b.allow(now=13)
+    assert b.allow(now=23)
+    b.record_success()
+    assert b.state == "closed" and b.failures == 0
+
+
+# ---- リトライとフォールバック ----
+def test_retry_then_success(gateways):
+    gw, client = gateways({"a": [RuntimeError("500"), "ok"], "b": ["ok"]})
+    usage = {}
+    assert gw.analyze("s", "u", on_usage=usage.update) == ANSWER
+    assert client.calls == ["a", "a"]
+    assert (gw.stats["errors"], gw.stats["ok"]) == (1, 1)
+    assert usage == {"model": "a", "prompt_tokens": 10, "completion_tokens": 5, "cached_tokens": 4}
+    assert gw.breaker_states() == {"a": "closed", "b": "closed"}
+
+
+def test_falls_back_to_next_model(gateways):
+    gw, client = gateways({"a": [RuntimeError("500")], "b": ["ok"]})
+    assert gw.analyze("s", "u") == ANSWER
+    assert client.calls == ["a", "a", "b"]
+    assert gw.breaker_states()["a"] == "open"
+
+
+def test_on_usage_reports_the_model_that_answered(gateways):
+    gw, client = gateways({"a": [RuntimeError("500")], "b": ["ok"]})
+    served = []
+    assert gw.analyze("s", "u", on_usage=served.append) == ANSWER
+    assert [u["model"] for u in served] == ["b"]
+    text = json.dumps(ANSWER, ensure_ascii=False)
+    gw, client = gateways({"a": [("stream", FakeStream([text], usage=None))]})
+    served = []
+    assert list(gw.analyze_stream("s", "u", on_usage=served.append))[-1] == ("done", ANSWER)
+    assert served == [{"model": "a"}]           # usage が返らなくてもモデルは知らせる
+
+def test_all_models_fail_uses_local_fallback(gateways):
+    gw, client = gateways({"a": [RuntimeError("500")], "b": [ValueError("bad json")]})
+    result = gw.analyze("s", "u", fallback_text="みんなが買っているから私も買う")
+    assert result["source"] == "local"
+    assert result["fallback_reason"] == "ValueError"
+    assert result["biases"]
+    assert client.calls == ["a", "a", "b", "b"]
+    assert gw.stats["fallbacks"] == 1
+    assert gw.analyze("s", "u") is None  # fallback_text なしなら None
+
+
+def test_open_breaker_skips_model(gateways):
+    gw, client = gateways({"a": [RuntimeError("500")], "b": ["ok"]})
+    gw.analyze("s", "u")
+    client.calls.clear()
+    assert gw.analyze("s", "u") == ANSWER
+    assert client.calls == ["b"]            # a は休ませている
+    assert gw.stats["short_circuits"] == 1
+
+
+def test_all_breakers_open(gateways):
+    gw, client = gateways({"a": [RuntimeError("500")]}, models=("a",))
+    gw.analyze("s", "u")
+    client.calls.clear()
+    assert gw.analyze("s", "u", fallback_text="x")["fallback_reason"] == "all_circuits_open"
+    assert client.calls == []
+
+
+
+def _worst_jitter(monkeypatch):
+    # フルジッターの上限をいつも引く（待ち時間が最大になる場合）
+    monkeypatch.setattr(llm_client.random, "uniform", lambda a, b: b)
+
+
+def test_no_backoff_after_last_attempt(gateways, monkeypatch):
+    _worst_jitter(monkeypatch)
+    gw, client = gateways({"a": [RuntimeError("500")]}, models=("a",), attempts_per_model=2,
+                          backoff_base_s=0.5, breaker_threshold=5)
+    t0 = time.perf_counter()
+    result = gw.analyze("s", "u", fallback_text="x")
+    elapsed = time.perf_counter() - t0
+    assert result["source"] == "local" and client.calls == ["a", "a"]
+    assert 0.5 <= elapsed < 0.9              # 1回目と2回目の間の 0.5 秒だけ。最後の後は待たない
+
+
+def test_no_backoff_when_breaker_opens(gateways, monkeypatch):
+    _worst_jitter(monkeypatch)
+    gw, client = gateways({"a": [RuntimeError("500")], "b": ["ok"]}, attempts_per_model=3,
+                          backoff_base_s=0.5, breaker_threshold=1)
+    t0 = time.perf_counter()
+    assert gw.analyze("s", "u") == ANSWER
+    assert time.perf_counter() - t0 < 0.3   # a が開いたらすぐ b へ
+    assert client.calls == ["a", "b"]
+    assert gw.stats["short_circuits"] == 1
+
+def test_version_dependent_options_go_through_extra_body(gateways):
+    # 古い SDK は prompt_cache_key / stream_options を引数として受け付けない
+    gw, client = gateways({"a": ["ok"]}, prompt_cache_key="bias-json-v2")
+    gw.analyze("s", "u")
+    assert "prompt_cache_key" not in client.last_kwargs
+    assert client.last_kwargs["extra_body"] == {"prompt_cache_key": "bias-json-v2"}
+    list(gw.analyze_stream("s", "u"))
+    assert "stream_options" not in client.last_kwargs
+    assert client.last_kwargs["extra_body"] == {"prompt_cache_key": "bias-json-v2",
+                                                "stream_options": {"include_usage": True}}
+
+
+# ---- クライアントの作成 ----
+def test_client_setup_failure_is_unavailable_not_a_model_failure(monkeypatch):
+    calls = []
+
+    def broken(self):
+        calls.append(1)
+        raise ImportError("No module named 'openai'")
+
+    monkeypatch.setattr(LLMGateway, "_make_client", broken)
+    gw = LLMGateway(models=("a", "b"), deadline_s=2.0)
+    try:
+        assert gw.analyze("s", "u", fallback_text="x") is None
+        assert list(gw.analyze_stream("s", "u", fallback_text="x")) == []
+        assert calls == [1]                      # 作り直さない
+        assert gw.client_error.startswith("ImportError")
+        assert gw.stats["unavailable"] == 2
+        assert (gw.stats["calls"], gw.stats["errors"]) == (0, 0)
+        assert all(b.failures == 0 for b in gw.breakers.values())
+    finally:
+        gw.close()
+
+
+def test_client_is_built_once_on_the_caller_thread(monkeypatch):
+    built_on = []
+    client = FakeClient({"a": ["ok"]})
+
+    def make(self):
+        built_on.append(threading.current_thread())
+        return client
+
+    monkeypatch.setattr(LLMGateway, "_make_client", make)
+    gw = LLMGateway(models=("a",))
+    try:
+        assert gw._client is None                # 作るのは最初の呼び出しのとき
+        assert gw.analyze("s", "u") == ANSWER
+        assert list(gw.analyze_stream("s", "u"))[-1] == ("done", ANSWER)
+        assert built_on == [threading.current_thread()]
+    finally:
+        gw.close()
+
+
+# ---- 締め切り ----
+def test_deadline_is_not_a_model_failure(gateways):
+    # call_timeout_s より先に全体の締め切りが来る：こちらの都合なのでブレーカーには数えない
+    gw, client = gateways({"a": [("sleep", 5)]}, models=("a",), deadline_s=0.2, call_timeout_s=5.0)
+    assert gw.analyze("s", "u", fallback_text="x")["fallback_reason"] == "deadline"
+    assert client.calls == ["a"]
+    assert gw.breakers["a"].failures == 0
+    assert gw.stats["errors"] == 0
+
+
+def test_slow_model_is_a_failure(gateways):
+    # 1回分の call_timeout_s を使い切ったのはモデルが遅いから：失敗に数えて次のモデルへ
+    gw, client = gateways({"a": [("sleep", 5)], "b": ["ok"]}, deadline_s=2.0, call_timeout_s=0.1)
+    assert gw.analyze("s", "u") == ANSWER
+    assert client.calls == ["a", "a", "b"]
+    assert gw.breakers["a"].failures == 2
+
+
+def test_busy_when_no_slot_before_deadline(gateways):
+    gw, client = gateways({"a": ["ok"]}, models=("a",), max_concurrency=1, deadline_s=0.2)
+    asyncio.run_coroutine_threadsafe(gw._sem.acquire(), gw._loop).result()  # 枠を埋めておく
+    assert gw.analyze("s", "u", fallback_text="x")["fallback_reason"] == "busy"
+    assert client.calls == []
+    assert gw.breakers["a"].failures == 0
+    gw._loop.call_soon_threadsafe(gw._sem.release)
+    assert gw.analyze("s", "u") == ANSWER
+
+
+# ---- ストリーム ----
+def test_stream_events_and_usage(gateways):
+    gw, client = gateways({"a": ["ok"]})
+    events = list(gw.analyze_stream("s", "u"))
+    assert [k for k, _ in events] == ["summary", "biases", "tips", "done"]
+    assert events[0] == ("summary", ANSWER["summary"])
+    assert events[-1] == ("done", ANSWER)
+    assert gw.stats["prompt_tokens"] == 10
+
+
+def test_stream_cut_after_output_returns_partial(gateways):
+    text = json.dumps(ANSWER, ensure_ascii=False)
+    stream = FakeStream([text[:40], text[40:80], text[80:]], fail_after=2)
+    gw, client = gateways({"a": [("stream", stream)], "b": ["ok"]})
+    events = list(gw.analyze_stream("s", "u", fallback_text="x"))
+    kind, done = events[-1]
+    assert kind == "done" and done["partial"] is True
+    assert done["summary"] == ANSWER["summary"]
+    assert done["fallback_reason"] == "ConnectionError"
+    assert client.calls == ["a"]             # 表示を始めた後はやり直さない
+    assert stream.closed
+
+
+def test_stream_unavailable_yields_local_fallback(gateways):
+    gw, client = gateways({"a": [RuntimeError("500")]}, models=("a",))
+    events = list(gw.analyze_stream("s", "u", fallback_text="みんなが買っているから私も買う"))
+    assert events[-1][0] == "done" and events[-1][1]["source"] == "local"
+    assert list(gw.analyze_stream("s", "u")) == []
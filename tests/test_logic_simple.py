@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""logic_simple: 1回走査の照合器（_PatternSet）がパターンごとの re.search と同じ結果を返すか"""
+import json
+import random
+import re
+import time
+
+import pytest
+
+import logic_simple as L
+
+try:  # Python 3.11+
+    import re._parser as sre_parse
+    import re._constants as sre_const
+except ImportError:
+    import sre_parse
+    import sre_constants as sre_const
+
+
+def _example(items, k: int) -> str:
+    """パターンに一致する文字列を1つ作る（交替は k 番目の分岐、繰り返しは最小回数・0 回なら 1 回）"""
+    out = []
+    for op, av in items:
+        if op == sre_const.LITERAL:
+            out.append(chr(av))
+        elif op == sre_const.ANY:
+            out.append("・")
+        elif op == sre_const.IN:
+            kind, val = av[0]
+            if kind == sre_const.LITERAL:
+                out.append(chr(val))
+            elif kind == sre_const.RANGE:
+                out.append(chr(val[0]))
+            else:  # \d など
+                out.append("7")
+        elif op == sre_const.SUBPATTERN:
+            out.append(_example(av[3], k))
+        elif op == sre_const.BRANCH:
+            out.append(_example(av[1][k % len(av[1])], k))
+        elif op in (sre_const.MAX_REPEAT, sre_const.MIN_REPEAT):
+            out.append(_example(av[2], k) * max(1, av[0]))
+    return "".join(out)
+
+
+def _examples(pat: str) -> list:
+    parsed = sre_parse.parse(pat)
+    return sorted({_example(parsed, k) for k in range(6)})
+
+
+def _search_all(patterns, text: str) -> dict:
+    """照合器を使わない基準：パターンごとに re.search"""
+    return {p: m.span() for p in patterns if (m := re.search(p, text, flags=re.IGNORECASE))}
+
+
+def _baseline_score(text: str, item: dict) -> float:
+    """1回走査の照合器を入れる前の _score_bias（パターンごとに re.search）"""
+    if not item["patterns"]:
+        return 0.0
+    hits = sum(1 for pat in item["patterns"] if re.search(pat, text, flags=re.IGNORECASE))
+    return min(1.0, hits / max(2, len(item["patterns"]) // 2 + 1))
+
+
+PATTERNS = list(dict.fromkeys(p for b in L._BIASES for p in b["patterns"]))
+EXAMPLES = [(p, ex) for p in PATTERNS for ex in _examples(p)]
+
+# 1件ずつのメモ（前後に無関係な文を付ける）と、全部を改行でつないだ長文
+TEXTS = [f"今日は晴れ。{ex}と思う。" for _, ex in EXAMPLES] + [
+    "\n".join(ex for _, ex in EXAMPLES),
+    "特に偏りのない普通のメモです。",
+    "みんなが買っているから私も買う。限定セールだし、絶対に得だと思う。",
+    "一人の意見で日本はダメだと決めた。だから失敗することになった。",
+    "30%引きだったので、90%成功すると思った。",
+]
+
+
+def test_every_pattern_has_an_example():
+    for pat, ex in EXAMPLES:
+        assert re.search(pat, ex, flags=re.IGNORECASE), (pat, ex)
+    assert {p for p, _ in EXAMPLES} == set(PATTERNS)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_scan_matches_re_search(text):
+    assert L._MATCHER.scan(text) == _search_all(PATTERNS, text)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_matched_agrees_with_scan(text):
+    assert L._MATCHER.matched(text) == set(L._MATCHER.scan(text))
+
+
+# ---- 大文字小文字・アンカー・エスケープの端 ----
+EDGE_PATTERNS = [
+    r"abc", r"bcd", r"k", r"ſtop", r"STRASSE", r"(?i:Q)rs",    # 重なり・大文字小文字
+    r"^start", r"end$", r"\Aab", r"yz\Z",                        # 先頭・末尾
+    r"colou?r", r"x{2}y", r"(foo|)bar", r"a|b|",                 # 省略できる文字・空の分岐
+    r"a\.b", r"\d{2}円", r"\x41B", r"\101Z", r"\N{HIRAGANA LETTER A}う",  # エスケープ
+    r"[(]xy", r"[)]x|abc",                                       # 文字クラスの中の括弧
+]
+EDGE_TEXTS = [
+    "abc", "ABCD", "K", "K", "stop", "STOP", "ſtop", "strasse", "Strasse", "qrs", "Qrs",
+    "start end", "xstart", "the end", "end\n", "end\n\n", "ab yz", "yz\n",
+    "COLOR", "colour", "xxy", "bar", "foobar", "a.b axb", "12円", "AB", "AZ", "あう", "(xy", ")x",
+    "", "何も当たらない",
+]
+
+
+@pytest.mark.parametrize("flags", [re.IGNORECASE, 0])
+@pytest.mark.parametrize("text", EDGE_TEXTS)
+def test_edge_patterns_match_re_search(text, flags):
+    ps = L._PatternSet(EDGE_PATTERNS, flags=flags)
+    assert not ps.risks
+    expected = {p: m.span() for p in EDGE_PATTERNS if (m := re.search(p, text, flags))}
+    assert ps.scan(text) == expected
+
+
+def test_required_literals():
+    assert L._required_literals(r"限定|残りわずか") == ["限定", "残りわずか"]
+    assert L._required_literals(r"絶対(に)?") == ["絶対"]
+    assert L._required_literals(r"colou?r") == ["colo"]
+    assert L._required_literals(r"\x41B") == ["B"]           # \x41 は1文字（A）
+    assert L._required_literals(r"\101Z") == ["Z"]
+    assert L._required_literals(r"a|b|") is None               # 空の分岐は何にでも一致
+
+
+def test_anchor_seen_many_times_before_a_rare_one():
+    # 既出のアンカーばかり続く長文では交替を組み直す（REBUILD_AFTER）。その後も取りこぼさない
+    text = "みんなが" * 500 + "前例がない"
+    assert L._MATCHER.scan(text) == _search_all(PATTERNS, text)
+
+
+# ---- スコアと診断が従来と同じか ----
+@pytest.mark.parametrize("text", TEXTS)
+def test_scores_match_baseline(text):
+    t = text.strip()
+    for b in L._BIASES:
+        assert L._score_bias(t, b) == _baseline_score(t, b), b["key"]
+    expected = sorted(((_baseline_score(t, b), b["key"]) for b in L._BIASES), key=lambda x: x[0],
+                      reverse=True)
+    d = L.analyze_with_ai(text, max_chars=None)
+    assert d.scores == tuple((k, s) for s, k in expected if s > 0)
+
+
+def test_advice_uses_the_same_random_draws_as_before():
+    # 従来は上位のバイアスごとに random.choice(advice)。同じシードなら同じヒントを選ぶ
+    text = "みんなが買っているから私も買う。限定セールだし、絶対に得だと思う。"
+    d = L.analyze_with_ai(text, seed=7)
+    rng = random.Random(7)
+    assert d.advice == tuple(L._BY_KEY[k]["advice"].index(rng.choice(L._BY_KEY[k]["advice"]))
+                             for k in d.top)
+
+
+# ---- 危ないパターンと長文（文・窓ごとの照合、診断する長さ）----
+@pytest.mark.parametrize("pat, risk", [
+    (r"(a+)+$", L.NESTED),
+    (r"(\w*)*x", L.NESTED),
+    (r"(?:ab|c+)+d", L.NESTED),
+    (r"だから.*なった", L.TRAILING),
+    (r"\d+%成功", L.TRAILING),
+    (r".*B", L.TRAILING),
+    (r"絶対(に)?", None),
+    (r"限定|残りわずか", None),
+    (r"x.*", None),          # 後ろに何もなければ1回で終わる
+    (r"\d{2,5}円", None),     # 上限のある繰り返し
+])
+def test_regex_risk(pat, risk):
+    assert L.regex_risk(pat) == risk
+
+
+def test_catalogue_risks_are_listed():
+    risks = L.pattern_risks()
+    assert risks[r"だから.*なった"] == L.TRAILING
+    assert L.NESTED not in risks.values()
+
+
+def test_sentence_windows_cover_every_short_match():
+    size = 40
+    text = "短い文。" + "長" * 150 + "！\n最後"
+    windows = list(L.sentence_windows(text, size))
+    assert windows[0] == (0, 3) and windows[-1] == (len(text) - 2, len(text))
+    assert all(b - a <= size for a, b in windows)
+    # 長い文の中で size/2 以下の長さの一致は、どれかの窓に丸ごと入る
+    start, end = 4, 4 + 150
+    for a in range(start, end - size // 2 + 1):
+        assert any(wa <= a and a + size // 2 <= wb for wa, wb in windows), a
+
+
+def test_nested_repeat_is_skipped_in_bounded_time():
+    ps = L._PatternSet([r"(a+)+$", r"zzz"])
+    assert ps.risks == {0: L.NESTED}
+    for text in ("a" * 30 + "b", "a" * 100_000 + "b", ("a" * 25 + "b。") * 2000):
+        t0 = time.perf_counter()
+        assert ps.scan(text) == {}
+        assert time.perf_counter() - t0 < 1.0
+
+
+def test_trailing_repeat_is_matched_per_sentence_in_linear_time():
+    ps = L._PatternSet([r"だから.*なった"])
+    assert ps.scan("雨だから中止になった。") == {r"だから.*なった": (1, 10)}
+    assert ps.scan("雨だから。中止になった。") == {}   # 文をまたぐ一致はしない
+    text = "だから" * 30_000                        # re.search だと2乗（数秒かかる）
+    t0 = time.perf_counter()
+    assert ps.scan(text) == {}
+    assert time.perf_counter() - t0 < 1.0
+
+
+def test_windowed_pattern_with_end_anchor_only_matches_at_the_end():
+    ps = L._PatternSet([r"\d+円$", r"x.*y\Z"])
+    assert set(ps.risks) == {0, 1}
+    for text in ("100円。次の文", "100円！\nつづき", "100円", "100円\n", "100円\n\n", "x y。z", "xy", "xy\n"):
+        expected = {p: m.span() for p in ps.patterns if (m := re.search(p, text, re.IGNORECASE))}
+        assert ps.scan(text) == expected, text
+
+
+@pytest.mark.parametrize("text, max_chars, cut", [
+    ("あいう。えお。", 10, 7),          # 収まる
+    ("あいう。えお。", 7, 7),           # ちょうど
+    ("あいう。えお。か", 7, 7),         # 1文字超える：直前の文の終わり
+    ("あいう。えおかき", 7, 4),         # 超えた所が文の途中：手前の文の終わりで切る
+    ("あいうえお。か", 5, 5),           # 次の文字が「。」：文はそこで終わっている
+    ("あいうえおかき。", 6, 6),         # 半分より前に区切りがなければ文字数で切る
+    ("あ。いうえおかき", 6, 6),
+    ("あいう。えおかき", 6, 4),
+    ("あいう\nえおかき", 6, 4),
+    ("あいう", None, 3),
+])
+def test_clip(text, max_chars, cut):
+    assert L._clip(text, max_chars) == cut
+
+
+def test_long_input_is_diagnosed_up_to_a_sentence_boundary():
+    text = "みんなが買っているから私も買う。" * 10 + "限定"
+    d = L.analyze_with_ai(text, max_chars=len(text) - 1)
+    assert d.truncated_at == len(text) - 2
+    assert "scarcity" not in dict(d.scores)      # 切った後ろの「限定」は読まない
+    assert L.analyze_with_ai(text, max_chars=len(text)).truncated_at == 0
+
+
+# ---- 保存形式 ----
+def test_json_leaves_the_text_out_and_round_trips():
+    text = "みんなが買っているから私も買う。限定セールだし、絶対に得だと思う。" * 2
+    d = L.analyze_with_ai(text, category="買い物", seed=1)
+    s = d.to_json()
+    assert "みんなが買って" not in s and len(s.encode()) < 400
+    assert L.Diagnosis.from_json(s, d.text) == d
+    assert L.Diagnosis.from_json(s).text == ""
+    old = json.dumps(dict(d.to_dict(), text=d.text), ensure_ascii=False)   # 以前の形式
+    assert L.Diagnosis.from_json(old) == d
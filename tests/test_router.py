@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""router: LLM に回すかの判断（decide）と、記録からの試算（RouteLog.what_if）が食い違わないか"""
+import random
+
+import pytest
+
+from logic_simple import Diagnosis
+from router import MIN_SCORE, REASONS, TIE_MARGIN, RouteLog, decide
+
+
+def diag(*scores) -> Diagnosis:
+    return Diagnosis("t", scores=tuple((f"b{i}", s) for i, s in enumerate(scores)))
+
+
+@pytest.mark.parametrize("scores, kw, reason", [
+    ((0.9,), {"deep": True}, "deep"),                      # 「詳しく」は点数に関係なく
+    ((), {}, "no_hits"),
+    ((0.4,), {"min_score": 0.5}, "low_score"),
+    ((0.5,), {"min_score": 0.5}, "confident"),             # しきい値ちょうどは足りている
+    ((0.5, 0.5), {"min_score": 0.5, "tie_margin": 0.0}, "tie"),
+    ((0.75, 0.5), {"min_score": 0.5, "tie_margin": 0.25}, "tie"),   # 差がちょうど tie_margin
+    ((0.75, 0.5), {"min_score": 0.5, "tie_margin": 0.2}, "confident"),
+    ((1.0, 0.5, 0.5), {"min_score": 0.5, "tie_margin": 0.0}, "confident"),  # 見るのは上位2つ
+    ((0.4, 0.4), {"min_score": 0.5, "tie_margin": 0.0}, "low_score"),      # 点が低いほうが先
+])
+def test_decide_reasons(scores, kw, reason):
+    route = decide(diag(*scores), **kw)
+    assert route.reason == reason
+    assert route.escalate == (reason != "confident")
+    assert (route.top1, route.n_hits) == ((scores[0] if scores else 0.0), len(scores))
+
+
+def test_every_reason_is_covered():
+    seen = {decide(diag(*s), deep=d, min_score=0.5, tie_margin=0.0).reason
+            for s, d in [((0.9,), True), ((), False), ((0.3,), False), ((0.5, 0.5), False), ((1.0,), False)]}
+    assert seen == set(REASONS)
+
+
+def _random_diagnoses(n, seed=0):
+    # _score_bias が出しうる値（ヒット数 / 分母）。同点やしきい値ちょうどがよく出る
+    values = sorted({min(1.0, h / d) for d in (2, 3, 4) for h in range(1, 5)})
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        k = rng.choice((0, 1, 1, 2, 2, 3))
+        out.append((diag(*sorted(rng.choices(values, k=k), reverse=True)), rng.random() < 0.1))
+    return out
+
+
+@pytest.fixture
+def logged(tmp_path):
+    log = RouteLog(tmp_path / "r.db")
+    cases = _random_diagnoses(500)
+    for d, deep in cases:
+        route = decide(d, deep=deep)
+        # LLM に回すと決めた回は実際に回した（"llm"）ものとして記録する
+        log.record(route, chars=10, llm="llm" if route.escalate else "")
+    yield log, cases
+    log.close()
+
+
+def test_what_if_with_current_thresholds_matches_logged_escalations(logged):
+    log, _ = logged
+    with log._lock:
+        n, esc = log._db.execute(
+            "SELECT COUNT(*), SUM(escalated) FROM routes WHERE reason != 'deep'").fetchone()
+    result = log.what_if(MIN_SCORE, TIE_MARGIN)
+    assert result["submissions"] == n
+    assert result["escalate"] == esc
+
+
+@pytest.mark.parametrize("min_score, tie_margin", [(0.0, 0.0), (0.34, 0.0), (0.5, 0.1), (0.67, 0.25), (1.0, 1.0)])
+def test_what_if_agrees_with_decide(logged, min_score, tie_margin):
+    log, cases = logged
+    expected = sum(decide(d, min_score=min_score, tie_margin=tie_margin).escalate
+                   for d, deep in cases if not deep)
+    assert log.what_if(min_score, tie_margin)["escalate"] == expected
+
+
+def test_unavailable_is_not_counted_as_escalated(tmp_path):
+    log = RouteLog(tmp_path / "r.db")
+    log.record(decide(diag()), llm="unavailable")
+    log.record(decide(diag()), llm="fallback")
+    assert log.stats["escalated"] == 1
+    assert log.what_if(MIN_SCORE, TIE_MARGIN)["escalate"] == 2   # 試算は判断の数（回せたかは問わない）
+    log.close()
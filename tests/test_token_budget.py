@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""token_budget: トークンの見積もりと、予算に合わせた入力の間引き"""
+import pytest
+
+from token_budget import GAP, estimate_tokens, fit_text
+
+
+@pytest.mark.parametrize("text, tokens", [
+    ("", 0),
+    ("abcd", 1),
+    ("abcde", 2),
+    ("あいう", 3),
+    ("ab あい", 3),          # 英数字と空白 3 文字で 1、日本語 2 文字で 2
+    ("a" * 400, 100),
+])
+def test_estimate_tokens(text, tokens):
+    assert estimate_tokens(text) == tokens
+
+
+def test_estimate_grows_with_prefix():
+    text = "abc 確証バイアス。xyz" * 5
+    counts = [estimate_tokens(text[:n]) for n in range(len(text) + 1)]
+    assert counts == sorted(counts)
+
+
+def test_short_text_is_untouched():
+    text = "みんなが買っているから私も買う。"
+    assert fit_text(text, 100) == (text, False)
+
+
+@pytest.mark.parametrize("text", [
+    "あ" * 10000 + "。短い。",
+    "a" * 10000,
+    "最初。" + "い" * 3000 + "。みんなが買っているから私も買う。" + "う" * 3000 + "。最後。",
+    "x" * 50 + "。" + "long english paste without any sentence end " * 200,
+])
+@pytest.mark.parametrize("budget", [20, 100, 500])
+def test_result_fits_budget(text, budget):
+    out, trimmed = fit_text(text, budget)
+    assert trimmed
+    assert estimate_tokens(out) <= budget
+
+
+def test_oversized_sentence_is_cut_not_dropped():
+    out, _ = fit_text("あ" * 10000 + "。短い。", 100)
+    assert out.endswith(GAP + "短い。")
+    assert out.startswith("あ" * 90)          # 長い文も残りの予算の分だけ入る
+
+
+def test_ascii_is_cut_by_tokens_not_characters():
+    out, _ = fit_text("a" * 10000, 100)
+    assert out.endswith(GAP)
+    assert len(out) > 300                      # 4 文字で 1 トークン：予算の文字数より多く残る
+
+
+def test_keeps_first_last_and_matched_sentences():
+    text = "最初。" + "い" * 3000 + "。みんなが買っているから私も買う。" + "う" * 3000 + "。最後。"
+    out, _ = fit_text(text, 60)
+    assert out.startswith("最初。")
+    assert "みんなが買っているから私も買う。" in out
+    assert out.endswith(GAP + "最後。")
+    assert estimate_tokens(out) <= 60
+
+
+def test_gaps_mark_omitted_parts():
+    # 2+1（前。と区切り）+ 2+1（後。と区切り）を引いた残り 3 トークン分だけ中の文を頭から入れる
+    assert fit_text("前。" + "中" * 200 + "。後。", 10) == ("前。中中中" + GAP + "後。", True)
+    # 末尾の文は中の文より優先：前。の残り 8 トークンを末尾の文に使い、後。は省く
+    assert fit_text("前。" + "中" * 200 + "。後。" + "末" * 200 + "。", 12) == \
+        ("前。" + GAP + "末" * 8 + GAP, True)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""worker_pool.WorkerPool: 混雑・タイムアウト・ストリーム"""
+import threading
+import time
+
+import pytest
+
+from worker_pool import PoolBusy, WorkerPool
+
+
+@pytest.fixture
+def pool():
+    p = WorkerPool(max_workers=1, max_queue=0)
+    yield p
+    p._ex.shutdown(wait=True)
+
+
+def test_run_returns_result_and_timing(pool):
+    result, info = pool.run(lambda x: x * 2, 21)
+    assert result == 42
+    assert info["wait_s"] is not None and info["run_s"] is not None
+
+
+def test_stream_yields_in_order_on_worker(pool):
+    threads = set()
+
+    def gen(n):
+        for i in range(n):
+            threads.add(threading.current_thread().name)
+            yield i
+
+    items, info = pool.stream(gen, 5)
+    assert list(items) == [0, 1, 2, 3, 4]
+    assert threads and all(t.startswith("analyze") for t in threads)
+    assert pool.stats()["done"] == 1 and pool.stats()["in_flight"] == 0
+
+
+def test_stream_busy_is_raised_before_iterating(pool):
+    release = threading.Event()
+    fut, _ = pool.submit(release.wait)
+    with pytest.raises(PoolBusy):
+        pool.stream(lambda: iter([1]))
+    release.set()
+    fut.result()
+
+
+def test_stream_timeout_stops_worker(pool):
+    produced = []
+
+    def slow():
+        for i in range(100):
+            produced.append(i)
+            time.sleep(0.05)
+            yield i
+
+    items, _ = pool.stream(slow, timeout_s=0.12)
+    got = []
+    with pytest.raises(TimeoutError):
+        for x in items:
+            got.append(x)
+    time.sleep(0.2)
+    assert got and len(produced) < 100          # ワーカーも途中で止まる
+    s = pool.stats()
+    assert s["timeouts"] == 1 and s["in_flight"] == 0
+
+
+def test_stream_error_propagates(pool):
+    def bad():
+        yield 1
+        raise ValueError("boom")
+
+    items, _ = pool.stream(bad)
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="boom"):
+        next(items)
+    assert pool.stats()["errors"] == 1
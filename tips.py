@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+豆知識（tips.json）の読み込みと、セッションごとの出し方。
+  - カタログは JSON の読み込みと表示用 markdown の組み立てを1回だけ（st.cache_resource）。
+    tips.json が更新されれば読み直す
+  - セッションごとに、番号の並びを1回シャッフルした配列（array）と現在位置だけを持つ。
+    次の1件は位置を進めるだけ（O(1)）。一巡したら並べ直す
+  - 乱数はセッションごとの random.Random。グローバルの random は触らない
+    （logic_simple などグローバルの乱数を使う処理に影響しない）
+"""
+import json
+import random
+from array import array
+from datetime import date
+from pathlib import Path
+
+import streamlit as st
+
+from cache_versions import file_version
+
+TIPS_PATH = Path(__file__).with_name("tips.json")
+
+
+class TipCatalogue:
+    def __init__(self, data: dict):
+        self.version = data.get("version", "")
+        self.tips = tuple(data["tips"])
+        # 表示用の markdown は先に作っておく（表示のたびに組み立てない）
+        self.bodies = tuple(self._body(t) for t in self.tips)
+
+    @staticmethod
+    def _body(tip: dict) -> str:
+        body = f"**{tip['title']}**：{tip['desc']}"
+        if tip.get("examples"):
+            body += "\n\n**例)**\n" + "\n".join(f"- {e}" for e in tip["examples"])
+        return body
+
+    def __len__(self):
+        return len(self.tips)
+
+
+def load_tips(path=TIPS_PATH) -> TipCatalogue:
+    with open(path, encoding="utf-8") as f:
+        return TipCatalogue(json.load(f))
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _cached_catalogue(path: str, version: str) -> TipCatalogue:
+    # version はキャッシュキーとしてだけ使う（変われば新しいエントリ＝読み直し）
+    return load_tips(path)
+
+
+def get_tip_catalogue(path=TIPS_PATH) -> TipCatalogue:
+    """プロセス共有のカタログを返す。tips.json が更新されていれば読み直す。"""
+    return _cached_catalogue(str(path), file_version(path))
+
+
+class TipDeck:
+    """
+    1セッション分の出し順。order はカタログの番号をシャッフルしたもの、pos は今の位置。
+    乱数の種は日付（＋カタログの版）なので、同じ日は同じ順（日替わり）。
+    """
+    __slots__ = ("day", "version", "order", "pos", "_rng")
+
+    def __init__(self, n: int, version: str = "", day=None):
+        self.day = (day or date.today()).isoformat()
+        self.version = version
+        self._rng = random.Random(f"{self.day}:{version}")
+        self.order = array("I", range(n))
+        self._rng.shuffle(self.order)
+        self.pos = 0
+
+    def current(self) -> int:
+        return self.order[self.pos]
+
+    def advance(self) -> int:
+        """次の番号へ。一巡したら並べ直す（直前の1件がすぐ続かないようにする）"""
+        self.pos += 1
+        if self.pos >= len(self.order):
+            last = self.order[-1]
+            self._rng.shuffle(self.order)
+            if len(self.order) > 1 and self.order[0] == last:
+                self.order[0], self.order[-1] = self.order[-1], self.order[0]
+            self.pos = 0
+        return self.order[self.pos]
+
+    def fits(self, catalogue: TipCatalogue) -> bool:
+        return (self.version == catalogue.version and len(self.order) == len(catalogue)
+                and self.day == date.today().isoformat())
+
+
+def session_deck(catalogue: TipCatalogue, key: str = "tips_deck") -> TipDeck:
+    """このセッションの TipDeck（カタログの版・件数・日付が変わっていれば作り直す）"""
+    deck = st.session_state.get(key)
+    if deck is None or not deck.fits(catalogue):
+        deck = st.session_state[key] = TipDeck(len(catalogue), catalogue.version)
+    return deck
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+LLM に送る・受け取る量の予算。
+  - estimate_tokens(): トークン数の見積もり（API を呼ばず、トークナイザーも使わない目安）
+  - fit_text(): 予算を超える入力を文単位で間引く。先頭・末尾の文と、ルール診断で
+    言い回しが見つかった文を優先して残し、省いた所は「…」にする。
+    丸ごと入らない文は捨てずに、残りの予算の分だけ頭から切って入れる
+予算は環境変数 LLM_INPUT_TOKENS（入力本文。既定 1500）と LLM_OUTPUT_TOKENS（応答。既定 600）。
+"""
+import bisect
+import os
+
+from logic_simple import _MATCHER, split_sentences
+
+INPUT_TOKENS = int(os.getenv("LLM_INPUT_TOKENS", "1500"))
+OUTPUT_TOKENS = int(os.getenv("LLM_OUTPUT_TOKENS", "600"))
+GAP = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    """英数字は約4文字で1トークン、日本語などは1文字1トークンとして数える（やや多めに出る）"""
+    n_ascii = len(text.encode("ascii", "ignore"))
+    return len(text) - n_ascii + (n_ascii + 3) // 4
+
+
+def _cut(text: str, tokens: int) -> str:
+    """estimate_tokens で tokens 以内に収まる最長の先頭部分"""
+    n = bisect.bisect_right(range(len(text) + 1), tokens, key=lambda k: estimate_tokens(text[:k])) - 1
+    return text[:n]
+
+
+def fit_text(text: str, budget: int = INPUT_TOKENS):
+    """(予算内に収めた文章, 間引いたか) を返す"""
+    if estimate_tokens(text) <= budget:
+        return text, False
+    sents = list(split_sentences(text))
+    if not sents:
+        return _cut(text, budget - 1) + GAP, True
+    # ルール診断で引っかかった文（各パターンの最初の一致を含む文）
+    starts = [s for s, _ in sents]
+    hit = sorted({bisect.bisect_right(starts, pos) - 1 for pos, _ in _MATCHER.scan(text).values()})
+    last = len(sents) - 1
+    first = list(dict.fromkeys([0, last] + hit))
+    rest = [i for i in range(1, last) if i not in first]
+    kept, used = {}, 0  # {文の番号: 残す部分の終わり}
+    # 優先する文を丸ごと → 入らなかった優先文を切って → 残りの文を丸ごと → 切って、の順に詰める
+    for order, cut in ((first, False), (first, True), (rest, False), (rest, True)):
+        for i in order:
+            left = budget - used - 1  # 1 は区切りの「…」の分
+            if i in kept or left <= 0:
+                continue
+            s, e = sents[i]
+            piece = text[s:e] if not cut else _cut(text[s:e], left)
+            cost = estimate_tokens(piece)
+            if piece.strip() and cost <= left:
+                kept[i] = s + len(piece)
+                used += cost + 1
+    parts, prev, prev_cut = [], -1, False
+    for i in sorted(kept):
+        if i != prev + 1 or prev_cut:
+            parts.append(GAP)
+        parts.append(text[sents[i][0]:kept[i]].strip())
+        prev, prev_cut = i, kept[i] < sents[i][1]
+    if prev != last or prev_cut:
+        parts.append(GAP)
+    return "".join(parts), True
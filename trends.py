@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+バイアス検出の集計キューブ（日 × 種類 × カテゴリ × バイアス）と同時検出ペアの件数。
+  - 解析のたびに record() でメモリ上のカウンタに足し、まとめて SQLite に加算（UPSERT）
+  - rollup() で古い日別の行を月別（"2026-01"）にまとめ、行数が増え続けないようにする
+  - 傾向ページは生の履歴を読み直さず、このキューブだけを読む（履歴の件数に関係なく一定の手間）
+source は "diagnosis"（logic_simple._BIASES のキー）か "selection"（analyze_selection のキー）。
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from itertools import combinations
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+DB_PATH = Path(__file__).with_name("decisions.db")
+
+
+class TrendStore:
+    def __init__(self, db_path=DB_PATH, flush_every: int = 20, flush_after_s: float = 30.0,
+                 keep_days: int = 90, rollup_every_s: float = 24 * 3600):
+        self.flush_every = flush_every
+        self.flush_after_s = flush_after_s
+        self.keep_days = keep_days
+        self.rollup_every_s = rollup_every_s
+        self._last_rollup = None  # 起動後最初の書き込みで1回まとめる
+        self._lock = threading.Lock()
+        self._pending = Counter()        # (day, source, category) -> 解析件数
+        self._pending_bias = Counter()   # (day, source, category, bias) -> 件数
+        self._pending_pair = Counter()   # (day, source, category, a, b) -> 件数（a < b）
+        self._n_pending = 0
+        self._last_flush = time.monotonic()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS trend_runs (
+                day TEXT NOT NULL, source TEXT NOT NULL, category TEXT NOT NULL,
+                n INTEGER NOT NULL, PRIMARY KEY (day, source, category));
+            CREATE TABLE IF NOT EXISTS trend_bias (
+                day TEXT NOT NULL, source TEXT NOT NULL, category TEXT NOT NULL, bias TEXT NOT NULL,
+                n INTEGER NOT NULL, PRIMARY KEY (day, source, category, bias));
+            CREATE TABLE IF NOT EXISTS trend_pair (
+                day TEXT NOT NULL, source TEXT NOT NULL, category TEXT NOT NULL,
+                a TEXT NOT NULL, b TEXT NOT NULL,
+                n INTEGER NOT NULL, PRIMARY KEY (day, source, category, a, b));
+        """)
+        self._db.commit()
+
+    # ---- 書き込み ----
+    def record(self, source: str, category, keys, day=None):
+        """1回の解析で検出されたバイアス key を足す（同じ解析内の組み合わせも数える）"""
+        day = (day or date.today()).isoformat() if not isinstance(day, str) else day
+        cat = category or "未選択"
+        keys = sorted(set(keys))
+        with self._lock:
+            self._pending[(day, source, cat)] += 1
+            for key in keys:
+                self._pending_bias[(day, source, cat, key)] += 1
+            for a, b in combinations(keys, 2):
+                self._pending_pair[(day, source, cat, a, b)] += 1
+            self._n_pending += 1
+            due = (self._n_pending >= self.flush_every
+                   or time.monotonic() - self._last_flush >= self.flush_after_s)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            runs, bias, pair = self._pending, self._pending_bias, self._pending_pair
+            self._pending, self._pending_bias, self._pending_pair = Counter(), Counter(), Counter()
+            self._n_pending = 0
+            self._last_flush = time.monotonic()
+            if not runs:
+                return
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO trend_runs VALUES (?,?,?,?)"
+                    " ON CONFLICT DO UPDATE SET n = n + excluded.n",
+                    [k + (n,) for k, n in runs.items()])
+                self._db.executemany(
+                    "INSERT INTO trend_bias VALUES (?,?,?,?,?)"
+                    " ON CONFLICT DO UPDATE SET n = n + excluded.n",
+                    [k + (n,) for k, n in bias.items()])
+                self._db.executemany(
+                    "INSERT INTO trend_pair VALUES (?,?,?,?,?,?)"
+                    " ON CONFLICT DO UPDATE SET n = n + excluded.n",
+                    [k + (n,) for k, n in pair.items()])
+            now = time.monotonic()
+            due = self._last_rollup is None or now - self._last_rollup >= self.rollup_every_s
+            if due:
+                self._last_rollup = now
+        if due:
+            self.rollup(self.keep_days)
+
+    def rollup(self, keep_days=None) -> int:
+        """keep_days より前の日別の行を月別にまとめる。まとめた日別の行数を返す"""
+        self.flush()
+        keep_days = self.keep_days if keep_days is None else keep_days
+        cutoff = (date.today() - timedelta(days=keep_days)).isoformat()
+        moved = 0
+        with self._lock, self._db:
+            for table, cols in (("trend_runs", "source, category"),
+                                ("trend_bias", "source, category, bias"),
+                                ("trend_pair", "source, category, a, b")):
+                # 日別の行（YYYY-MM-DD）だけが対象。月別の行（YYYY-MM）は length で除外
+                where = "length(day) = 10 AND day < ?"
+                self._db.execute(
+                    f"INSERT INTO {table} (day, {cols}, n)"
+                    f" SELECT substr(day, 1, 7), {cols}, SUM(n) FROM {table} WHERE {where}"
+                    f" GROUP BY substr(day, 1, 7), {cols}"
+                    " ON CONFLICT DO UPDATE SET n = n + excluded.n", (cutoff,))
+                moved += self._db.execute(f"DELETE FROM {table} WHERE {where}", (cutoff,)).rowcount
+        return moved
+
+    # ---- 読み出し（傾向ページ用） ----
+    def _where(self, source, category, since):
+        sql, args = " WHERE source = ?", [source]
+        if category:
+            sql += " AND category = ?"
+            args.append(category)
+        if since:
+            sql += " AND day >= ?"
+            args.append(since.isoformat() if isinstance(since, date) else since)
+        return sql, args
+
+    def _frame(self, sql, args, columns) -> pd.DataFrame:
+        self.flush()
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return pd.DataFrame(rows, columns=columns)
+
+    def daily(self, source: str = "diagnosis", category=None, since=None) -> pd.DataFrame:
+        """列 = day, bias, n, runs（その日の解析件数）。月別にまとめた期間は day が "YYYY-MM"。"""
+        where, args = self._where(source, category, since)
+        bias = self._frame(f"SELECT day, bias, SUM(n) FROM trend_bias{where} GROUP BY day, bias",
+                           args, ["day", "bias", "n"])
+        runs = self._frame(f"SELECT day, SUM(n) FROM trend_runs{where} GROUP BY day",
+                           args, ["day", "runs"])
+        return bias.merge(runs, on="day", how="left").sort_values(["day", "n"], ascending=[True, False])
+
+    def categories(self, source: str = "diagnosis") -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT category FROM trend_runs WHERE source = ? ORDER BY category",
+                (source,)).fetchall()
+        return [r[0] for r in rows]
+
+    def cooccurrence(self, source: str = "diagnosis", category=None, since=None) -> pd.DataFrame:
+        """同時に検出されたペア：a, b, n, lift（単独の出現率から見た偏り。1 より大きいほど一緒に出やすい）"""
+        where, args = self._where(source, category, since)
+        pairs = self._frame(f"SELECT a, b, SUM(n) FROM trend_pair{where} GROUP BY a, b",
+                            args, ["a", "b", "n"])
+        single = self._frame(f"SELECT bias, SUM(n) FROM trend_bias{where} GROUP BY bias",
+                             args, ["bias", "n"]).set_index("bias")["n"]
+        total = self._frame(f"SELECT SUM(n) FROM trend_runs{where}", args, ["n"])["n"].iloc[0] or 0
+        if pairs.empty or not total:
+            return pairs.assign(lift=pd.Series(dtype=float))
+        pairs["lift"] = pairs["n"] * total / (pairs["a"].map(single) * pairs["b"].map(single))
+        return pairs.sort_values("n", ascending=False, ignore_index=True)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+
+@st.cache_resource(show_spinner=False)
+def get_trend_store() -> TrendStore:
+    """プロセス共有の集計（保存先は意思決定ログと同じ DECISION_LOG_DB）"""
+    return TrendStore(os.getenv("DECISION_LOG_DB", str(DB_PATH)))
@@ -1,8 +1,16 @@
-import streamlit as st
-
 # ui_components.py
+import hashlib
+import html
+import re
+from pathlib import Path
+
 import streamlit as st
 
+from cache_versions import file_version
+
+# 部品の CSS は static/ に置き、ページごとに inject_css() で1回だけ出す（部品ごとには出さない）
+STATIC_DIR = Path(__file__).with_name("static")
+
 def hero(
     title: str,
     subtitle: str,
@@ -26,28 +34,39 @@ def hero(
         unsafe_allow_html=True,
     )
 
-def _inject_css():
-    st.markdown(
-        """
-        <style>
-        .hero a.cta {
-            display: inline-block;
-            padding: .6rem 1rem;
-        }
-
-        .hero a.cta.ghost {
-            background: transparent;
-            border: 1px solid #cfe8df;
-            color: #2c6a57;
-            font-weight: 500;
-            padding: .5rem .9rem;
-            text-decoration: none;
-            border-radius: .6rem;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
+def minify_css(css: str) -> str:
+    """コメントと余分な空白を取る（セレクタ内の子孫結合の空白は残す）"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _stylesheet(name: str, version: str = ""):
+    """static/ の CSS を (最小化した中身, 内容のハッシュ) で返す（ファイルの版ごとに1回だけ読む）"""
+    css = minify_css((STATIC_DIR / name).read_text(encoding="utf-8"))
+    return css, hashlib.sha256(css.encode("utf-8")).hexdigest()[:12]
+
+def stylesheets(*names: str) -> list:
+    """[(名前, 最小化した CSS, ハッシュ), ...]（ファイルが更新されていればその分だけ読み直す）"""
+    return [(name,) + _stylesheet(name, file_version(STATIC_DIR / name)) for name in names]
+
+def inject_css(*names: str):
+    """
+    static/ の CSS をページの先頭で1回だけ読み込む（既定は部品用の components.css）。
+    静的ファイル配信（.streamlit/config.toml の server.enableStaticServing）が有効なら
+    <link> だけを出すので、中身はブラウザが1回取得してキャッシュする（?v= は内容のハッシュ）。
+    無効なら最小化した CSS を1つの <style> にまとめて出す。
+    """
+    names = names or ("components.css",)
+    sheets = stylesheets(*names)
+    if st.get_option("server.enableStaticServing"):
+        tags = "".join(f'<link rel="stylesheet" href="app/static/{name}?v={digest}">'
+                       for name, _, digest in sheets)
+    else:
+        tags = "<style>" + "".join(css for _, css, _ in sheets) + "</style>"
+    st.markdown(tags, unsafe_allow_html=True)
 
 
 def info_cards(items):
@@ -70,65 +89,6 @@ def stepper(steps, active: int = 1):
         cls = "step active" if i <= active else "step"
         parts.append(f'<div class="{cls}"><span>{i}</span>{s}</div>')
     st.markdown(f'<div class="stepper">{"".join(parts)}</div>', unsafe_allow_html=True)
-    _inject_css()
-
-def result_badge(label: str, score: float):
-    pct = int(round(score*100))
-    st.markdown(
-        f"""
-        <div class="badge">
-          <div class="badge__label">{label}</div>
-          <div class="badge__score">{pct}%</div>
-        </div>
-        """, unsafe_allow_html=True
-    )
-    _inject_css()
-
-def tip_card(text: str):
-    st.markdown(
-        f"""
-        <div class="tip">
-          <span>💡</span>
-          <p>{text}</p>
-        </div>
-        """, unsafe_allow_html=True
-    )
-    _inject_css()
-
-# ---- minimal CSS（必要なら assets/styles.css に分離） ----
-def _inject_css():
-    st.markdown("""
-    <style>
-    :root { --bg:#fafafa; --card:#ffffff; --ink:#222; --muted:#666; --accent:#6c9; }
-    .hero { text-align:center; padding:2.5rem 1rem; }
-    .hero h1 { margin:0 0 .5rem; font-size:2.0rem; line-height:1.2; }
-    .hero .sub { color:var(--muted); margin:.25rem auto 1rem; max-width:42rem; }
-    .hero .cta { display:inline-block; padding:.6rem 1rem; border-radius:.6rem; background:var(--accent); color:#003; text-decoration:none; font-weight:600; }
-    .card { background:var(--card); border:1px solid #eee; border-radius:.8rem; padding:1rem; text-align:center; margin:.5rem 0; }
-    .card .icon { font-size:1.4rem; }
-    .card .title { font-weight:700; margin:.4rem 0 .2rem; }
-    .card .desc { color:var(--muted); font-size:.95rem; line-height:1.5; }
-    .stepper { display:flex; gap:.5rem; align-items:center; margin:1rem 0 1.5rem; flex-wrap:wrap;}
-    .stepper .step { display:flex; align-items:center; gap:.4rem; color:#999; font-size:.9rem; }
-    .stepper .step span { width:1.3rem; height:1.3rem; border-radius:50%; background:#ddd; color:#333; display:inline-flex; align-items:center; justify-content:center; font-size:.8rem;}
-    .stepper .active { color:#111; }
-    .stepper .active span { background:var(--accent); color:#003; }
-    .badge { background:var(--card); border:1px solid #eee; border-radius:.8rem; padding:.8rem; text-align:center; margin:.25rem 0; }
-    .badge__label { font-weight:600; margin-bottom:.2rem; }
-    .badge__score { font-size:1.2rem; font-weight:800; }
-    .tip { display:flex; gap:.6rem; align-items:flex-start; background:#f4fff9; border:1px solid #def7ea; padding:.8rem; border-radius:.6rem; margin:.4rem 0; }
-    </style>
-    """, unsafe_allow_html=True)
-
-import streamlit as st
-
-def stepper(steps, active: int = 1):
-    parts = []
-    for i, s in enumerate(steps, start=1):
-        cls = "step active" if i <= active else "step"
-        parts.append(f'<div class="{cls}"><span>{i}</span>{s}</div>')
-    st.markdown(f'<div class="stepper">{"".join(parts)}</div>', unsafe_allow_html=True)
-    _inject_css()
 
 def result_badge(label: str, score: float):
     pct = int(round(score * 100))
@@ -141,7 +101,6 @@ def result_badge(label: str, score: float):
         """,
         unsafe_allow_html=True,
     )
-    _inject_css()
 
 def tip_card(text: str):
     st.markdown(
@@ -153,32 +112,26 @@ def tip_card(text: str):
         """,
         unsafe_allow_html=True,
     )
-    _inject_css()
-
-def _inject_css():
-    st.markdown("""
-    <style>
-    :root { --bg:#fafafa; --card:#ffffff; --ink:#222; --muted:#666; --accent:#6c9; }
-    .hero { text-align:center; padding:2.5rem 1rem; }
-    .hero h1 { margin:0 0 .5rem; font-size:2.0rem; line-height:1.2; }
-    .hero .sub { color:var(--muted); margin:.25rem auto 1rem; max-width:42rem; }
-    .hero a.cta { display:inline-block; padding:.6rem 1rem; border-radius:.6rem; background:var(--accent); color:#003; text-decoration:none; font-weight:600; }
-
-    .card { background:var(--card); border:1px solid #eee; border-radius:.8rem; padding:1rem; text-align:center; margin:.5rem 0; }
-    .card .icon { font-size:1.4rem; }
-    .card .title { font-weight:700; margin:.4rem 0 .2rem; }
-    .card .desc { color:var(--muted); font-size:.95rem; line-height:1.5; }
-
-    .stepper { display:flex; gap:.5rem; align-items:center; margin:1rem 0 1.5rem; flex-wrap:wrap;}
-    .stepper .step { display:flex; align-items:center; gap:.4rem; color:#999; font-size:.9rem; }
-    .stepper .step span { width:1.3rem; height:1.3rem; border-radius:50%; background:#ddd; color:#333; display:inline-flex; align-items:center; justify-content:center; font-size:.8rem;}
-    .stepper .active { color:#111; }
-    .stepper .active span { background:var(--accent); color:#003; }
-
-    .badge { background:var(--card); border:1px solid #eee; border-radius:.8rem; padding:.8rem; text-align:center; margin:.25rem 0; }
-    .badge__label { font-weight:600; margin-bottom:.2rem; }
-    .badge__score { font-size:1.2rem; font-weight:800; }
-
-    .tip { display:flex; gap:.6rem; align-items:flex-start; background:#f4fff9; border:1px solid #def7ea; padding:.8rem; border-radius:.6rem; margin:.4rem 0; }
-    </style>
-    """, unsafe_allow_html=True)
+
+def highlight_html(text: str, highlights) -> str:
+    """
+    一致箇所を <mark> で囲んだ HTML を返す。
+    highlights: Diagnosis.highlights() の [(開始, 終了, (バイアス名, ...)), ...]（開始位置順・重なりなし）
+    文字列を先頭から1回なめるだけなので、長文でも入力の長さに比例した時間で済む。
+    """
+    def esc(s):
+        # markdown の数式（$）と改行も崩れないようにしておく
+        return html.escape(s).replace("$", "&#36;").replace("\n", "<br>")
+
+    parts, pos = [], 0
+    for a, b, names in highlights:
+        if a < pos:
+            continue
+        parts.append(esc(text[pos:a]))
+        parts.append(f'<mark title="{html.escape(" / ".join(names))}">{esc(text[a:b])}</mark>')
+        pos = b
+    parts.append(esc(text[pos:]))
+    return '<div class="hl-text">' + "".join(parts) + "</div>"
+
+def highlighted_text(text: str, highlights):
+    st.markdown(highlight_html(text, highlights), unsafe_allow_html=True)
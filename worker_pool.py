@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+解析ジョブ用のプロセス共通ワーカープール（app.py では st.cache_resource に保持）。
+  - スレッド数と待ち行列の長さに上限があり、満杯なら待たずに PoolBusy を投げる
+  - タイムアウトした呼び出し元はすぐ解放。まだ始まっていないジョブは取り消し、
+    実行中のものは見捨てる（終わり次第スロットを返す）
+  - ジョブごとに「待ち時間」と「実行時間」を記録し、どちらで遅れているかを見えるようにする
+  - stream(): 結果を少しずつ返すジョブ（ジェネレーター）も同じスロット・タイムアウトで回し、
+    届いた分から呼び出し元へ渡す（キュー経由）
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class PoolBusy(Exception):
+    """待ち行列が満杯（今は受け付けられない）"""
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+
+class WorkerPool:
+    def __init__(self, max_workers: int = 4, max_queue: int = 32, history: int = 1000):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._ex = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analyze")
+        # 実行中＋待ち行列の合計スロット。取れなければ「混雑」
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._timings = deque(maxlen=history)  # (待ち秒, 実行秒)
+        self._counts = {"submitted": 0, "done": 0, "busy": 0, "timeouts": 0,
+                        "cancelled": 0, "abandoned": 0, "errors": 0}
+        self._in_flight = 0
+
+    def _job(self, fn, args, kwargs, t_submit, info):
+        t_start = time.perf_counter()
+        info["wait_s"] = t_start - t_submit
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            info["run_s"] = time.perf_counter() - t_start
+            with self._lock:
+                self._timings.append((info["wait_s"], info["run_s"]))
+                self._counts["done"] += 1
+
+    def submit(self, fn, *args, **kwargs):
+        """(Future, 計測用 dict) を返す。満杯なら PoolBusy。"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counts["busy"] += 1
+            raise PoolBusy("解析キューが満杯です")
+        info = {"wait_s": None, "run_s": None}
+        with self._lock:
+            self._counts["submitted"] += 1
+            self._in_flight += 1
+        try:
+            fut = self._ex.submit(self._job, fn, args, kwargs, time.perf_counter(), info)
+        except BaseException:
+            self._release()
+            raise
+        fut.add_done_callback(lambda _f: self._release())
+        return fut, info
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def run(self, fn, *args, timeout_s: float = 60.0, **kwargs):
+        """
+        結果を返すまで最大 timeout_s 待つ。超えたら TimeoutError（呼び出し元はすぐ戻る）。
+        戻り値は (結果, {"wait_s", "run_s"})。
+        """
+        fut, info = self.submit(fn, *args, **kwargs)
+        try:
+            return fut.result(timeout=timeout_s), info
+        except TimeoutError:
+            # 始まっていなければ取り消し、実行中なら見捨てる（スロットは終了時に返る）
+            # ※ cancel() は完了コールバックを同期で呼ぶのでロックの外で行う
+            cancelled = fut.cancel()
+            with self._lock:
+                self._counts["timeouts"] += 1
+                self._counts["cancelled" if cancelled else "abandoned"] += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._counts["errors"] += 1
+            raise
+
+    def stream(self, fn, *args, timeout_s: float = 60.0, **kwargs):
+        """
+        fn(*args, **kwargs) が返すイテレーターをワーカーで回し、(届いた順に返すイテレーター, 計測用 dict)
+        を返す。満杯ならこの呼び出しで PoolBusy（何か表示する前にわかる）。
+        開始から timeout_s を超えたら、返したイテレーターが TimeoutError を投げる
+        （ワーカー側は次の要素で止まる）。
+        """
+        items = queue.Queue()
+        stop = threading.Event()
+
+        def pump():
+            try:
+                for item in fn(*args, **kwargs):
+                    if stop.is_set():
+                        break  # 呼び出し元が諦めた：残りは計算しない
+                    items.put((True, item))
+            except BaseException as e:
+                items.put((False, e))
+            else:
+                items.put((False, None))
+
+        fut, info = self.submit(pump)
+        return self._drain(fut, items, stop, time.monotonic() + timeout_s), info
+
+    def _drain(self, fut, items, stop, deadline):
+        try:
+            while True:
+                try:
+                    ok, value = items.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    cancelled = fut.cancel()
+                    with self._lock:
+                        self._counts["timeouts"] += 1
+                        self._counts["cancelled" if cancelled else "abandoned"] += 1
+                    raise TimeoutError from None
+                if ok:
+                    yield value
+                elif value is None:
+                    return
+                else:
+                    with self._lock:
+                        self._counts["errors"] += 1
+                    raise value
+        finally:
+            stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            timings = list(self._timings)
+            s = dict(self._counts)
+            s["in_flight"] = self._in_flight
+        waits = [w for w, _ in timings]
+        runs = [r for _, r in timings]
+        s.update({
+            "wait_p50_s": _percentile(waits, 0.50), "wait_p95_s": _percentile(waits, 0.95),
+            "run_p50_s": _percentile(runs, 0.50), "run_p95_s": _percentile(runs, 0.95),
+        })
+        return s